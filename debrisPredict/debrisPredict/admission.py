@@ -0,0 +1,191 @@
+import math
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1, "camera": 2}
+
+
+class Overloaded(Exception):
+    """Work shed because it could not finish within its latency objective."""
+
+    status = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted inference slot; release it once the work is done."""
+
+    def __init__(self, controller, priority, arrived):
+        self.controller = controller
+        self.priority = priority
+        self.arrived = arrived
+        self.granted = None
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Bound concurrent inference work and shed what would miss its SLO.
+
+    At most max_concurrent tickets are out at once. Waiting work is granted
+    slots by priority (interactive, then batch, then camera) and in arrival
+    order within a priority. On arrival the wait is estimated from the work
+    queued ahead and the recent service time; work that would not finish
+    within its class's latency objective, or is still waiting when that
+    deadline passes, is rejected with Overloaded and a Retry-After hint.
+    Camera frames have an objective of 0, so they never queue: a frame that
+    cannot start at once is dropped and the stream moves on to a newer one.
+    """
+
+    def __init__(self, max_concurrent=16, max_queue=64, slo_ms=None, window=200):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.slo_ms = {"interactive": 3000.0, "batch": 30000.0, "camera": 0.0}
+        self.slo_ms.update(slo_ms or {})
+
+        self.in_flight = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+        self._service_ms = deque(maxlen=window)
+        self._latency_ms = {name: deque(maxlen=window) for name in PRIORITIES}
+        self.admitted = dict.fromkeys(PRIORITIES, 0)
+        self.queued = dict.fromkeys(PRIORITIES, 0)
+        self.shed = dict.fromkeys(PRIORITIES, 0)
+        self.peak_waiting = 0
+
+    def service_estimate_ms(self):
+        """Median service time of recent work, 200 ms before any is seen."""
+        if not self._service_ms:
+            return 200.0
+        return float(sorted(self._service_ms)[len(self._service_ms) // 2])
+
+    def _ahead(self, rank):
+        return sum(1 for entry in self._waiting if entry[0] <= rank and entry[2])
+
+    def _retry_after(self, service_ms):
+        """Seconds until the work in flight and queued should have drained."""
+        backlog = self.in_flight + len(self._waiting)
+        return max(1, math.ceil(backlog / self.max_concurrent * service_ms / 1000))
+
+    def _reject(self, priority, message, service_ms):
+        self.shed[priority] += 1
+        raise Overloaded(message, retry_after=self._retry_after(service_ms))
+
+    def admit(self, priority="interactive"):
+        """Wait for an inference slot and return its Ticket, or raise Overloaded."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        rank = PRIORITIES[priority]
+        arrived = time.perf_counter()
+        ticket = Ticket(self, priority, arrived)
+
+        with self._cond:
+            service_ms = self.service_estimate_ms()
+            ahead = self._ahead(rank)
+            if ahead == 0 and self.in_flight < self.max_concurrent:
+                self._grant(ticket)
+                return ticket
+
+            slo_ms = self.slo_ms[priority]
+            # Slots free up in rounds of max_concurrent, one service time each
+            wait_ms = math.ceil((ahead + 1) / self.max_concurrent) * service_ms
+            if len(self._waiting) >= self.max_queue:
+                self._reject(priority, "Inference queue is full", service_ms)
+            if wait_ms + service_ms > slo_ms:
+                self._reject(
+                    priority,
+                    f"Estimated latency {wait_ms + service_ms:.0f} ms exceeds the "
+                    f"{slo_ms:.0f} ms objective for {priority} requests",
+                    service_ms,
+                )
+
+            # entry[2] is the ticket until it is granted or gives up
+            entry = [rank, next(self._sequence), ticket]
+            heapq.heappush(self._waiting, entry)
+            self.queued[priority] += 1
+            self.peak_waiting = max(self.peak_waiting, len(self._waiting))
+
+            deadline = arrived + (slo_ms - service_ms) / 1000
+            while ticket.granted is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    entry[2] = None
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    # A slot this ticket was passed over for goes to the next one
+                    self._dispatch()
+                    self._reject(
+                        priority, "Timed out waiting for an inference slot", service_ms
+                    )
+                self._cond.wait(remaining)
+            return ticket
+
+    def _grant(self, ticket):
+        ticket.granted = time.perf_counter()
+        self.in_flight += 1
+        self.admitted[ticket.priority] += 1
+
+    def _dispatch(self):
+        """Hand free slots to the highest priority waiting tickets."""
+        granted = False
+        while self._waiting and self.in_flight < self.max_concurrent:
+            _, _, ticket = heapq.heappop(self._waiting)
+            self._grant(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _release(self, ticket):
+        now = time.perf_counter()
+        with self._cond:
+            self.in_flight -= 1
+            self._service_ms.append((now - ticket.granted) * 1000)
+            self._latency_ms[ticket.priority].append((now - ticket.arrived) * 1000)
+            self._dispatch()
+
+    def stats(self):
+        """Return queue sizes, shed counts and recent latency per priority."""
+        import numpy as np
+
+        with self._cond:
+            waiting = dict.fromkeys(PRIORITIES, 0)
+            for _, _, ticket in self._waiting:
+                waiting[ticket.priority] += 1
+            classes = {}
+            for name in PRIORITIES:
+                latencies = self._latency_ms[name]
+                classes[name] = {
+                    "slo_ms": self.slo_ms[name],
+                    "waiting": waiting[name],
+                    "admitted": self.admitted[name],
+                    "queued": self.queued[name],
+                    "shed": self.shed[name],
+                    "latency_ms": {
+                        "p50": round(float(np.percentile(latencies, 50)), 1),
+                        "p95": round(float(np.percentile(latencies, 95)), 1),
+                    }
+                    if latencies
+                    else None,
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+                "peak_waiting": self.peak_waiting,
+                "service_ms": round(self.service_estimate_ms(), 1),
+                "classes": classes,
+            }
@@ -1,11 +1,18 @@
 import os
 import io
+import json
+import functools
+import time
+import hmac
+import hashlib
 import logging
 import tempfile
-import requests
+import threading
 import base64
 from flask import (
     Flask,
+    abort,
+    g,
     render_template,
     request,
     Response,
@@ -14,16 +21,167 @@ from flask import (
     redirect,
     url_for,
 )
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-import numpy as np
+from PIL import Image, ImageOps
+
+from admission import AdmissionController, Overloaded
+from profiling import (
+    Sampler,
+    TraceLog,
+    finish_trace,
+    server_timing,
+    span,
+    start_trace,
+    traced,
+)
+from static_assets import Asset, StaticAssets, asset_response, compress_response
+from upload_guard import (
+    MemoryProbe,
+    PixelBudget,
+    SpoolingRequest,
+    UploadRejected,
+    open_upload,
+)
+
+# Requests, NumPy, OpenCV and the drawing modules are imported where they are
+# first used, so the app imports quickly on a cold start
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "marine-waste-detection-secret-key")
-CORS(app, resources={r"/predict": {"origins": "*"}})
+CORS(
+    app,
+    resources={
+        r"/predict": {"origins": "*"},
+        r"/uploads(/.*)?": {
+            "origins": "*",
+            "expose_headers": ["Location", "Upload-Offset", "Upload-Length"],
+        },
+    },
+)
+
+# Upload limits, see upload_guard.py. Bodies above UPLOAD_SPOOL_KB go to a
+# temporary file, images are checked from their header before decoding, and
+# the pixels being processed at once are capped by PIXEL_BUDGET.
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", "25"))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", "40000000"))
+PIXEL_BUDGET = int(os.environ.get("PIXEL_BUDGET", str(4 * MAX_IMAGE_PIXELS)))
+UPLOAD_QUEUE_TIMEOUT_S = float(os.environ.get("UPLOAD_QUEUE_TIMEOUT_S", "2"))
+
+app.config["MAX_CONTENT_LENGTH"] = int(MAX_UPLOAD_MB * 1024 * 1024)
+app.request_class = SpoolingRequest
+SpoolingRequest.spool_bytes = int(os.environ.get("UPLOAD_SPOOL_KB", "1024")) * 1024
+# Pillow refuses anything over twice this as a decompression bomb
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+pixel_budget = PixelBudget(PIXEL_BUDGET, queue_timeout=UPLOAD_QUEUE_TIMEOUT_S)
+
+# Admission control of inference work, see admission.py. Uploads are
+# interactive unless sent with X-Request-Priority: batch; camera frames come
+# last, never queue and are dropped once older than CAMERA_MAX_FRAME_AGE_MS.
+admission = AdmissionController(
+    max_concurrent=int(os.environ.get("ADMISSION_MAX_CONCURRENT", "16")),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "64")),
+    slo_ms={
+        "interactive": float(os.environ.get("INTERACTIVE_SLO_MS", "3000")),
+        "batch": float(os.environ.get("BATCH_SLO_MS", "30000")),
+    },
+)
+CAMERA_MAX_FRAME_AGE_MS = float(os.environ.get("CAMERA_MAX_FRAME_AGE_MS", "500"))
+
+# Opt-in profiling, see profiling.py. With PROFILING=1, /debug/profile
+# samples this process's stacks and a request sent with X-Profile: 1 (or
+# ?profile=1) has its timing tree recorded. PROFILING_TOKEN, when set, has to
+# be sent as X-Profile-Token.
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+sampler = Sampler(max_seconds=float(os.environ.get("PROFILE_MAX_SECONDS", "60")))
+request_traces = TraceLog()
+
+# HTTP caching and compression, see static_assets.py. Static URLs from
+# url_for carry a content hash (?v=) and are cached for a year; the files are
+# served from precompressed gzip (and brotli, if installed) variants. Other
+# text responses of at least COMPRESS_MIN_BYTES are gzipped on the fly unless
+# HTTP_COMPRESSION=0, e.g. when a proxy in front compresses already.
+HTTP_COMPRESSION = os.environ.get("HTTP_COMPRESSION", "1") != "0"
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+static_assets = StaticAssets(app.static_folder, min_size=COMPRESS_MIN_BYTES)
+app.view_functions["static"] = static_assets.serve
+
+# Resumable chunked uploads, see chunked_uploads.py. Sessions live on disk
+# under UPLOAD_DIR, so any worker can take the next chunk. An image is run
+# through detection window by window (UPLOAD_WINDOW pixels) and a video one
+# frame every UPLOAD_VIDEO_SAMPLE_S seconds, as the chunks arrive (see
+# upload_processing.py).
+UPLOAD_DIR = os.environ.get(
+    "UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "debris-uploads")
+)
+UPLOAD_MAX_GB = float(os.environ.get("UPLOAD_MAX_GB", "20"))
+UPLOAD_CHUNK_MB = float(os.environ.get("UPLOAD_CHUNK_MB", "16"))
+UPLOAD_SESSION_TTL_H = float(os.environ.get("UPLOAD_SESSION_TTL_H", "24"))
+UPLOAD_WINDOW = int(os.environ.get("UPLOAD_WINDOW", "1024"))
+UPLOAD_VIDEO_SAMPLE_S = float(os.environ.get("UPLOAD_VIDEO_SAMPLE_S", "1"))
+upload_store = None
+
+# Reuse the detections of a recent upload of the same file (re-uploads,
+# retries) at the same confidence, see result_cache.py. Off by default.
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "0") == "1"
+RESULT_CACHE_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", "1024"))
+RESULT_CACHE_TTL_S = float(os.environ.get("RESULT_CACHE_TTL_S", "600"))
+result_cache = None
+result_cache_lock = threading.Lock()
+
+# Live camera streams, see streams.py. Every stream has its own capture
+# thread and history; all of them share one pool of inference workers.
+DEFAULT_STREAM = "default"
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+# Sources from CAMERA_DEVICE and CAMERA_STREAMS are trusted. Adding or
+# removing a stream over HTTP needs STREAMS_TOKEN (sent as X-Streams-Token)
+# and is limited to RTSP/HTTP URLs on the STREAM_ALLOWED_HOSTS, so clients
+# cannot make the server read local files, devices or internal URLs.
+STREAMS_TOKEN = os.environ.get("STREAMS_TOKEN")
+STREAM_ALLOWED_HOSTS = {
+    host.strip().lower()
+    for host in os.environ.get("STREAM_ALLOWED_HOSTS", "").split(",")
+    if host.strip()
+}
+STREAM_URL_SCHEMES = ("rtsp", "rtsps", "http", "https")
+# Highest rate of pushed detection updates per client, see live_updates.py
+LIVE_UPDATES_MAX_HZ = float(os.environ.get("LIVE_UPDATES_MAX_HZ", "5"))
+# Streams, capture threads and event brokers live in one process, so with
+# several gunicorn workers (GUNICORN_WORKERS, set by gunicorn.conf.py) each
+# would open the cameras itself and know only its own streams. The stream
+# routes then answer 503; run cameras with WEB_CONCURRENCY=1.
+SERVING_WORKERS = int(os.environ.get("GUNICORN_WORKERS", "1"))
+stream_manager = None
+stream_manager_lock = threading.Lock()
+
+# Quality tier of MJPEG feeds opened without ?tier=, see frame_encoder.py
+MJPEG_DEFAULT_TIER = os.environ.get("MJPEG_DEFAULT_TIER", "full")
+
+# Skip inference on live frames that barely changed, see frame_gate.py
+FRAME_GATING = os.environ.get("FRAME_GATING", "1") != "0"
+
+# Adapt resolution, JPEG quality and inference rate to latency, see
+# camera_controller.py
+ADAPTIVE_CAMERA = os.environ.get("ADAPTIVE_CAMERA", "1") != "0"
+
+# Every detection is appended to an SQLite store, see detection_store.py
+DETECTION_STORE = os.environ.get("DETECTION_STORE", "1") != "0"
+# Defaults to detections.db in DATA_DIR, see detection_store.default_path()
+DETECTION_DB = os.environ.get("DETECTION_DB")
+detection_store = None
+detection_store_lock = threading.Lock()
+
+# Density grids over the stored detections, see density_tiles.py
+HEATMAP_MAX_ZOOM = int(os.environ.get("HEATMAP_MAX_ZOOM", "16"))
+HEATMAP_TILE_CELLS = int(os.environ.get("HEATMAP_TILE_CELLS", "64"))
+density_tiles = None
 
 # Marine waste classes and their subclasses
 MARINE_CLASSES = {
@@ -106,6 +264,14 @@ DEBRIS_INFO = {
     },
 }
 
+# Served as a versioned asset: predictions only reference its version
+debris_info_asset = Asset(
+    json.dumps(DEBRIS_INFO, separators=(",", ":")).encode("utf-8"),
+    "application/json",
+    os.path.getmtime(__file__),
+    min_size=COMPRESS_MIN_BYTES,
+)
+
 
 def categorize_detection(raw_class):
     """Categorize raw detection class into main categories."""
@@ -139,15 +305,124 @@ def categorize_detection(raw_class):
     return "plastic"
 
 
+# Local model serving configuration. LOCAL_MODEL_REPORT points at the
+# report.json written by export_model.py, LOCAL_MODEL_PATH at a single model.
+LOCAL_MODEL_REPORT = os.environ.get("LOCAL_MODEL_REPORT")
+LOCAL_MODEL_PATH = os.environ.get("LOCAL_MODEL_PATH")
+MODEL_ACCURACY_BUDGET = float(os.environ.get("MODEL_ACCURACY_BUDGET", "0.01"))
+
+local_model_config = None
+
+# Confidence cascade, see cascade.py. With a local model configured,
+# CASCADE=1 runs it first and escalates only uncertain images, or images with
+# CASCADE_ESCALATE_CATEGORIES, to CASCADE_MODEL_PATH or else the Roboflow model.
+CASCADE = os.environ.get("CASCADE", "0") != "0"
+CASCADE_MODEL_PATH = os.environ.get("CASCADE_MODEL_PATH")
+cascade_config = None
+
+
+def load_local_model():
+    """Load the fastest local model variant that fits the accuracy budget."""
+    global local_model_config
+
+    if local_model_config is None:
+        from backends import LocalModelBackend, select_variant
+
+        model_path = LOCAL_MODEL_PATH
+        variant_name = "custom"
+        if LOCAL_MODEL_REPORT:
+            variant = select_variant(LOCAL_MODEL_REPORT, MODEL_ACCURACY_BUDGET)
+            if variant is None:
+                raise ValueError(
+                    f"No exported variant within mAP budget {MODEL_ACCURACY_BUDGET}"
+                )
+            model_path = variant["path"]
+            variant_name = variant["name"]
+
+        local_model_config = {
+            "backend": "local",
+            "variant": variant_name,
+            "model_path": model_path,
+            "predictor": LocalModelBackend(model_path),
+        }
+        logging.info(f"Serving local model variant {variant_name}: {model_path}")
+
+    return local_model_config
+
+
+def roboflow_model_config():
+    """Return the Roboflow API configuration from the environment."""
+    return {
+        "api_url": os.environ.get("ROBOFLOW_API_URL", "https://detect.roboflow.com"),
+        "api_key": os.environ.get("ROBOFLOW_API_KEY", "W6Khbwl6kDNfKx1OGBSo"),
+        "model_id": os.environ.get(
+            "ROBOFLOW_MODEL_ID", "debris-detection-pasan-7azav/1"
+        ),
+    }
+
+
+def load_cascade_model():
+    """Load the local model as the first stage of a confidence cascade."""
+    global cascade_config
+
+    if cascade_config is None:
+        from backends import LocalModelBackend
+        from cascade import ConfidenceCascade
+
+        if CASCADE_MODEL_PATH:
+            second = {
+                "backend": "local",
+                "variant": "escalation",
+                "model_path": CASCADE_MODEL_PATH,
+                "predictor": LocalModelBackend(CASCADE_MODEL_PATH),
+            }
+        else:
+            second = roboflow_model_config()
+
+        categories = os.environ.get("CASCADE_ESCALATE_CATEGORIES", "fishing waste")
+        cascade_config = {
+            "backend": "cascade",
+            "first": load_local_model(),
+            "second": second,
+            "cascade": ConfidenceCascade(
+                low=float(os.environ.get("CASCADE_LOW", "0.25")),
+                high=float(os.environ.get("CASCADE_HIGH", "0.6")),
+                escalate_categories=[
+                    c.strip() for c in categories.split(",") if c.strip()
+                ],
+                categorize=categorize_detection,
+                first_cost=float(os.environ.get("CASCADE_FIRST_COST", "0")),
+                second_cost=float(os.environ.get("CASCADE_SECOND_COST", "1")),
+            ),
+        }
+        logging.info(
+            f"Cascade escalates to {CASCADE_MODEL_PATH or second['model_id']}"
+        )
+
+    return cascade_config
+
+
+def local_predictors(model):
+    """Return the local model backends a model configuration runs."""
+    if not isinstance(model, dict):
+        return []
+    if model.get("backend") == "cascade":
+        return local_predictors(model["first"]) + local_predictors(model["second"])
+    if model.get("backend") == "local":
+        return [model["predictor"]]
+    return []
+
+
 def load_model():
     """Load the Roboflow model configuration for marine waste detection."""
     try:
+        if LOCAL_MODEL_REPORT or LOCAL_MODEL_PATH:
+            if CASCADE:
+                return load_cascade_model()
+            return load_local_model()
+
         # Create Roboflow API configuration
-        roboflow_config = {
-            "api_url": "https://detect.roboflow.com",
-            "api_key": "W6Khbwl6kDNfKx1OGBSo",
-            "model_id": "debris-detection-pasan-7azav/1",
-        }
+        roboflow_config = roboflow_model_config()
 
         logging.info("Roboflow API configuration loaded successfully")
         return roboflow_config
@@ -158,40 +433,315 @@ def load_model():
         return "demo_mode"
 
 
-def inference(model, image):
-    """Perform inference on the input image using Roboflow API or demo mode."""
+def preload():
+    """Load what workers only read before a pre-forking server forks them.
+
+    Run in the gunicorn master (see gunicorn.conf.py): the model, including
+    local weights, the compiled page templates, the compressed static files
+    and Pillow's format plugins then sit in memory every worker shares
+    copy-on-write.
+    """
+    model = load_model()
+    for predictor in local_predictors(model):
+        predictor.model
+    for name in ("base.html", "index.html"):
+        app.jinja_env.get_template(name)
+    static_assets.preload()
+    Image.init()
+    return model
+
+
+# Micro-batching of concurrent detection calls, see batching.py
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "1") != "0"
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+batchers = {}
+batchers_lock = threading.Lock()
+upstream_sessions = {}
+
+
+def get_upstream_session():
+    """Return this process's keep-alive session for the detection API."""
+    pid = os.getpid()
+    if pid not in upstream_sessions:
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=max(10, BATCH_MAX_SIZE * 2)
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        upstream_sessions[pid] = session
+    return upstream_sessions[pid]
+
+
+@traced
+def remote_detections(model, image, confidence, timeout, filename, jpeg_quality=85):
+    """Call the Roboflow-compatible API, returning None on an error status."""
+    image_bytes = io.BytesIO()
+    image.save(image_bytes, format="JPEG", quality=jpeg_quality)
+
+    api_url = f"{model['api_url']}/{model['model_id']}"
+    response = get_upstream_session().post(
+        api_url,
+        params={
+            "api_key": model["api_key"],
+            "confidence": confidence,
+            "overlap": 0.5,
+        },
+        files={"file": (filename, image_bytes.getvalue(), "image/jpeg")},
+        timeout=timeout,
+    )
+
+    if response.status_code != 200:
+        logging.error(f"Roboflow API error {response.status_code}: {response.text}")
+        return None
+
+    return response.json()
+
+
+def get_batcher(model):
+    """Return the shared micro-batcher for a model configuration."""
+    from batching import MicroBatcher, local_batch_fn, pipelined_batch_fn
+
+    if model.get("backend") == "local":
+        key = ("local", model["model_path"])
+    else:
+        key = ("remote", model["api_url"], model["model_id"])
+
+    with batchers_lock:
+        if key not in batchers:
+            if key[0] == "local":
+                batch_fn = local_batch_fn(model["predictor"])
+            else:
+                batch_fn = pipelined_batch_fn(
+                    lambda item: remote_detections(model, *item),
+                    max_in_flight=BATCH_MAX_SIZE,
+                )
+            batchers[key] = MicroBatcher(
+                batch_fn,
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                name=f"{key[0]}-batcher",
+            )
+        return batchers[key]
+
+
+def inference_backlog():
+    """Calls waiting in or handed on by the micro-batchers, not yet answered."""
+    with batchers_lock:
+        return sum(batcher.queue_depth() for batcher in batchers.values())
+
+
+@traced
+def request_detections(
+    model, image, confidence=0.1, timeout=30, filename="image.jpg", jpeg_quality=85
+):
+    """Run detection on a PIL image and return the Roboflow-style result.
+
+    Concurrent calls are coalesced by a micro-batcher unless MICRO_BATCHING=0.
+    A cascade runs each of its stages through here. Returns None when the
+    remote API answers with an error status.
+    """
+    if model.get("backend") == "cascade":
+
+        def stage(config):
+            return lambda image, confidence, overlap: request_detections(
+                config, image, confidence, timeout, filename, jpeg_quality
+            )
+
+        return model["cascade"].run(
+            stage(model["first"]), stage(model["second"]), image, confidence
+        )
+
+    local = model.get("backend") == "local"
+
+    if not MICRO_BATCHING:
+        if local:
+            return model["predictor"].predict(image, confidence=confidence, overlap=0.5)
+        return remote_detections(
+            model, image, confidence, timeout, filename, jpeg_quality
+        )
+
+    if local:
+        return get_batcher(model)((image, confidence), timeout=timeout)
+
+    # Allow for queueing on top of the HTTP timeout itself
+    return get_batcher(model)(
+        (image, confidence, timeout, filename, jpeg_quality), timeout=timeout + 1
+    )
+
+
+@traced
+def parse_predictions(result):
+    """Turn Roboflow predictions into categorized detections and per-class counts."""
+    detections = []
+    detection_counts = {"fishing waste": 0, "metal": 0, "plastic": 0}
+
+    for detection in result.get("predictions", []):
+        raw_class = detection.get("class", "Unknown")
+        categorized_class = categorize_detection(raw_class)
+        detection_counts[categorized_class] += 1
+
+        detection_info = {
+            "raw_class": raw_class,
+            "class_name": categorized_class,
+            "confidence": detection.get("confidence", 0.0),
+            "bbox": [
+                detection.get("x", 0) - detection.get("width", 0) / 2,
+                detection.get("y", 0) - detection.get("height", 0) / 2,
+                detection.get("x", 0) + detection.get("width", 0) / 2,
+                detection.get("y", 0) + detection.get("height", 0) / 2,
+            ],
+            "center": {
+                "x": detection.get("x", 0),
+                "y": detection.get("y", 0),
+            },
+        }
+        detections.append(detection_info)
+
+    return detections, detection_counts
+
+
+def get_detection_store():
+    """Return the detection store, or None if it is disabled or unavailable."""
+    global detection_store, DETECTION_STORE
+
+    if detection_store is not None or not DETECTION_STORE:
+        return detection_store
+
+    with detection_store_lock:
+        if detection_store is None and DETECTION_STORE:
+            try:
+                from detection_store import DetectionStore, default_path
+
+                detection_store = DetectionStore(DETECTION_DB or default_path())
+            except Exception as e:
+                logging.error(f"Detection store unavailable: {str(e)}")
+                DETECTION_STORE = False
+    return detection_store
+
+
+def get_density_tiles():
+    """Return the density grids, building them from the store on first use."""
+    global density_tiles
+
+    if density_tiles is not None:
+        # Pick up what other workers have stored since
+        density_tiles.refresh()
+        return density_tiles
+    store = get_detection_store()
+    if store is None:
+        return None
+
+    with detection_store_lock:
+        if density_tiles is None:
+            from density_tiles import DensityTiles
+
+            tiles = DensityTiles(
+                max_zoom=HEATMAP_MAX_ZOOM, cells=HEATMAP_TILE_CELLS, store=store
+            )
+            # Listen first, then catch up; rows seen twice are skipped by id
+            store.listeners.append(tiles.add_rows)
+            start = time.perf_counter()
+            tiles.load(store)
+            logging.info(
+                f"Density tiles built from {tiles.last_id} stored detections "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            density_tiles = tiles
+    return density_tiles
+
+
+@traced
+def record_detections(detections, source, image_id=None, gps=None):
+    """Queue detections for the store without waiting for the write."""
+    store = get_detection_store()
+    if store is None or not detections:
+        return
+    from detection_store import detection_rows
+
+    store.add(detection_rows(detections, source, image_id=image_id, gps=gps))
+
+
+def file_digest(stream, chunk_size=65536):
+    """Return a short content hash of an uploaded file and rewind it."""
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def get_result_cache():
+    """Return the upload result cache, or None if it is disabled."""
+    global result_cache
+
+    if result_cache is not None or not RESULT_CACHE:
+        return result_cache
+
+    with result_cache_lock:
+        if result_cache is None:
+            from result_cache import ResultCache
+
+            result_cache = ResultCache(
+                max_entries=RESULT_CACHE_ENTRIES, ttl=RESULT_CACHE_TTL_S
+            )
+    return result_cache
+
+
+@traced
+def detect_upload(model, image, confidence, digest=None):
+    """request_detections for an upload, reusing the result for the same file.
+
+    digest is the upload's file_digest; without it nothing is reused.
+    """
+    cache = get_result_cache()
+    if cache is None or digest is None:
+        return request_detections(model, image, confidence=confidence)
+
+    key = (digest, model.get("backend"), confidence, image.size)
+    result = cache.lookup(key)
+    if result is not None:
+        logging.info(f"Reusing detections of an identical upload ({digest})")
+        return result
+
+    result = request_detections(model, image, confidence=confidence)
+    if result is not None:
+        cache.store(key, result)
+    return result
+
+
+@traced
+def inference(model, image, record=None):
+    """Perform inference on the input image using Roboflow API or demo mode.
+
+    record holds the source, image_id and gps under which real (non-demo)
+    detections are kept in the detection store.
+    """
     try:
         # Always start with demo mode values that we can override
         demo_mode = model == "demo_mode"
 
-        # Convert image to bytes for API and for demo if needed
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format="JPEG", quality=85)
-
         if not demo_mode:
+            import requests
+
             try:
-                # Prepare API request
-                api_url = f"{model['api_url']}/{model['model_id']}"
                 confidence = float(request.form.get("confidence", 0.1))
 
-                # Make API request
-                response = requests.post(
-                    api_url,
-                    params={
-                        "api_key": model["api_key"],
-                        "confidence": max(
-                            0.01, min(confidence, 0.99)
-                        ),  # Ensure confidence is within valid range
-                        "overlap": 0.5,
-                    },
-                    files={"file": ("image.jpg", image_bytes.getvalue(), "image/jpeg")},
-                    timeout=30,
+                # Ensure confidence is within valid range
+                result = detect_upload(
+                    model,
+                    image,
+                    confidence=max(0.01, min(confidence, 0.99)),
+                    digest=record["image_id"] if record else None,
                 )
 
-                if response.status_code == 200:
-                    result = response.json()
+                if result is not None:
                     logging.info(
-                        f"Roboflow API response: {len(result.get('predictions', []))} detections found"
+                        f"Detection response: {len(result.get('predictions', []))} detections found"
                     )
 
                     # Process successful response
@@ -199,46 +749,18 @@ def inference(model, image):
                     result_image = draw_detections(image, result, label_mode)
 
                     # Extract and categorize detections
-                    detections = []
-                    detection_counts = {"fishing waste": 0, "metal": 0, "plastic": 0}
-
-                    if "predictions" in result:
-                        for detection in result["predictions"]:
-                            raw_class = detection.get("class", "Unknown")
-                            categorized_class = categorize_detection(raw_class)
-                            detection_counts[categorized_class] += 1
-
-                            detection_info = {
-                                "raw_class": raw_class,
-                                "class_name": categorized_class,
-                                "confidence": detection.get("confidence", 0.0),
-                                "bbox": [
-                                    detection.get("x", 0)
-                                    - detection.get("width", 0) / 2,
-                                    detection.get("y", 0)
-                                    - detection.get("height", 0) / 2,
-                                    detection.get("x", 0)
-                                    + detection.get("width", 0) / 2,
-                                    detection.get("y", 0)
-                                    + detection.get("height", 0) / 2,
-                                ],
-                                "center": {
-                                    "x": detection.get("x", 0),
-                                    "y": detection.get("y", 0),
-                                },
-                            }
-                            detections.append(detection_info)
+                    detections, detection_counts = parse_predictions(result)
+                    if record is not None:
+                        record_detections(detections, **record)
 
                     # Convert final image to bytes
                     result_bytes = io.BytesIO()
-                    result_image.save(result_bytes, format="JPEG")
+                    with span("encode"):
+                        result_image.save(result_bytes, format="JPEG")
                     result_bytes.seek(0)
 
                     return result_bytes.getvalue(), detections, detection_counts
                 else:
-                    logging.error(
-                        f"Roboflow API error {response.status_code}: {response.text}"
-                    )
                     demo_mode = True  # Fall back to demo mode
 
             except requests.exceptions.RequestException as e:
@@ -292,6 +814,8 @@ def inference(model, image):
     except Exception as e:
         logging.error(f"Critical error in inference: {str(e)}")
         # Return a black image with error text as a last resort
+        from PIL import ImageDraw, ImageFont
+
         error_img = Image.new("RGB", (800, 600), color="black")
         draw = ImageDraw.Draw(error_img)
         try:
@@ -318,9 +842,12 @@ def hex_to_rgb(hex_color):
     return tuple(int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
 
 
+@traced
 def draw_detections(image, result, label_mode="class_confidence"):
     """Draw detection boxes and labels on the image with category-specific colors."""
     try:
+        from PIL import ImageDraw, ImageFont
+
         # Create a copy of the image to draw on
         result_img = image.copy()
         draw = ImageDraw.Draw(result_img)
@@ -456,6 +983,7 @@ def draw_detections(image, result, label_mode="class_confidence"):
         return image
 
 
+@traced
 def create_demo_image(image):
     """Create a demo image with placeholder detection boxes."""
     try:
@@ -529,19 +1057,53 @@ def create_demo_image(image):
 
 @app.route("/")
 def home():
-    """Home page route."""
-    return render_template(
-        "index.html",
-        classes=MARINE_CLASSES,
-        class_colors=CLASS_COLORS,
-        debris_info=DEBRIS_INFO,
+    """Home page route.
+
+    Revalidated by an ETag of the rendered page, so a reload costs a 304.
+    """
+    response = Response(
+        render_template(
+            "index.html",
+            classes=MARINE_CLASSES,
+            class_colors=CLASS_COLORS,
+            debris_info=DEBRIS_INFO,
+        ),
+        mimetype="text/html",
     )
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 
 @app.route("/api/debris-info")
 def debris_info():
-    """API endpoint to get debris information for the library."""
-    return jsonify(DEBRIS_INFO)
+    """API endpoint to get debris information for the library.
+
+    url_for adds the content version (?v=), which is cached for good; the
+    bare URL is revalidated with its ETag and Last-Modified.
+    """
+    return asset_response(debris_info_asset, request.args.get("v"))
+
+
+@app.url_defaults
+def add_content_version(endpoint, values):
+    """Give static and debris-info URLs a ?v= that changes with their content."""
+    if "v" in values:
+        return
+    if endpoint == "static":
+        version = static_assets.version(values.get("filename", ""))
+        if version is not None:
+            values["v"] = version
+    elif endpoint == "debris_info":
+        values["v"] = debris_info_asset.version
+
+
+@app.after_request
+def compress(response):
+    # Registered before the other after_request hooks, so it runs after them
+    if HTTP_COMPRESSION:
+        compress_response(response, COMPRESS_MIN_BYTES, COMPRESS_LEVEL)
+    return response
 
 
 @app.route("/predict", methods=["POST"])
@@ -571,13 +1133,32 @@ def predict():
                 return redirect(url_for("home"))
 
             # Read the image file
+            probe = MemoryProbe()
             try:
-                image = Image.open(image_file)
-                # Fix image orientation based on EXIF data
-                image = ImageOps.exif_transpose(image)
-                # Convert RGBA to RGB if necessary
-                if image.mode == "RGBA":
-                    image = image.convert("RGB")
+                # Shed before any decoding if the result would come too late
+                with span("admission"):
+                    g.admission = admission.admit(request_priority())
+                image_id = file_digest(image_file.stream)
+                # Only the header is read until the budget admits the pixels
+                image = open_upload(image_file.stream, MAX_IMAGE_PIXELS)
+                pixels = image.width * image.height
+                with span("pixel_budget"):
+                    pixel_budget.acquire(pixels)
+                g.reserved_pixels = pixels
+
+                # GPS has to be read before exif_transpose drops the EXIF data
+                from detection_store import exif_gps
+
+                gps = exif_gps(image)
+                with span("decode"):
+                    # Fix image orientation based on EXIF data
+                    image = ImageOps.exif_transpose(image)
+                    # Convert RGBA to RGB if necessary
+                    if image.mode == "RGBA":
+                        image = image.convert("RGB")
+                probe.sample()
+            except (UploadRejected, Overloaded) as e:
+                return request_rejected(e)
             except Exception as e:
                 flash(f"Error processing image: {str(e)}", "error")
                 return redirect(url_for("home"))
@@ -596,36 +1177,368 @@ def predict():
                 )
 
             # Perform inference on the image
-            result_image_bytes, detections, detection_counts = inference(model, image)
+            result_image_bytes, detections, detection_counts = inference(
+                model,
+                image,
+                record={"source": "upload", "image_id": image_id, "gps": gps},
+            )
 
             if result_image_bytes is None:
                 flash("Error during image processing", "error")
                 return redirect(url_for("home"))
 
-            # Check if this is a request for JSON data
+            memory = probe.report(pixels)
+            logging.debug(f"Predict memory for {image_id}: {memory}")
+
+            # Check if this is a request for JSON data. The debris library is
+            # referenced by version (fetched once and cached by the client)
+            # unless debris_info=1 asks for it inline; image=1 adds the result
+            # image, so one request gets both.
             if request.args.get("format") == "json":
-                return jsonify(
-                    {
-                        "success": True,
-                        "detections": detections,
-                        "detection_counts": detection_counts,
-                        "total_objects": len(detections),
-                        "debris_info": DEBRIS_INFO,
-                    }
-                )
+                payload = {
+                    "success": True,
+                    "detections": detections,
+                    "detection_counts": detection_counts,
+                    "total_objects": len(detections),
+                    "debris_info_version": debris_info_asset.version,
+                    "debris_info_url": url_for("debris_info"),
+                    "memory": memory,
+                }
+                if request.args.get("debris_info") in ("1", "true"):
+                    payload["debris_info"] = DEBRIS_INFO
+                if request.args.get("image") in ("1", "true"):
+                    payload["image"] = base64.b64encode(result_image_bytes).decode(
+                        "ascii"
+                    )
+                    payload["image_mimetype"] = "image/jpeg"
+                return jsonify(payload)
 
             # Return the result image as bytes for direct image requests
-            return Response(result_image_bytes, mimetype="image/jpeg")
+            return Response(
+                result_image_bytes,
+                mimetype="image/jpeg",
+                headers={
+                    "X-Peak-RSS-Delta-MB": str(memory["peak_rss_delta_mb"]),
+                    "X-Image-Pixels": str(pixels),
+                },
+            )
 
+        except RequestEntityTooLarge:
+            return request_too_large(None)
         except Exception as e:
             logging.error(f"Error in predict route: {str(e)}")
             flash(f"An error occurred: {str(e)}", "error")
             return redirect(url_for("home"))
 
 
+def get_upload_store():
+    """Return the resumable upload sessions, creating the store on first use."""
+    global upload_store
+
+    if upload_store is None:
+        from chunked_uploads import UploadStore
+
+        upload_store = UploadStore(
+            UPLOAD_DIR,
+            max_bytes=int(UPLOAD_MAX_GB * 1024**3),
+            # Chunks are request bodies, so MAX_UPLOAD_MB applies as well
+            max_chunk_bytes=int(min(UPLOAD_CHUNK_MB, MAX_UPLOAD_MB) * 1024**2),
+            ttl=UPLOAD_SESSION_TTL_H * 3600,
+        )
+    return upload_store
+
+
+def admit_batch():
+    """Wait for an admission ticket for background work."""
+    while True:
+        try:
+            return admission.admit("batch")
+        except Overloaded as e:
+            time.sleep(e.retry_after or 1)
+
+
+@contextmanager
+def reserve_upload_pixels(pixels):
+    """Hold pixels of the shared budget for background work, waiting while busy."""
+    while True:
+        try:
+            pixel_budget.acquire(pixels)
+            break
+        except UploadRejected as e:
+            if e.status != 503:
+                raise
+            time.sleep(e.retry_after or 1)
+    try:
+        yield
+    finally:
+        pixel_budget.release(pixels)
+
+
+def detect_upload_window(image, confidence):
+    """Detections in one window of an uploaded image, in window coordinates."""
+    model = load_model()
+    if model is None or model == "demo_mode":
+        return [], {"fishing waste": 0, "metal": 0, "plastic": 0}
+    ticket = admit_batch()
+    try:
+        result = request_detections(model, image, confidence=confidence)
+    finally:
+        ticket.release()
+    if result is None:
+        logging.warning("Detection failed on an upload window")
+        return [], {"fishing waste": 0, "metal": 0, "plastic": 0}
+    return parse_predictions(result)
+
+
+def detect_upload_frame(frame):
+    ticket = admit_batch()
+    try:
+        return process_frame_detections(frame)
+    finally:
+        ticket.release()
+
+
+def make_upload_job(upload_id):
+    from upload_processing import UploadJob
+
+    store = get_upload_store()
+    confidence = store.meta(upload_id)["options"].get("confidence", 0.1)
+    return UploadJob(
+        store,
+        upload_id,
+        detect_image=lambda image: detect_upload_window(image, confidence),
+        detect_frame=detect_upload_frame,
+        sink=lambda upload_id, index, detections: record_detections(
+            detections, f"upload:{upload_id}", image_id=f"{upload_id}:{index}"
+        ),
+        window=UPLOAD_WINDOW,
+        overlap=UPLOAD_WINDOW // 8,
+        sample_s=UPLOAD_VIDEO_SAMPLE_S,
+        max_pixels=PIXEL_BUDGET,
+        max_piece_pixels=MAX_IMAGE_PIXELS,
+        reserve=reserve_upload_pixels,
+    )
+
+
+def upload_job_state(upload_id):
+    try:
+        with open(get_upload_store().path(upload_id, ".job.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def upload_response(status, code=200):
+    """JSON status of an upload session, with its offset in headers too."""
+    if status["options"].get("process"):
+        from upload_processing import start_job
+
+        # Resumes the job if the worker that ran it went away
+        start_job(get_upload_store(), status["id"], make_upload_job)
+    response = jsonify(
+        dict(status, success=True, job=upload_job_state(status["id"]))
+    )
+    response.status_code = code
+    response.headers["Upload-Offset"] = str(status["offset"])
+    response.headers["Upload-Length"] = str(status["length"])
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def upload_rejected(error, upload_id=None):
+    """request_rejected for an upload, with the offset to resume from."""
+    response = request_rejected(error)
+    offset = error.offset
+    if offset is None and upload_id is not None and error.status != 404:
+        try:
+            offset = get_upload_store().status(upload_id)["offset"]
+        except Exception:
+            pass
+    if offset is not None:
+        response.headers["Upload-Offset"] = str(offset)
+    return response
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """Start a resumable upload.
+
+    Takes JSON with filename, length (bytes), and optionally process (run
+    detection as chunks arrive; default for images and videos) and
+    confidence. Chunks then go to the Location with PUT.
+    """
+    from chunked_uploads import UploadSessionError
+    from upload_processing import media_kind
+
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename") or "upload")
+    kind = media_kind(filename)
+    process = bool(data.get("process", kind is not None))
+    if process and kind is None:
+        return (
+            jsonify({"success": False, "message": f"Cannot process {filename}"}),
+            400,
+        )
+    try:
+        confidence = max(0.01, min(float(data.get("confidence", 0.1)), 0.99))
+        status = get_upload_store().create(
+            filename,
+            data.get("length"),
+            kind=kind,
+            options={"process": process, "confidence": confidence},
+        )
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid confidence"}), 400
+    except UploadSessionError as e:
+        return upload_rejected(e)
+
+    logging.info(
+        f"Upload {status['id']} started: {filename}, {status['length']} bytes"
+    )
+    response = upload_response(status, 201)
+    response.headers["Location"] = url_for("upload_status", upload_id=status["id"])
+    return response
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Append a chunk at the Upload-Offset header (or ?offset=).
+
+    A Content-SHA256 header (hex) makes the chunk all or nothing. A 409
+    answer carries the offset to continue from in Upload-Offset.
+    """
+    from chunked_uploads import UploadSessionError
+
+    offset = request.headers.get("Upload-Offset", request.args.get("offset"))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return (
+            jsonify({"success": False, "message": "Upload-Offset is required"}),
+            400,
+        )
+    try:
+        status = get_upload_store().append(
+            upload_id,
+            offset,
+            request.stream,
+            request.content_length,
+            sha256=request.headers.get("Content-SHA256"),
+        )
+    except UploadSessionError as e:
+        return upload_rejected(e, upload_id)
+    return upload_response(status)
+
+
+@app.route("/uploads/<upload_id>")
+def upload_status(upload_id):
+    """Offset, length and processing progress of an upload (also as HEAD)."""
+    from chunked_uploads import UploadSessionError
+
+    try:
+        return upload_response(get_upload_store().status(upload_id))
+    except UploadSessionError as e:
+        return upload_rejected(e)
+
+
+@app.route("/uploads/<upload_id>/results")
+def upload_results(upload_id):
+    """Detections found so far, per window or sampled frame.
+
+    ?since= skips the records already fetched; poll with the returned next.
+    """
+    from chunked_uploads import UploadSessionError
+
+    store = get_upload_store()
+    try:
+        store.meta(upload_id)
+        records, following = store.results(
+            upload_id, request.args.get("since", 0, type=int)
+        )
+    except UploadSessionError as e:
+        return upload_rejected(e)
+    return jsonify(
+        {
+            "success": True,
+            "results": records,
+            "next": following,
+            "job": upload_job_state(upload_id),
+        }
+    )
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def delete_upload(upload_id):
+    from chunked_uploads import UploadSessionError
+
+    try:
+        get_upload_store().meta(upload_id)
+        get_upload_store().delete(upload_id)
+    except UploadSessionError as e:
+        return upload_rejected(e)
+    return jsonify({"success": True})
+
+
+# Readiness of this process, see /ready. Warm-up runs once per process on a
+# background thread, started by the first readiness probe or a gunicorn fork.
+warm_up_state = {"pid": None, "ready": False, "seconds": None, "error": None}
+warm_up_lock = threading.Lock()
+
+
+def warm_up():
+    """Load the model and everything a first /predict would otherwise wait for."""
+    start = time.perf_counter()
+    try:
+        model = preload()
+        from PIL import ImageFont
+
+        ImageFont.load_default()
+        for predictor in local_predictors(model):
+            # The first forward pass pays for lazy initialisation
+            predictor.predict(Image.new("RGB", (64, 64)))
+        if isinstance(model, dict):
+            get_upstream_session()
+    except Exception as e:
+        logging.error(f"Warm-up failed: {str(e)}")
+        with warm_up_lock:
+            # Let the next probe try again
+            warm_up_state.update(pid=None, error=str(e))
+        return
+
+    seconds = round(time.perf_counter() - start, 3)
+    with warm_up_lock:
+        warm_up_state.update(ready=True, seconds=seconds, error=None)
+    logging.info(f"Warm-up finished in {seconds}s")
+
+
+def start_warm_up():
+    """Start this process's warm-up unless it is running or done."""
+    with warm_up_lock:
+        if warm_up_state["pid"] == os.getpid():
+            return
+        # A forked worker warms up its own copy of the parent's state
+        warm_up_state.update(pid=os.getpid(), ready=False, seconds=None)
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.route("/ready")
+def readiness_check():
+    """Readiness probe: 503 until this process has warmed up, then 200."""
+    start_warm_up()
+    with warm_up_lock:
+        state = dict(warm_up_state)
+    if state["ready"]:
+        return jsonify({"ready": True, "warm_up_s": state["seconds"]})
+
+    response = jsonify({"ready": False, "error": state["error"]})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
 @app.route("/health")
 def health_check():
-    """Health check endpoint."""
+    """Liveness probe, answered as soon as the app is imported."""
     model = load_model()
     model_available = model is not None and model != "demo_mode"
     demo_mode = model == "demo_mode"
@@ -635,7 +1548,9 @@ def health_check():
             "status": "healthy",
             "model_available": model_available,
             "demo_mode": demo_mode,
+            "ready": warm_up_state["ready"],
             "classes": MARINE_CLASSES,
+            "api_url": model.get("api_url") if isinstance(model, dict) else None,
             "message": "Demo mode active - Roboflow API may be temporarily unavailable"
             if demo_mode
             else "Real Roboflow marine debris detection model loaded",
@@ -643,6 +1558,355 @@ def health_check():
     )
 
 
+@app.route("/metrics/batching")
+def batching_metrics():
+    """Batch size and queue wait metrics of the inference micro-batchers."""
+    with batchers_lock:
+        current = dict(batchers)
+
+    return jsonify(
+        {
+            "enabled": MICRO_BATCHING,
+            "batchers": {
+                "/".join(str(part) for part in key): batcher.stats()
+                for key, batcher in current.items()
+            },
+        }
+    )
+
+
+def parse_time(value):
+    """Parse epoch seconds or an ISO 8601 date/time into epoch seconds.
+
+    Date/times without a UTC offset are taken as UTC, like the stored rows.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+@app.route("/api/detections/counts")
+def detection_counts_api():
+    """Aggregated detection counts from the detection store.
+
+    Query parameters: start, end (epoch seconds or ISO 8601), category,
+    source, bbox=min_lon,min_lat,max_lon,max_lat, min_confidence and
+    group_by (comma separated: category, source, hour, day).
+    """
+    store = get_detection_store()
+    if store is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+
+    try:
+        bbox = request.args.get("bbox")
+        if bbox:
+            bbox = [float(value) for value in bbox.split(",")]
+            if len(bbox) != 4:
+                raise ValueError("bbox needs min_lon,min_lat,max_lon,max_lat")
+        group_by = request.args.get("group_by", "category")
+        result = store.counts(
+            start=parse_time(request.args.get("start")),
+            end=parse_time(request.args.get("end")),
+            category=request.args.get("category"),
+            source=request.args.get("source"),
+            bbox=bbox or None,
+            min_confidence=request.args.get("min_confidence", type=float),
+            group_by=[key.strip() for key in group_by.split(",") if key.strip()],
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify(dict(result, success=True))
+
+
+@app.route("/api/detections/export.<fmt>")
+def export_detections(fmt):
+    """Stream stored detections as CSV, GeoJSON or Parquet.
+
+    Takes the start, end, category, source and min_confidence filters of
+    /api/detections/counts. Rows are read and encoded a chunk at a time.
+    """
+    import export
+
+    store = get_detection_store()
+    if store is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+    if fmt not in export.FORMATS:
+        return jsonify({"success": False, "message": f"Unknown format: {fmt}"}), 404
+    if fmt == "parquet" and not export.parquet_available():
+        return (
+            jsonify({"success": False, "message": "Parquet export needs pyarrow"}),
+            501,
+        )
+
+    try:
+        chunks = export.iter_store_rows(
+            store,
+            start=parse_time(request.args.get("start")),
+            end=parse_time(request.args.get("end")),
+            category=request.args.get("category"),
+            source=request.args.get("source"),
+            min_confidence=request.args.get("min_confidence", type=float),
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    mimetype, extension = export.FORMATS[fmt]
+    return Response(
+        export.encode(chunks, fmt),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename=detections.{extension}"
+        },
+    )
+
+
+@app.route("/api/heatmap/tiles/<int:z>/<int:x>/<int:y>.<fmt>")
+def heatmap_tile(z, x, y, fmt):
+    """Density tile of GPS-tagged detections, as PNG overlay or sparse JSON cells.
+
+    Tiles follow the z/x/y Web Mercator scheme used by web map libraries.
+    """
+    tiles = get_density_tiles()
+    if tiles is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+    # Bound z before 2**z, which is costly to compute for a huge zoom
+    if fmt not in ("png", "json") or not 0 <= z <= tiles.max_zoom:
+        return jsonify({"success": False, "message": "Unknown tile"}), 404
+    if not (0 <= x < 2**z and 0 <= y < 2**z):
+        return jsonify({"success": False, "message": "Unknown tile"}), 404
+
+    try:
+        category = request.args.get("category")
+        if fmt == "png":
+            response = Response(
+                tiles.tile_png(z, x, y, category), mimetype="image/png"
+            )
+        else:
+            response = jsonify(tiles.tile(z, x, y, category))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+@app.route("/api/heatmap/cameras/<path:source>")
+def heatmap_camera_grid(source):
+    """Pixel density grid of a source without GPS, e.g. camera:default."""
+    tiles = get_density_tiles()
+    if tiles is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+
+    try:
+        grid = tiles.pixel_grid(source, request.args.get("category"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if grid is None:
+        return jsonify({"success": False, "message": f"No grid for {source}"}), 404
+    return jsonify(grid)
+
+
+@app.route("/api/heatmap/summary")
+def heatmap_summary():
+    """Totals, GPS bounds, tiles per zoom level and densest cells."""
+    tiles = get_density_tiles()
+    if tiles is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+    return jsonify(
+        tiles.summary(hotspot_zoom=request.args.get("zoom", 12, type=int))
+    )
+
+
+@app.route("/api/detections/stats")
+def detection_store_stats():
+    """Writer and size statistics of the detection store."""
+    store = get_detection_store()
+    if store is None:
+        return jsonify({"success": False, "message": "Detection store disabled"}), 503
+    return jsonify(store.stats())
+
+
+def request_priority():
+    """Admission priority of a request, batch if the client asks for it."""
+    priority = request.headers.get("X-Request-Priority") or request.args.get(
+        "priority"
+    )
+    return "batch" if priority == "batch" else "interactive"
+
+
+def request_rejected(error):
+    """JSON answer for a request refused before decoding or inference."""
+    response = jsonify({"success": False, "message": str(error)})
+    response.status_code = error.status
+    if error.retry_after:
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+@app.teardown_request
+def release_pixel_budget(exc):
+    """Give back the pixels a /predict request reserved."""
+    pixels = g.pop("reserved_pixels", None)
+    if pixels:
+        pixel_budget.release(pixels)
+
+
+@app.teardown_request
+def release_admission(exc):
+    """Give back the inference slot a /predict request was admitted to."""
+    ticket = g.pop("admission", None)
+    if ticket is not None:
+        ticket.release()
+
+
+@app.route("/metrics/cascade")
+def cascade_metrics():
+    """Escalation rate and estimated savings of the confidence cascade."""
+    model = load_model()
+    if not isinstance(model, dict) or model.get("backend") != "cascade":
+        return jsonify({"enabled": False})
+    return jsonify(dict(model["cascade"].stats(), enabled=True))
+
+
+@app.route("/metrics/result-cache")
+def result_cache_metrics():
+    """Hit rate of the upload result cache."""
+    cache = get_result_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+@app.route("/metrics/admission")
+def admission_metrics():
+    """Inference queue sizes, shed counts and latency per priority."""
+    return jsonify(
+        dict(
+            admission.stats(),
+            camera_pool=stream_manager.pool.stats()
+            if stream_manager is not None
+            else None,
+        )
+    )
+
+
+@app.route("/metrics/uploads")
+def upload_metrics():
+    """Pixel budget usage and upload limits."""
+    return jsonify(
+        dict(
+            pixel_budget.stats(),
+            max_upload_mb=MAX_UPLOAD_MB,
+            max_image_pixels=MAX_IMAGE_PIXELS,
+        )
+    )
+
+
+def profiling_refused():
+    """Error response if profiling is off or the token is wrong, else None."""
+    if not PROFILING:
+        return jsonify({"success": False, "message": "Profiling is disabled"}), 404
+    if PROFILING_TOKEN and request.headers.get("X-Profile-Token") != PROFILING_TOKEN:
+        return jsonify({"success": False, "message": "Invalid profiling token"}), 403
+    return None
+
+
+@app.before_request
+def start_request_trace():
+    """Record the timing tree of a request flagged with X-Profile or ?profile."""
+    if not PROFILING:
+        return
+    flag = request.headers.get("X-Profile") or request.args.get("profile")
+    if flag in ("1", "true") and profiling_refused() is None:
+        g.trace = start_trace(f"{request.method} {request.path}")
+
+
+@app.after_request
+def finish_request_trace(response):
+    """Attach a finished trace as Server-Timing and X-Profile-Id headers.
+
+    JSON answers also carry the whole tree under "profile", since under
+    gunicorn /debug/requests/<id> only finds it on the same worker.
+    """
+    trace = g.pop("trace", None)
+    if trace is not None:
+        root = finish_trace(*trace)
+        tree = root.to_dict()
+        trace_id = request_traces.add(tree)
+        body = response.get_json(silent=True) if response.is_json else None
+        if isinstance(body, dict):
+            response.set_data(jsonify(dict(body, profile=tree)).get_data())
+        response.headers["Server-Timing"] = server_timing(root)
+        response.headers["X-Profile-Id"] = trace_id
+        response.headers["Access-Control-Expose-Headers"] = (
+            "Server-Timing, X-Profile-Id"
+        )
+    return response
+
+
+@app.teardown_request
+def discard_request_trace(exc):
+    """Close the trace of a request that failed before after_request."""
+    trace = g.pop("trace", None)
+    if trace is not None:
+        finish_trace(*trace)
+
+
+@app.route("/debug/profile")
+def sample_profile():
+    """Sample this process's stacks for ?seconds and return folded stacks.
+
+    The output loads in speedscope or flamegraph.pl. Under gunicorn only the
+    worker serving this request is sampled.
+    """
+    refused = profiling_refused()
+    if refused is not None:
+        return refused
+    seconds = float(request.args.get("seconds", 10))
+    interval_ms = float(request.args.get("interval_ms", 10))
+    idle = request.args.get("idle") in ("1", "true")
+    result = sampler.profile(seconds, interval=interval_ms / 1000, idle=idle)
+    if result is None:
+        return jsonify({"success": False, "message": "A profile is running"}), 409
+    folded, samples = result
+    name = f"profile-{os.getpid()}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    return Response(
+        folded,
+        mimetype="text/plain",
+        headers={
+            "Content-Disposition": f"attachment; filename={name}.folded",
+            "X-Samples": str(samples),
+        },
+    )
+
+
+@app.route("/debug/requests/<trace_id>")
+def request_trace(trace_id):
+    """Timing tree of a recent request recorded with X-Profile."""
+    refused = profiling_refused()
+    if refused is not None:
+        return refused
+    trace = request_traces.get(trace_id)
+    if trace is None:
+        return jsonify({"success": False, "message": "Unknown or expired trace"}), 404
+    return jsonify(trace)
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """Handle uploads over MAX_CONTENT_LENGTH."""
+    return request_rejected(
+        UploadRejected(f"Upload larger than {MAX_UPLOAD_MB:g} MB", 413)
+    )
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     """Handle 404 errors."""
@@ -655,43 +1919,38 @@ def internal_server_error(e):
     return render_template("index.html", error="Internal server error"), 500
 
 
-class VideoCamera:
-    """Class to handle video camera operations."""
-
-    def __init__(self):
-        self.video = cv2.VideoCapture(0)
-        self.video.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.video.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+def scale_predictions(result, factor):
+    """Scale Roboflow prediction coordinates in place by a resize factor."""
+    if factor == 1:
+        return result
+    for detection in result.get("predictions", []):
+        for key in ("x", "y", "width", "height"):
+            if key in detection:
+                detection[key] = detection[key] * factor
+    return result
 
-    def __del__(self):
-        self.video.release()
-
-    def get_frame(self):
-        """Get a frame from the camera."""
-        success, frame = self.video.read()
-        if not success:
-            return None
-        return frame
-
-    def release(self):
-        """Release the camera."""
-        if self.video.isOpened():
-            self.video.release()
 
+@traced
+def process_frame_detections(frame, input_size=None, jpeg_quality=85, timeout=5):
+    """Process a single frame and return detections.
 
-def process_frame_detections(frame):
-    """Process a single frame and return detections."""
-    global latest_detections
-
+    Frames larger than input_size on their long side are shrunk before
+    inference and the boxes scaled back to frame coordinates.
+    """
     try:
+        import cv2
+
         # Convert frame to PIL Image
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         pil_image = Image.fromarray(frame_rgb)
 
-        # Prepare image for API
-        image_bytes = io.BytesIO()
-        pil_image.save(image_bytes, format="JPEG", quality=85)
-        image_bytes.seek(0)
+        scale = 1
+        if input_size and max(pil_image.size) > input_size:
+            scale = max(pil_image.size) / input_size
+            pil_image = pil_image.resize(
+                (round(pil_image.width / scale), round(pil_image.height / scale)),
+                Image.BILINEAR,
+            )
 
         # Load model config
         model = load_model()
@@ -703,52 +1962,19 @@ def process_frame_detections(frame):
         else:
             # Real API call
             try:
-                api_url = f"{model['api_url']}/{model['model_id']}"
-                response = requests.post(
-                    api_url,
-                    params={
-                        "api_key": model["api_key"],
-                        "confidence": 0.1,
-                        "overlap": 0.5,
-                    },
-                    files={"file": ("frame.jpg", image_bytes.getvalue(), "image/jpeg")},
-                    timeout=5,  # Shorter timeout for video
+                result = request_detections(
+                    model,
+                    pil_image,
+                    confidence=0.1,
+                    timeout=timeout,  # Shorter timeout for video
+                    filename="frame.jpg",
+                    jpeg_quality=jpeg_quality,
                 )
 
-                if response.status_code == 200:
-                    result = response.json()
-                    detections = []
-                    detection_counts = {"fishing waste": 0, "metal": 0, "plastic": 0}
-
-                    if "predictions" in result:
-                        for detection in result["predictions"]:
-                            raw_class = detection.get("class", "Unknown")
-                            categorized_class = categorize_detection(raw_class)
-                            detection_counts[categorized_class] += 1
-
-                            detection_info = {
-                                "raw_class": raw_class,
-                                "class_name": categorized_class,
-                                "confidence": detection.get("confidence", 0.0),
-                                "bbox": [
-                                    detection.get("x", 0)
-                                    - detection.get("width", 0) / 2,
-                                    detection.get("y", 0)
-                                    - detection.get("height", 0) / 2,
-                                    detection.get("x", 0)
-                                    + detection.get("width", 0) / 2,
-                                    detection.get("y", 0)
-                                    + detection.get("height", 0) / 2,
-                                ],
-                                "center": {
-                                    "x": detection.get("x", 0),
-                                    "y": detection.get("y", 0),
-                                },
-                            }
-                            detections.append(detection_info)
-
-                        # Store detections for heatmap
-                        latest_detections.extend(detections)
+                if result is not None:
+                    detections, detection_counts = parse_predictions(
+                        scale_predictions(result, scale)
+                    )
                 else:
                     detections = []
                     detection_counts = {"fishing waste": 0, "metal": 0, "plastic": 0}
@@ -764,10 +1990,12 @@ def process_frame_detections(frame):
         return [], {"fishing waste": 0, "metal": 0, "plastic": 0}
 
 
+@traced
 def draw_detections_on_frame(frame, detections):
     """Draw bounding boxes and labels on frame."""
     if not detections:
         return frame
+    import cv2
 
     frame_height, frame_width = frame.shape[:2]
 
@@ -834,169 +2062,426 @@ def draw_detections_on_frame(frame, detections):
     return frame
 
 
-def draw_heatmap_on_frame(frame, detections_history):
-    """Draw heatmap overlay on frame based on detection history."""
+@functools.lru_cache(maxsize=4)
+def heatmap_blob(radius):
+    """Gaussian weights of one detection on the heatmap, zero beyond radius."""
+    import numpy as np
+
+    offsets = np.arange(-radius, radius, dtype=np.float32)
+    distance = np.sqrt(offsets[:, None] ** 2 + offsets[None, :] ** 2)
+    blob = np.exp(-(distance**2) / (2 * (radius / 3) ** 2))
+    blob[distance >= radius] = 0
+    blob.flags.writeable = False
+    return blob
+
+
+@traced
+def draw_heatmap_on_frame(frame, detections_history, buffers=None, version=None):
+    """Draw heatmap overlay on frame based on detection history.
+
+    With buffers (a frame_encoder.FrameBuffers) the frame is drawn on in
+    place, the heatmap arrays are reused, and the coloured heatmap is only
+    recomputed when version (of the history) or the frame size changes.
+    """
     if not detections_history or len(detections_history) == 0:
         return frame
+    import cv2
+    import numpy as np
 
     frame_height, frame_width = frame.shape[:2]
+    in_place = buffers is not None
+    if buffers is None:
+        from frame_encoder import FrameBuffers
+
+        buffers = FrameBuffers()
+    heatmap_colored = buffers.get("heatmap_colored", (frame_height, frame_width, 3))
+
+    if version is None or buffers.versions.get("heatmap_colored") != version:
+        # Grid size for heatmap
+        grid_size = 50
+        blob = heatmap_blob(grid_size)
+        heatmap = buffers.get("heatmap", (frame_height, frame_width), np.float32)
+        heatmap.fill(0)
+
+        # Add gaussian blob around detection center
+        for detection in detections_history:
+            try:
+                center = detection.get("center", {})
+                x = int(center.get("x", 0))
+                y = int(center.get("y", 0))
+            except Exception:
+                continue
+            top, left = y - grid_size, x - grid_size
+            y1, y2 = max(top, 0), min(y + grid_size, frame_height)
+            x1, x2 = max(left, 0), min(x + grid_size, frame_width)
+            if y1 < y2 and x1 < x2:
+                heatmap[y1:y2, x1:x2] += blob[
+                    y1 - top : y2 - top, x1 - left : x2 - left
+                ]
 
-    # Create heatmap
-    heatmap = np.zeros((frame_height, frame_width), dtype=np.float32)
+        # Normalize heatmap and apply colormap
+        peak = heatmap.max()
+        if peak > 0:
+            heatmap *= 255 / peak
+        scaled = buffers.get("heatmap_scaled", (frame_height, frame_width))
+        np.copyto(scaled, heatmap, casting="unsafe")
+        cv2.applyColorMap(scaled, cv2.COLORMAP_JET, dst=heatmap_colored)
+        buffers.versions["heatmap_colored"] = version
 
-    # Grid size for heatmap
-    grid_size = 50
+    # Blend with original frame
+    alpha = 0.4
+    return cv2.addWeighted(
+        frame, 1 - alpha, heatmap_colored, alpha, 0, dst=frame if in_place else None
+    )
 
-    # Count detections in grid
-    for detection in detections_history:
-        try:
-            center = detection.get("center", {})
-            x = int(center.get("x", 0))
-            y = int(center.get("y", 0))
-
-            # Add gaussian blob around detection center
-            for dy in range(-grid_size, grid_size):
-                for dx in range(-grid_size, grid_size):
-                    px = x + dx
-                    py = y + dy
-
-                    if 0 <= px < frame_width and 0 <= py < frame_height:
-                        distance = np.sqrt(dx**2 + dy**2)
-                        if distance < grid_size:
-                            weight = np.exp(-(distance**2) / (2 * (grid_size / 3) ** 2))
-                            heatmap[py, px] += weight
-        except Exception as e:
-            continue
 
-    # Normalize heatmap
-    if heatmap.max() > 0:
-        heatmap = heatmap / heatmap.max()
+def make_frame_gate():
+    """Return a FrameGate configured from the environment, or None."""
+    if not FRAME_GATING:
+        return None
+    from frame_gate import FrameGate
 
-    # Apply colormap
-    heatmap_colored = cv2.applyColorMap(
-        (heatmap * 255).astype(np.uint8), cv2.COLORMAP_JET
+    return FrameGate(
+        method=os.environ.get("GATE_METHOD", "diff"),
+        threshold=float(os.environ.get("GATE_THRESHOLD", "0.04")),
+        hash_threshold=int(os.environ.get("GATE_HASH_THRESHOLD", "6")),
+        max_interval=float(os.environ.get("GATE_MAX_INTERVAL_S", "2.0")),
     )
 
-    # Blend with original frame
-    alpha = 0.4
-    frame = cv2.addWeighted(frame, 1 - alpha, heatmap_colored, alpha, 0)
 
-    return frame
+def make_camera_controller():
+    """Return an AdaptiveController configured from the environment, or None."""
+    if not ADAPTIVE_CAMERA:
+        return None
+    from camera_controller import AdaptiveController
 
+    return AdaptiveController(
+        target_fps=float(os.environ.get("TARGET_STREAM_FPS", "10")),
+        target_latency_ms=float(os.environ.get("TARGET_DETECTION_LATENCY_MS", "500")),
+    )
 
-def generate_frames():
-    """Generate frames for video streaming."""
-    global camera, camera_active, latest_detections, heatmap_enabled
 
-    while camera_active:
-        if camera is None:
-            break
+def infer_stream_frame(stream, frame):
+    """Run detection on a stream frame with the stream's current settings.
 
-        frame = camera.get_frame()
-        if frame is None:
-            break
+    Returns None when the frame is shed because uploads are waiting or every
+    inference slot is busy.
+    """
+    try:
+        ticket = admission.admit("camera")
+    except Overloaded:
+        return None
+    try:
+        if stream.controller is None:
+            return process_frame_detections(frame)
+        settings = stream.controller.settings
+        return process_frame_detections(
+            frame,
+            input_size=settings["input_size"],
+            jpeg_quality=settings["jpeg_quality"],
+            timeout=settings["timeout"],
+        )
+    finally:
+        ticket.release()
+
+
+def render_stream_frame(frame, detections, history, buffers=None, version=None):
+    """Draw detections, and the heatmap when a history is given, on a frame."""
+    frame = draw_detections_on_frame(frame, detections)
+    if history:
+        frame = draw_heatmap_on_frame(frame, history, buffers, version)
+    return frame
 
-        # Process detections every few frames to improve performance
-        detections, _ = process_frame_detections(frame)
 
-        # Draw detections
-        frame = draw_detections_on_frame(frame, detections)
+def store_stream_detections(stream, detections):
+    """Keep a stream's detections in the detection store."""
+    record_detections(
+        detections,
+        f"camera:{stream.name}",
+        image_id=f"{stream.name}:{int(stream.started_at)}:{stream.frames_inferred}",
+    )
 
-        # Draw heatmap if enabled
-        if heatmap_enabled and len(latest_detections) > 0:
-            frame = draw_heatmap_on_frame(frame, list(latest_detections))
 
-        # Encode frame
-        ret, buffer = cv2.imencode(".jpg", frame)
-        if not ret:
+def parse_stream_sources(spec):
+    """Parse CAMERA_STREAMS, e.g. "beach=0;pier=rtsp://host/live;clip=a.mp4"."""
+    sources = {}
+    for entry in spec.split(";"):
+        if "=" not in entry:
             continue
+        name, source = entry.split("=", 1)
+        if name.strip() and source.strip():
+            sources[name.strip()] = source.strip()
+    return sources
 
-        frame_bytes = buffer.tobytes()
 
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
+def get_stream_manager():
+    """Return the process-wide stream registry, creating it on first use.
 
+    Aborts the request with a 503 when the app runs in several processes.
+    """
+    global stream_manager
 
-@app.route("/camera/start", methods=["POST"])
-def start_camera():
-    """Start the camera for live detection."""
-    global camera, camera_active, camera_lock
+    if stream_manager is not None:
+        return stream_manager
+    if SERVING_WORKERS > 1:
+        response = jsonify(
+            {
+                "success": False,
+                "message": "Camera streams need a single worker process "
+                f"(WEB_CONCURRENCY=1), this server runs {SERVING_WORKERS}",
+            }
+        )
+        response.status_code = 503
+        abort(response)
+
+    with stream_manager_lock:
+        if stream_manager is None:
+            from streams import CameraStream, InferencePool, StreamManager
+
+            pool = InferencePool(
+                infer_stream_frame,
+                workers=INFERENCE_WORKERS,
+                max_age_ms=CAMERA_MAX_FRAME_AGE_MS,
+                backlog_fn=inference_backlog,
+            )
 
-    try:
-        with camera_lock:
-            if camera_active:
-                return jsonify({"success": False, "message": "Camera already active"})
+            def create_stream(name, source, loop):
+                return CameraStream(
+                    name,
+                    source,
+                    pool,
+                    render_stream_frame,
+                    gate=make_frame_gate(),
+                    controller=make_camera_controller(),
+                    loop=loop,
+                    sink=store_stream_detections,
+                )
 
-            camera = VideoCamera()
-            camera_active = True
+            manager = StreamManager(pool, create_stream)
+            sources = {DEFAULT_STREAM: os.environ.get("CAMERA_DEVICE", "0")}
+            sources.update(parse_stream_sources(os.environ.get("CAMERA_STREAMS", "")))
+            for name, source in sources.items():
+                manager.add(name, source, loop=True)
+            stream_manager = manager
+    return stream_manager
 
-        return jsonify({"success": True, "message": "Camera started"})
+
+def unknown_stream(name):
+    return jsonify({"success": False, "message": f"Unknown stream: {name}"}), 404
+
+
+def generate_frames(name=DEFAULT_STREAM, tier=None):
+    """Generate frames of a stream for video streaming."""
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return iter(())
+    return stream.mjpeg(tier or MJPEG_DEFAULT_TIER)
+
+
+@app.route("/streams")
+def list_streams():
+    """List all streams with their status and the shared worker pool."""
+    manager = get_stream_manager()
+    return jsonify(
+        {
+            "streams": [stream.status() for stream in manager.all()],
+            "inference_pool": manager.pool.stats(),
+        }
+    )
+
+
+def streams_refused():
+    """Error response if streams cannot be changed over HTTP, else None."""
+    if not STREAMS_TOKEN:
+        return (
+            jsonify({"success": False, "message": "Adding streams is disabled"}),
+            403,
+        )
+    token = request.headers.get("X-Streams-Token", "")
+    if not hmac.compare_digest(token.encode(), STREAMS_TOKEN.encode()):
+        return jsonify({"success": False, "message": "Invalid streams token"}), 403
+    return None
+
+
+def stream_source_refused(source):
+    """Reason a client-supplied stream source is not allowed, else None."""
+    from urllib.parse import urlsplit
+
+    try:
+        parts = urlsplit(source)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return "Invalid stream URL"
+    if parts.scheme.lower() not in STREAM_URL_SCHEMES:
+        return "Only RTSP and HTTP(S) URLs can be added"
+    if host not in STREAM_ALLOWED_HOSTS:
+        return f"Host {host or '(none)'} is not in STREAM_ALLOWED_HOSTS"
+    return None
+
+
+@app.route("/streams", methods=["POST"])
+def add_stream():
+    """Register an RTSP/HTTP stream on one of the STREAM_ALLOWED_HOSTS."""
+    refused = streams_refused()
+    if refused:
+        return refused
+
+    data = request.get_json(silent=True) or {}
+    name = str(data.get("name", "")).strip()
+    source = str(data.get("source", "")).strip()
+    if not name or not source:
+        return (
+            jsonify({"success": False, "message": "name and source are required"}),
+            400,
+        )
+    reason = stream_source_refused(source)
+    if reason:
+        return jsonify({"success": False, "message": reason}), 403
+
+    try:
+        stream = get_stream_manager().add(name, source, loop=bool(data.get("loop")))
+        if data.get("start"):
+            stream.start()
+        return jsonify({"success": True, "stream": stream.status()})
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 409
     except Exception as e:
-        logging.error(f"Error starting camera: {str(e)}")
+        logging.error(f"Error adding stream {name}: {str(e)}")
         return jsonify({"success": False, "message": str(e)})
 
 
-@app.route("/camera/stop", methods=["POST"])
-def stop_camera():
-    """Stop the camera."""
-    global camera, camera_active, camera_lock, latest_detections
+@app.route("/streams/<name>", methods=["DELETE"])
+def remove_stream(name):
+    """Stop and unregister a stream."""
+    refused = streams_refused()
+    if refused:
+        return refused
+    if get_stream_manager().remove(name) is None:
+        return unknown_stream(name)
+    return jsonify({"success": True, "message": f"Stream {name} removed"})
 
-    try:
-        with camera_lock:
-            if camera:
-                camera.release()
-                camera = None
-            camera_active = False
-            latest_detections.clear()
 
-        return jsonify({"success": True, "message": "Camera stopped"})
+@app.route("/streams/<name>/start", methods=["POST"])
+def start_stream(name):
+    """Start a stream for live detection."""
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return unknown_stream(name)
+
+    try:
+        if not stream.start():
+            return jsonify({"success": False, "message": "Camera already active"})
+        return jsonify({"success": True, "message": "Camera started"})
     except Exception as e:
-        logging.error(f"Error stopping camera: {str(e)}")
+        logging.error(f"Error starting stream {name}: {str(e)}")
         return jsonify({"success": False, "message": str(e)})
 
 
-@app.route("/camera/toggle_heatmap", methods=["POST"])
-def toggle_heatmap():
-    """Toggle heatmap overlay."""
-    global heatmap_enabled
+@app.route("/streams/<name>/stop", methods=["POST"])
+def stop_stream(name):
+    """Stop a stream."""
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return unknown_stream(name)
 
     try:
-        heatmap_enabled = not heatmap_enabled
-        return jsonify({"success": True, "heatmap_enabled": heatmap_enabled})
+        stream.stop()
+        return jsonify({"success": True, "message": "Camera stopped"})
     except Exception as e:
-        logging.error(f"Error toggling heatmap: {str(e)}")
+        logging.error(f"Error stopping stream {name}: {str(e)}")
         return jsonify({"success": False, "message": str(e)})
 
 
-@app.route("/video_feed")
-def video_feed():
-    """Video streaming route."""
+@app.route("/streams/<name>/toggle_heatmap", methods=["POST"])
+def toggle_stream_heatmap(name):
+    """Toggle the heatmap overlay of a stream."""
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return unknown_stream(name)
+    return jsonify({"success": True, "heatmap_enabled": stream.toggle_heatmap()})
+
+
+@app.route("/streams/<name>/video_feed")
+def stream_video_feed(name):
+    """Video streaming route of a stream.
+
+    ?tier=thumbnail, preview or full picks the resolution and JPEG quality
+    (see frame_encoder.TIERS); viewers of a tier share each encoded frame.
+    """
+    from frame_encoder import TIERS
+
+    if get_stream_manager().get(name) is None:
+        return unknown_stream(name)
+    tier = request.args.get("tier", MJPEG_DEFAULT_TIER)
+    if tier not in TIERS:
+        return (
+            jsonify({"success": False, "message": f"Unknown tier: {tier}"}),
+            400,
+        )
     return Response(
-        generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame"
+        generate_frames(name, tier),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
     )
 
 
-@app.route("/camera/status")
-def camera_status():
-    """Get camera status."""
-    global camera_active, heatmap_enabled, latest_detections
-
-    detection_counts = {"fishing waste": 0, "metal": 0, "plastic": 0}
+@app.route("/streams/<name>/events")
+def stream_events(name):
+    """Push detection deltas and class counters of a stream as server-sent events.
 
-    # Count recent detections
-    for detection in latest_detections:
-        class_name = detection.get("class_name", "")
-        if class_name in detection_counts:
-            detection_counts[class_name] += 1
+    Clients may ask for fewer updates with ?max_hz=, up to LIVE_UPDATES_MAX_HZ.
+    """
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return unknown_stream(name)
 
-    return jsonify(
-        {
-            "active": camera_active,
-            "heatmap_enabled": heatmap_enabled,
-            "total_detections": len(latest_detections),
-            "detection_counts": detection_counts,
-        }
+    max_hz = request.args.get("max_hz", LIVE_UPDATES_MAX_HZ, type=float)
+    max_hz = min(max_hz, LIVE_UPDATES_MAX_HZ) if max_hz > 0 else LIVE_UPDATES_MAX_HZ
+    return Response(
+        stream.events(max_hz=max_hz),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.route("/streams/<name>/status")
+def stream_status(name):
+    """Get the status of a stream."""
+    stream = get_stream_manager().get(name)
+    if stream is None:
+        return unknown_stream(name)
+    return jsonify(stream.status())
+
+
+# The single-camera routes used by the live page act on the default stream
+@app.route("/camera/start", methods=["POST"])
+def start_camera():
+    return start_stream(DEFAULT_STREAM)
+
+
+@app.route("/camera/stop", methods=["POST"])
+def stop_camera():
+    return stop_stream(DEFAULT_STREAM)
+
+
+@app.route("/camera/toggle_heatmap", methods=["POST"])
+def toggle_heatmap():
+    return toggle_stream_heatmap(DEFAULT_STREAM)
+
+
+@app.route("/video_feed")
+def video_feed():
+    return stream_video_feed(DEFAULT_STREAM)
+
+
+@app.route("/camera/events")
+def camera_events():
+    return stream_events(DEFAULT_STREAM)
+
+
+@app.route("/camera/status")
+def camera_status():
+    return stream_status(DEFAULT_STREAM)
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
@@ -0,0 +1,143 @@
+import io
+import os
+import json
+import logging
+import threading
+
+
+class LocalModelBackend:
+    """Run a local YOLO model (PyTorch or ONNX export) on this machine.
+
+    Results use the same schema as the Roboflow hosted API, so the rest of the
+    app does not need to know where detections came from.
+    """
+
+    def __init__(self, model_path, imgsz=640, device="cpu"):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Load the model on first use."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from ultralytics import YOLO
+
+                    logging.info(f"Loading local model {self.model_path}")
+                    self._model = YOLO(self.model_path, task="detect")
+        return self._model
+
+    def predict(self, image, confidence=0.1, overlap=0.5):
+        """Detect debris in a single PIL image."""
+        return self.predict_batch([image], confidence, overlap)[0]
+
+    def predict_batch(self, images, confidence=0.1, overlap=0.5):
+        """Detect debris in a list of PIL images with one forward pass."""
+        outputs = self.model.predict(
+            images,
+            conf=confidence,
+            iou=overlap,
+            imgsz=self.imgsz,
+            device=self.device,
+            verbose=False,
+        )
+        return [self._to_roboflow(output) for output in outputs]
+
+    @staticmethod
+    def _to_roboflow(output):
+        """Convert one Ultralytics result into the Roboflow predictions schema."""
+        height, width = output.orig_shape
+        predictions = []
+
+        boxes = output.boxes
+        if boxes is not None and len(boxes):
+            xywh = boxes.xywh.cpu().numpy()
+            conf = boxes.conf.cpu().numpy()
+            cls = boxes.cls.cpu().numpy().astype(int)
+            for (x, y, w, h), score, class_id in zip(xywh, conf, cls):
+                predictions.append(
+                    {
+                        "x": float(x),
+                        "y": float(y),
+                        "width": float(w),
+                        "height": float(h),
+                        "confidence": float(score),
+                        "class": output.names.get(int(class_id), str(class_id)),
+                        "class_id": int(class_id),
+                    }
+                )
+
+        return {
+            "predictions": predictions,
+            "image": {"width": int(width), "height": int(height)},
+        }
+
+
+class RoboflowBackend:
+    """Call a Roboflow-compatible hosted detection endpoint over HTTP."""
+
+    def __init__(self, api_url, model_id, api_key, timeout=30):
+        import requests
+
+        self.url = f"{api_url.rstrip('/')}/{model_id}"
+        self.api_key = api_key
+        self.timeout = timeout
+        # Reuse connections across calls
+        self.session = requests.Session()
+
+    def predict(self, image, confidence=0.1, overlap=0.5):
+        """Detect debris in a single PIL image."""
+        image_bytes = io.BytesIO()
+        image.convert("RGB").save(image_bytes, format="JPEG", quality=85)
+
+        response = self.session.post(
+            self.url,
+            params={
+                "api_key": self.api_key,
+                "confidence": confidence,
+                "overlap": overlap,
+            },
+            files={"file": ("image.jpg", image_bytes.getvalue(), "image/jpeg")},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def predict_batch(self, images, confidence=0.1, overlap=0.5):
+        """Detect debris in a list of PIL images, one request each."""
+        return [self.predict(image, confidence, overlap) for image in images]
+
+
+def select_variant(report_path, accuracy_budget=0.01):
+    """Pick the fastest exported model whose mAP drop stays within the budget.
+
+    The report is the JSON written by export_model.py. The accuracy budget is
+    the largest acceptable absolute drop in mAP@0.5:0.95 against the original
+    checkpoint. Returns the selected report entry, or None if none qualify.
+    """
+    with open(report_path) as f:
+        report = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(report_path))
+    candidates = []
+    for variant in report.get("variants", []):
+        if variant.get("error"):
+            continue
+        drop = variant.get("map_drop")
+        if drop is None or drop > accuracy_budget:
+            continue
+        if variant.get("latency_ms", {}).get("p50") is None:
+            continue
+        candidates.append(variant)
+
+    if not candidates:
+        return None
+
+    best = dict(min(candidates, key=lambda v: v["latency_ms"]["p50"]))
+    if not os.path.isabs(best["path"]):
+        best["path"] = os.path.join(base_dir, best["path"])
+    return best
@@ -0,0 +1,217 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesce concurrent calls into batches for a single worker thread.
+
+    Callers submit one item at a time and get a Future back. The worker takes
+    the first waiting item, keeps collecting for up to max_wait_ms or until
+    max_batch_size items are queued, then hands the whole list to batch_fn.
+    batch_fn must return one result per item, in order; an Exception instance
+    in the result list fails only that item's Future, and a Future is chained
+    so the worker can move on to the next batch while calls are in flight.
+    Those calls count towards queue_depth() until they are answered.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=5.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        # Metrics
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=2000)
+        self._batches = 0
+        self._items = 0
+        self._failures = 0
+        self._max_depth = 0
+        self._in_flight = 0
+
+    def _ensure_worker(self):
+        """Start the worker thread, again if the process was forked."""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        if self._worker_pid is not None and self._worker_pid != os.getpid():
+            # Items queued in the parent belong to the parent's callers
+            self._queue = queue.Queue()
+            self._lock = threading.Lock()
+            self._in_flight = 0
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker = threading.Thread(
+                    target=self._run, name=f"{self.name}-worker", daemon=True
+                )
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, item):
+        """Queue an item for the next batch and return its Future."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+        return future
+
+    def queue_depth(self):
+        """Return the number of items waiting for a batch or still in flight."""
+        return self._queue.qsize() + self._in_flight
+
+    def __call__(self, item, timeout=None):
+        """Submit an item and wait for its result."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until full or timed out."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Still take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._queue_waits.extend(
+                    (started - queued) * 1000 for _, _, queued in batch
+                )
+
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name} returned {len(results)} results "
+                        f"for {len(batch)} items"
+                    )
+            except Exception as e:
+                logging.error(f"Error in {self.name} batch: {str(e)}")
+                results = [e] * len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Future):
+                    with self._lock:
+                        self._in_flight += 1
+                    result.add_done_callback(
+                        lambda done, target=future: self._finish(target, done)
+                    )
+                else:
+                    self._resolve(future, result)
+
+    def _finish(self, future, done):
+        """Complete a caller's Future from an in-flight call that finished."""
+        with self._lock:
+            self._in_flight -= 1
+        self._resolve(future, done.exception() or done.result())
+
+    def _resolve(self, future, result):
+        """Complete a caller's Future with a result or an exception."""
+        if isinstance(result, Exception):
+            with self._lock:
+                self._failures += 1
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        """Return batch size and queue wait metrics."""
+        with self._lock:
+            waits = np.array(self._queue_waits) if self._queue_waits else None
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "failures": self._failures,
+                "mean_batch_size": round(self._items / self._batches, 3)
+                if self._batches
+                else 0.0,
+                "batch_size_histogram": {
+                    str(size): count
+                    for size, count in sorted(self._batch_sizes.items())
+                },
+                "queue_depth": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "max_queue_depth": self._max_depth,
+                "queue_wait_ms": {
+                    "p50": round(float(np.percentile(waits, 50)), 3),
+                    "p95": round(float(np.percentile(waits, 95)), 3),
+                    "p99": round(float(np.percentile(waits, 99)), 3),
+                }
+                if waits is not None
+                else None,
+            }
+
+
+def local_batch_fn(predictor, overlap=0.5):
+    """Batch function running one forward pass for (image, confidence) items."""
+
+    def run(items):
+        images = [image for image, _ in items]
+        # One pass at the lowest requested threshold, filtered per caller below
+        floor = min(confidence for _, confidence in items)
+        results = predictor.predict_batch(images, confidence=floor, overlap=overlap)
+
+        filtered = []
+        for (_, confidence), result in zip(items, results):
+            filtered.append(
+                dict(
+                    result,
+                    predictions=[
+                        p
+                        for p in result["predictions"]
+                        if p["confidence"] >= confidence
+                    ],
+                )
+            )
+        return filtered
+
+    return run
+
+
+def pipelined_batch_fn(call, max_in_flight=8):
+    """Batch function issuing one remote call per item without waiting on them."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    state = {"pool": None, "pid": None}
+
+    def run(items):
+        # Executor threads do not survive a fork, so make a new pool per process
+        if state["pid"] != os.getpid():
+            state["pool"] = ThreadPoolExecutor(
+                max_workers=max_in_flight, thread_name_prefix="upstream"
+            )
+            state["pid"] = os.getpid()
+        return [state["pool"].submit(call, item) for item in items]
+
+    return run
@@ -0,0 +1,1053 @@
+import os
+import io
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import socket
+import importlib.util
+import logging
+import argparse
+import threading
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Configure logging
+logging.basicConfig(level=logging.WARNING)
+
+RESULTS_DIR = os.environ.get("BENCHMARK_RESULTS_DIR", "benchmark_results")
+HISTORY_FILE = "history.jsonl"
+BASELINE_FILE = "baseline.json"
+
+RAW_CLASSES = ["Bottle", "Can", "Fishing-net", "Plastic-bag", "Rope", "Tin", "Buoy"]
+
+
+def synthetic_image(width, height, seed=0):
+    """Return a reproducible noisy RGB PIL image."""
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+
+def synthetic_predictions(count, width, height, seed=0):
+    """Return a Roboflow-style result with `count` reproducible boxes."""
+    rng = random.Random(seed)
+    predictions = []
+    for _ in range(count):
+        w = rng.uniform(0.02, 0.2) * width
+        h = rng.uniform(0.02, 0.2) * height
+        predictions.append(
+            {
+                "x": rng.uniform(w / 2, width - w / 2),
+                "y": rng.uniform(h / 2, height - h / 2),
+                "width": w,
+                "height": h,
+                "confidence": rng.uniform(0.1, 0.99),
+                "class": rng.choice(RAW_CLASSES),
+            }
+        )
+    return {"predictions": predictions, "image": {"width": width, "height": height}}
+
+
+class MockRoboflowServer:
+    """Run the Roboflow stand-in on a background thread for the benchmarks."""
+
+    def __init__(self, boxes, latency_ms=0.0, port=0):
+        from werkzeug.serving import make_server
+
+        from standin_server import create_app
+
+        standin = create_app(
+            {"boxes": boxes, "latency_ms": latency_ms, "classes": RAW_CLASSES}
+        )
+        self.server = make_server("127.0.0.1", port, standin, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def time_call(func, repeat, warmup=2):
+    """Call func repeatedly and return latency statistics in milliseconds."""
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return latency_stats(timings)
+
+
+def latency_stats(timings_ms):
+    """Summarise a list of latencies in milliseconds."""
+    timings = np.array(timings_ms)
+    return {
+        "mean_ms": round(float(timings.mean()), 4),
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+    }
+
+
+def bench_categorize(app_module, repeat):
+    """Microbenchmark categorize_detection() over a mix of raw class names."""
+    names = RAW_CLASSES + ["plastic", "METAL waste", "Unknown-thing", None]
+    return {
+        "categorize_detection": time_call(
+            lambda: [app_module.categorize_detection(name) for name in names], repeat
+        )
+    }
+
+
+def bench_draw_detections(app_module, repeat, box_counts, width, height):
+    """Microbenchmark draw_detections() at several box counts."""
+    image = synthetic_image(width, height)
+    results = {}
+    for boxes in box_counts:
+        result = synthetic_predictions(boxes, width, height)
+        results[f"draw_detections[{boxes}]"] = time_call(
+            lambda: app_module.draw_detections(image, result), repeat
+        )
+    return results
+
+
+def bench_heatmap(app_module, repeat, box_counts, width, height):
+    """Microbenchmark draw_heatmap_on_frame() at several history sizes."""
+    if importlib.util.find_spec("cv2") is None:
+        logging.warning("OpenCV not installed, skipping heatmap benchmark")
+        return {}
+
+    frame = np.asarray(synthetic_image(width, height))[:, :, ::-1].copy()
+    results = {}
+    for boxes in box_counts:
+        history, _ = app_module.parse_predictions(
+            synthetic_predictions(boxes, width, height)
+        )
+        results[f"draw_heatmap_on_frame[{boxes}]"] = time_call(
+            lambda: app_module.draw_heatmap_on_frame(frame.copy(), history), repeat
+        )
+    return results
+
+
+class SyntheticCamera:
+    """Capture stand-in for a stream source that returns generated BGR frames."""
+
+    def __init__(self, width, height, frames=8, seed=0):
+        self.frames = [
+            np.asarray(synthetic_image(width, height, seed + index))[:, :, ::-1].copy()
+            for index in range(frames)
+        ]
+        self.index = 0
+
+    def read(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return True, frame.copy()
+
+    def release(self):
+        pass
+
+
+def bench_generate_frames(
+    app_module, frames, width, height, heatmap, static=False, streams=1
+):
+    """Measure per-stream MJPEG throughput against the mock endpoint.
+
+    Several streams share the app's inference pool, each with its own viewer.
+    A static scene repeats one frame so the motion gate can skip inference.
+    """
+    if importlib.util.find_spec("cv2") is None:
+        logging.warning("OpenCV not installed, skipping generate_frames benchmark")
+        return {}
+
+    manager = app_module.get_stream_manager()
+    names = [f"bench-{index}" for index in range(streams)]
+    for index, name in enumerate(names):
+        stream = manager.add(
+            name,
+            SyntheticCamera(width, height, frames=1 if static else 8, seed=index * 8),
+        )
+        stream.heatmap_enabled = heatmap
+        stream.start()
+
+    timings = []
+    timings_lock = threading.Lock()
+
+    def view(name):
+        generator = app_module.generate_frames(name)
+        local = []
+        try:
+            next(generator)
+            for _ in range(frames):
+                start = time.perf_counter()
+                next(generator)
+                local.append((time.perf_counter() - start) * 1000)
+        finally:
+            generator.close()
+        with timings_lock:
+            timings.extend(local)
+
+    viewers = [threading.Thread(target=view, args=(name,)) for name in names]
+    try:
+        for viewer in viewers:
+            viewer.start()
+        for viewer in viewers:
+            viewer.join()
+        gates = [manager.get(name).gate for name in names]
+    finally:
+        for name in names:
+            manager.remove(name)
+
+    stats = latency_stats(timings)
+    stats["fps"] = round(1000 / stats["mean_ms"], 2)
+    stats["aggregate_fps"] = round(stats["fps"] * streams, 2)
+    stats["skip_ratio"] = (
+        round(sum(gate.stats()["skip_ratio"] for gate in gates) / len(gates), 4)
+        if all(gate is not None for gate in gates)
+        else None
+    )
+    stats["inference_pool"] = manager.pool.stats()
+    scene = "static" if static else "moving"
+    suffix = f",streams={streams}" if streams > 1 else ""
+    return {f"generate_frames[heatmap={heatmap},{scene}{suffix}]": stats}
+
+
+def bench_mjpeg(app_module, frames, width, height, viewers):
+    """Per-frame cost and memory of MJPEG encoding for several viewers.
+
+    per_viewer is the old path: every viewer renders a copy of the frame,
+    encodes it, and builds its chunk with tobytes() and concatenation.
+    shared is the stream's FrameEncoder: one render into reused buffers and
+    one encoding per tier. alloc_peak_bytes is the tracemalloc high-water
+    mark of a frame above the memory held before it (median over frames).
+    """
+    if importlib.util.find_spec("cv2") is None:
+        logging.warning("OpenCV not installed, skipping mjpeg benchmark")
+        return {}
+    import tracemalloc
+
+    import cv2
+
+    from frame_encoder import TIERS, FrameEncoder
+
+    camera = SyntheticCamera(width, height)
+    detections, _ = app_module.parse_predictions(
+        synthetic_predictions(20, width, height)
+    )
+    history = detections * 10
+
+    def per_viewer(seq, frame, tiers):
+        chunks = []
+        for _ in tiers:
+            rendered = app_module.render_stream_frame(frame.copy(), detections, history)
+            _, buffer = cv2.imencode(".jpg", rendered)
+            chunks.append(
+                b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+                + buffer.tobytes()
+                + b"\r\n"
+            )
+        return chunks
+
+    def shared(seq, frame, tiers):
+        return [encoder.chunk(seq, frame, tier) for tier in tiers]
+
+    names = list(TIERS)
+    mixed = [names[index % len(names)] for index in range(viewers)]
+    cases = [
+        ("per_viewer", per_viewer, ["full"] * viewers),
+        ("shared", shared, ["full"] * viewers),
+        ("shared", shared, mixed),
+    ]
+    results = {}
+    seq = 0
+    for name, encode, tiers in cases:
+        encoder = FrameEncoder(
+            lambda canvas, buffers: app_module.render_stream_frame(
+                canvas, detections, history, buffers, 1
+            )
+        )
+        timings = []
+        for _ in range(frames):
+            seq += 1
+            _, frame = camera.read()
+            start = time.perf_counter()
+            encode(seq, frame, tiers)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(min(frames, 10)):
+                seq += 1
+                _, frame = camera.read()
+                tracemalloc.reset_peak()
+                held = tracemalloc.get_traced_memory()[0]
+                encode(seq, frame, tiers)
+                peaks.append(tracemalloc.get_traced_memory()[1] - held)
+        finally:
+            tracemalloc.stop()
+
+        stats = latency_stats(timings)
+        stats["fps"] = round(1000 / stats["mean_ms"], 2)
+        stats["alloc_peak_bytes"] = int(np.median(peaks))
+        if name == "shared":
+            stats["buffer_allocations"] = encoder.buffers.allocations
+        label = "full" if len(set(tiers)) == 1 else "mixed"
+        results[f"mjpeg[{name},{label},viewers={viewers}]"] = stats
+    return results
+
+
+def populate_store(path, rows, chunk_size=100000):
+    """Bulk-load a detection store with synthetic rows, one per second."""
+    import sqlite3
+
+    from detection_store import DetectionStore
+
+    DetectionStore(path)
+    rng = random.Random(0)
+    categories = ["plastic", "metal", "fishing waste"]
+    connection = sqlite3.connect(path)
+    with connection:
+        for offset in range(0, rows, chunk_size):
+            connection.executemany(
+                "INSERT INTO detections (ts, source, image_id, category, raw_class, "
+                "confidence, x1, y1, x2, y2, lat, lon) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        float(index),
+                        "upload",
+                        f"img{index // 8}",
+                        categories[index % 3],
+                        "Bottle",
+                        rng.random(),
+                        10.0,
+                        20.0,
+                        110.0,
+                        140.0,
+                        50.3 + rng.random() / 100 if index % 2 else None,
+                        -4.1 + rng.random() / 100 if index % 2 else None,
+                    )
+                    for index in range(offset, min(rows, offset + chunk_size))
+                ),
+            )
+    connection.close()
+
+
+def _export_worker(path, fmt, end, queue):
+    """Child process body for bench_export(): export to nowhere, report RSS."""
+    import resource
+
+    import export
+    from detection_store import DetectionStore
+
+    store = DetectionStore(path)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    rows = 0
+    size = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    start = time.perf_counter()
+    for piece in export.encode(counted(export.iter_store_rows(store, end=end)), fmt):
+        size += len(piece)
+    seconds = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    queue.put(
+        {"rows": rows, "bytes": size, "seconds": seconds, "rss": (baseline, peak)}
+    )
+
+
+def bench_export(rows, formats):
+    """Export throughput and peak memory at 10% and 100% of a large store.
+
+    Each export runs in a fresh process; constant memory shows as the same
+    RSS growth for both sizes.
+    """
+    import export
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "detections.db")
+        start = time.perf_counter()
+        populate_store(path, rows)
+        logging.warning(
+            f"Populated {rows} rows in {time.perf_counter() - start:.1f}s"
+        )
+
+        context = multiprocessing.get_context("spawn")
+        for fmt in formats:
+            if fmt == "parquet" and not export.parquet_available():
+                logging.warning("pyarrow not installed, skipping Parquet export")
+                continue
+            for count in (max(1, rows // 10), rows):
+                queue = context.Queue()
+                process = context.Process(
+                    target=_export_worker, args=(path, fmt, float(count), queue)
+                )
+                process.start()
+                result = queue.get()
+                process.join()
+
+                baseline, peak = result["rss"]
+                results[f"export[{fmt},{count}]"] = {
+                    "rows": result["rows"],
+                    "seconds": round(result["seconds"], 3),
+                    "rows_per_s": round(result["rows"] / result["seconds"]),
+                    "mb_per_s": round(result["bytes"] / 1024**2 / result["seconds"], 2),
+                    "output_mb": round(result["bytes"] / 1024**2, 2),
+                    "peak_rss_mb": round(peak / 1024**2, 1),
+                    "rss_growth_mb": round((peak - baseline) / 1024**2, 1),
+                }
+    return results
+
+
+def bench_predict(app_module, concurrency_levels, requests_per_level, width, height):
+    """End-to-end /predict latency and throughput at several concurrency levels."""
+    import requests
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/predict?format=json"
+
+    upload = io.BytesIO()
+    synthetic_image(width, height).save(upload, format="JPEG", quality=90)
+    payload = upload.getvalue()
+
+    def one_request(session):
+        start = time.perf_counter()
+        response = session.post(
+            url,
+            files={"image": ("bench.jpg", payload, "image/jpeg")},
+            data={"confidence": "0.1"},
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, response.status_code == 200
+
+    results = {}
+    try:
+        for concurrency in concurrency_levels:
+            sessions = [requests.Session() for _ in range(concurrency)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(
+                    pool.map(
+                        lambda i: one_request(sessions[i % concurrency]),
+                        range(requests_per_level),
+                    )
+                )
+            wall = time.perf_counter() - start
+
+            stats = latency_stats([elapsed for elapsed, _ in outcomes])
+            stats["throughput_rps"] = round(requests_per_level / wall, 2)
+            stats["errors"] = sum(1 for _, ok in outcomes if not ok)
+            results[f"predict[c={concurrency}]"] = stats
+    finally:
+        server.shutdown()
+
+    return results
+
+
+class CachingClient:
+    """A browser-like HTTP client that caches and counts the bytes on the wire.
+
+    Responses with a max-age are reused until they expire; others are
+    revalidated with If-None-Match / If-Modified-Since when they carried a
+    validator. Bytes are bodies as sent (still compressed) plus headers.
+    """
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.cache = {}
+        self.counts = dict.fromkeys(
+            ("requests", "not_modified", "cache_hits", "up_bytes", "down_bytes"), 0
+        )
+
+    def _send(self, method, path, headers=None, **kwargs):
+        from urllib.parse import urljoin
+
+        response = self.session.request(
+            method, urljoin(self.base_url, path), headers=headers, stream=True, **kwargs
+        )
+        raw = response.raw.read(decode_content=False)
+        sent = response.request
+        self.counts["requests"] += 1
+        self.counts["up_bytes"] += len(sent.body or b"") + sum(
+            len(k) + len(v) + 4 for k, v in sent.headers.items()
+        )
+        self.counts["down_bytes"] += len(raw) + sum(
+            len(k) + len(v) + 4 for k, v in response.headers.items()
+        )
+        encoding = response.headers.get("Content-Encoding")
+        body = gzip.decompress(raw) if encoding == "gzip" and raw else raw
+        return response, body
+
+    def get(self, path):
+        entry = self.cache.get(path)
+        if entry is not None and entry["expires"] > time.time():
+            self.counts["cache_hits"] += 1
+            return entry["body"]
+        headers = {}
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response, body = self._send("GET", path, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.counts["not_modified"] += 1
+            body = entry["body"]
+        cache_control = response.headers.get("Cache-Control", "")
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        fresh = int(max_age.group(1)) if max_age and "no-" not in cache_control else 0
+        self.cache[path] = {
+            "body": body,
+            "expires": time.time() + fresh,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        return body
+
+    def post(self, path, **kwargs):
+        return self._send("POST", path, **kwargs)
+
+    def load_page(self, path="/"):
+        """Fetch a page and the same-origin scripts and stylesheets it links."""
+        html = self.get(path).decode("utf-8", "replace")
+        for url in re.findall(r'(?:src|href)="(/static/[^"]+)"', html):
+            self.get(url.replace("&amp;", "&"))
+
+
+def bench_session(url, flows, uploads, width, height):
+    """Bytes per user session: a page load, some uploads and a reload.
+
+    The legacy flow is the client before versioned assets: every upload is
+    posted twice, for the image and for the JSON with the debris library
+    embedded. The current flow posts once with image=1 and fetches the
+    library from debris_info_url, which the client then caches. Run the
+    legacy flow against an older server with --session-url.
+    """
+    upload = io.BytesIO()
+    synthetic_image(width, height).save(upload, format="JPEG", quality=90)
+    payload = upload.getvalue()
+    files = {"image": ("bench.jpg", payload, "image/jpeg")}
+
+    results = {}
+    for flow in flows:
+        client = CachingClient(url)
+        client.load_page()
+        for _ in range(uploads):
+            if flow == "legacy":
+                client.post("/predict", files=files)
+                client.post("/predict?format=json", files=files)
+            else:
+                _, body = client.post("/predict?format=json&image=1", files=files)
+                client.get(json.loads(body)["debris_info_url"])
+        client.load_page()
+        counts = client.counts
+        counts["total_bytes"] = counts["up_bytes"] + counts["down_bytes"]
+        results[f"session[{flow},uploads={uploads}]"] = counts
+    return results
+
+
+def free_port():
+    """Return a TCP port that is free on localhost right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_http(url, timeout=60):
+    """Poll url until it answers, raising if it does not within timeout."""
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def bench_scaling(worker_counts, requests_per_worker, boxes, width, height):
+    """/predict throughput under gunicorn with increasing worker processes.
+
+    Each level starts `gunicorn main:app` with gunicorn.conf.py and
+    WEB_CONCURRENCY workers against a stand-in server in its own process, so
+    neither the stand-in nor the load generator shares a GIL with the app.
+    Efficiency is throughput per worker relative to one worker; it can only
+    stay near 1.0 while there are at least as many free cores as workers.
+    """
+    import requests
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    standin_port = free_port()
+    standin = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(here, "standin_server.py"),
+            "--port",
+            str(standin_port),
+            "--boxes",
+            str(boxes),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    upload = io.BytesIO()
+    synthetic_image(width, height).save(upload, format="JPEG", quality=90)
+    payload = upload.getvalue()
+
+    results = {}
+    single = None
+    try:
+        wait_for_http(f"http://127.0.0.1:{standin_port}/")
+        for workers in worker_counts:
+            port = free_port()
+            env = dict(
+                os.environ,
+                ROBOFLOW_API_URL=f"http://127.0.0.1:{standin_port}",
+                BIND=f"127.0.0.1:{port}",
+                WEB_CONCURRENCY=str(workers),
+                DETECTION_STORE="0",
+                MAX_REQUESTS="0",
+            )
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "main:app"],
+                cwd=here,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                url = f"http://127.0.0.1:{port}"
+                wait_for_http(f"{url}/health")
+                concurrency = 2 * workers
+                sessions = [requests.Session() for _ in range(concurrency)]
+
+                def one_request(index):
+                    start = time.perf_counter()
+                    response = sessions[index % concurrency].post(
+                        f"{url}/predict?format=json",
+                        files={"image": ("bench.jpg", payload, "image/jpeg")},
+                    )
+                    elapsed = (time.perf_counter() - start) * 1000
+                    return elapsed, response.status_code == 200
+
+                total = requests_per_worker * workers
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    # Warm every worker's connections and lazy state first
+                    list(pool.map(one_request, range(concurrency)))
+                    start = time.perf_counter()
+                    outcomes = list(pool.map(one_request, range(total)))
+                    wall = time.perf_counter() - start
+                # Idle keep-alive connections would hold up the graceful stop
+                for session in sessions:
+                    session.close()
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+
+            stats = latency_stats([elapsed for elapsed, _ in outcomes])
+            stats["throughput_rps"] = round(total / wall, 2)
+            stats["errors"] = sum(1 for _, ok in outcomes if not ok)
+            if single is None:
+                single = stats["throughput_rps"] / workers
+            stats["efficiency"] = round(stats["throughput_rps"] / workers / single, 3)
+            results[f"scaling[workers={workers}]"] = stats
+    finally:
+        standin.terminate()
+        standin.wait(timeout=10)
+
+    return results
+
+
+def import_profile(here, env):
+    """Import app in a fresh interpreter; return per-module cumulative ms.
+
+    Only app itself and the modules it imports directly are kept.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=here,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    # Lines look like "import time:  self [us] | cumulative | <indent>module";
+    # the interpreter's own imports come first and end with site
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() != "app":
+            modules.clear()
+        elif depth <= 1:
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+def bench_startup(repeat, modules=8):
+    """Cold start: import time per module and time to first /health and /ready.
+
+    The server is `gunicorn main:app` with one worker. /health answers once
+    the app is imported; /ready once the worker has warmed up.
+    """
+    import requests
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, DETECTION_STORE="0", WEB_CONCURRENCY="1")
+
+    profiles = [import_profile(here, env) for _ in range(repeat)]
+    imported = {}
+    for profile in profiles:
+        for name, ms in profile.items():
+            imported.setdefault(name, []).append(ms)
+    medians = {name: float(np.median(ms)) for name, ms in imported.items()}
+    slowest = sorted(
+        (name for name in medians if name != "app"),
+        key=lambda name: medians[name],
+        reverse=True,
+    )[:modules]
+    results = {
+        "startup[import]": dict(
+            {"import_ms": round(medians["app"], 2)},
+            **{f"{name}_ms": round(medians[name], 2) for name in slowest},
+        )
+    }
+
+    timings = {"first_health_ms": [], "first_ready_ms": []}
+    for _ in range(repeat):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "main:app"],
+            cwd=here,
+            env=dict(env, BIND=f"127.0.0.1:{port}"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            probes = (("/health", "first_health_ms"), ("/ready", "first_ready_ms"))
+            for path, key in probes:
+                while True:
+                    try:
+                        if requests.get(url + path, timeout=5).status_code == 200:
+                            break
+                    except requests.RequestException:
+                        pass
+                    if time.perf_counter() - start > 120:
+                        raise RuntimeError(f"{path} not ready within 120s")
+                    time.sleep(0.01)
+                timings[key].append((time.perf_counter() - start) * 1000)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+    results["startup[gunicorn]"] = {
+        key: round(float(np.median(values)), 2) for key, values in timings.items()
+    }
+    return results
+
+
+def git_revision():
+    """Return the current git commit, if available."""
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def find_regressions(current, baseline, threshold):
+    """Return the metrics that got worse than baseline by more than threshold."""
+    regressions = []
+    for name, metrics in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key, value in metrics.items():
+            old = before.get(key)
+            if not old or key == "errors":
+                continue
+            # Latencies should not grow, throughputs should not shrink
+            if key.endswith("_ms") or key.endswith("_bytes"):
+                change = (value - old) / old
+            elif key in ("fps", "throughput_rps", "rows_per_s", "efficiency"):
+                change = (old - value) / old
+            else:
+                continue
+            if change > threshold:
+                regressions.append(
+                    {
+                        "benchmark": name,
+                        "metric": key,
+                        "baseline": old,
+                        "current": value,
+                        "change": round(change, 4),
+                    }
+                )
+    return regressions
+
+
+def run(args):
+    """Run the selected benchmarks offline against the mock endpoint."""
+    box_counts = [int(count) for count in args.boxes.split(",")]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = {}
+    suites = set(args.suites.split(","))
+    if "export" in suites:
+        results.update(bench_export(args.export_rows, args.export_formats.split(",")))
+        suites.discard("export")
+    if "startup" in suites:
+        results.update(bench_startup(max(1, args.repeat // 4)))
+        suites.discard("startup")
+    if "scaling" in suites:
+        results.update(
+            bench_scaling(
+                [int(count) for count in args.workers.split(",")],
+                args.requests,
+                max(box_counts),
+                args.width,
+                args.height,
+            )
+        )
+        suites.discard("scaling")
+    if "session" in suites and args.session_url:
+        results.update(
+            bench_session(
+                args.session_url,
+                args.session_flows.split(","),
+                args.session_uploads,
+                args.width,
+                args.height,
+            )
+        )
+        suites.discard("session")
+    if not suites:
+        return results
+
+    with MockRoboflowServer(max(box_counts), args.mock_latency_ms) as mock:
+        # Point the app at the mock before importing it, and keep the mock
+        # detections out of the real detection store
+        os.environ["ROBOFLOW_API_URL"] = mock.url
+        os.environ["DETECTION_STORE"] = "0"
+        import app as app_module
+
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+        if "categorize" in suites:
+            results.update(bench_categorize(app_module, args.repeat * 100))
+        if "draw" in suites:
+            results.update(
+                bench_draw_detections(
+                    app_module, args.repeat, box_counts, args.width, args.height
+                )
+            )
+        if "heatmap" in suites:
+            results.update(
+                bench_heatmap(
+                    app_module, args.repeat, box_counts, args.width, args.height
+                )
+            )
+        if "frames" in suites:
+            cases = [(False, False, 1), (True, False, 1), (False, True, 1)]
+            if args.streams > 1:
+                cases.append((False, False, args.streams))
+            for heatmap, static, streams in cases:
+                results.update(
+                    bench_generate_frames(
+                        app_module,
+                        args.repeat,
+                        args.width,
+                        args.height,
+                        heatmap,
+                        static,
+                        streams,
+                    )
+                )
+        if "mjpeg" in suites:
+            results.update(
+                bench_mjpeg(
+                    app_module, args.repeat, args.width, args.height, args.viewers
+                )
+            )
+        if "predict" in suites:
+            results.update(
+                bench_predict(
+                    app_module,
+                    concurrency_levels,
+                    args.requests,
+                    args.width,
+                    args.height,
+                )
+            )
+        if "session" in suites:
+            from werkzeug.serving import make_server
+
+            server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                results.update(
+                    bench_session(
+                        f"http://127.0.0.1:{server.server_port}",
+                        args.session_flows.split(","),
+                        args.session_uploads,
+                        args.width,
+                        args.height,
+                    )
+                )
+            finally:
+                server.shutdown()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the web service hot paths")
+    parser.add_argument(
+        "--suites",
+        default="categorize,draw,heatmap,frames,mjpeg,predict",
+        help="Comma separated subset of categorize,draw,heatmap,frames,mjpeg,predict,"
+        "export,scaling,startup,session (the last four are not run by default)",
+    )
+    parser.add_argument(
+        "--session-url",
+        help="Run the session suite against this server instead of in-process",
+    )
+    parser.add_argument(
+        "--session-flows",
+        default="legacy,current",
+        help="Client flows of the session suite; only legacy works on old servers",
+    )
+    parser.add_argument("--session-uploads", type=int, default=3)
+    parser.add_argument(
+        "--workers",
+        default="1,2,4",
+        help="gunicorn worker counts for the scaling suite",
+    )
+    parser.add_argument(
+        "--export-rows",
+        type=int,
+        default=2000000,
+        help="Detections in the store for the export suite",
+    )
+    parser.add_argument("--export-formats", default="csv,geojson,parquet")
+    parser.add_argument("--boxes", default="0,10,100", help="Box counts to test")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument(
+        "--streams",
+        type=int,
+        default=4,
+        help="Concurrent camera streams in the multi-stream frames case",
+    )
+    parser.add_argument(
+        "--viewers", type=int, default=4, help="Viewers of one stream (mjpeg suite)"
+    )
+    parser.add_argument(
+        "--mock-latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated inference latency of the mock endpoint",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=64, help="Requests per concurrency level"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown that counts as a regression",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store this run as the baseline"
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "config": {
+            "boxes": args.boxes,
+            "size": [args.width, args.height],
+            "concurrency": args.concurrency,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, HISTORY_FILE), "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    for name, metrics in results.items():
+        summary = ", ".join(f"{key}={value}" for key, value in metrics.items())
+        print(f"{name:<36} {summary}")
+
+    baseline_path = os.path.join(RESULTS_DIR, BASELINE_FILE)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+                f"{regression['baseline']} -> {regression['current']} "
+                f"({regression['change']:+.1%})"
+            )
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against baseline {baseline.get('revision')}")
+
+
+if __name__ == "__main__":
+    main()
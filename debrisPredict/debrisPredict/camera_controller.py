@@ -0,0 +1,158 @@
+import time
+import threading
+from collections import deque
+
+# Quality ladder from best to cheapest. Each step trades image detail or
+# detection freshness for speed.
+QUALITY_LEVELS = [
+    {"capture": (1280, 720), "input_size": 1280, "jpeg_quality": 90, "infer_every": 1},
+    {"capture": (960, 540), "input_size": 960, "jpeg_quality": 85, "infer_every": 1},
+    {"capture": (640, 480), "input_size": 640, "jpeg_quality": 85, "infer_every": 1},
+    {"capture": (640, 480), "input_size": 512, "jpeg_quality": 75, "infer_every": 2},
+    {"capture": (480, 360), "input_size": 416, "jpeg_quality": 70, "infer_every": 3},
+    {"capture": (320, 240), "input_size": 320, "jpeg_quality": 60, "infer_every": 5},
+]
+
+# The level matching the original fixed 640x480 / quality 85 pipeline
+DEFAULT_LEVEL = 2
+
+
+class AdaptiveController:
+    """Feedback controller holding a target stream FPS and detection latency.
+
+    The camera loop reports every streamed frame and every inference call.
+    Once per adjust interval the controller steps down the quality ladder
+    when latency, frame rate or the inference queue miss their targets, and
+    steps back up after the targets have been met with headroom for a few
+    intervals in a row.
+    """
+
+    def __init__(
+        self,
+        target_fps=10.0,
+        target_latency_ms=500.0,
+        levels=None,
+        start_level=DEFAULT_LEVEL,
+        adjust_interval=1.0,
+        upgrade_after=3,
+        smoothing=0.3,
+    ):
+        self.target_fps = target_fps
+        self.target_latency_ms = target_latency_ms
+        self.levels = levels or QUALITY_LEVELS
+        self.level = min(max(0, start_level), len(self.levels) - 1)
+        self.adjust_interval = adjust_interval
+        self.upgrade_after = upgrade_after
+        self.smoothing = smoothing
+
+        self.latency_ms = None
+        self.fps = None
+        self.queue_depth = 0
+        self._last_frame = None
+        self._last_adjust = None
+        self._good_intervals = 0
+        self._lock = threading.Lock()
+        self.decisions = deque(maxlen=20)
+
+    def _smooth(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    @property
+    def settings(self):
+        """Return the capture and inference settings of the current level."""
+        level = self.levels[self.level]
+        return dict(
+            level,
+            # Give up on a frame well before it would stall the stream
+            timeout=max(1.0, 3 * self.target_latency_ms / 1000),
+        )
+
+    def record_frame(self, now=None):
+        """Record that a frame was streamed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_frame is not None and now > self._last_frame:
+                self.fps = self._smooth(self.fps, 1.0 / (now - self._last_frame))
+            self._last_frame = now
+
+    def record_inference(self, latency_ms, queue_depth=0):
+        """Record the latency of one inference call and the waiting queue."""
+        with self._lock:
+            self.latency_ms = self._smooth(self.latency_ms, latency_ms)
+            self.queue_depth = queue_depth
+
+    def update(self, now=None):
+        """Move along the quality ladder if needed; return True on a change."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_adjust is None:
+                self._last_adjust = now
+            if now - self._last_adjust < self.adjust_interval:
+                return False
+            self._last_adjust = now
+
+            reasons = []
+            if self.latency_ms is not None and self.latency_ms > self.target_latency_ms:
+                reasons.append(f"latency {self.latency_ms:.0f}ms")
+            if self.fps is not None and self.fps < self.target_fps * 0.9:
+                reasons.append(f"fps {self.fps:.1f}")
+            if self.queue_depth > 1:
+                reasons.append(f"queue depth {self.queue_depth}")
+
+            if reasons:
+                self._good_intervals = 0
+                if self.level < len(self.levels) - 1:
+                    return self._move(self.level + 1, ", ".join(reasons))
+                return False
+
+            headroom = (
+                self.latency_ms is not None
+                and self.latency_ms < self.target_latency_ms * 0.6
+                and (self.fps is None or self.fps >= self.target_fps * 0.95)
+            )
+            if headroom:
+                self._good_intervals += 1
+                if self._good_intervals >= self.upgrade_after and self.level > 0:
+                    self._good_intervals = 0
+                    return self._move(self.level - 1, "targets met with headroom")
+            else:
+                self._good_intervals = 0
+            return False
+
+    def _move(self, level, reason):
+        self.decisions.append(
+            {
+                "time": round(time.time(), 3),
+                "from_level": self.level,
+                "to_level": level,
+                "reason": reason,
+            }
+        )
+        self.level = level
+        return True
+
+    def status(self):
+        """Return targets, measurements, current settings and recent decisions."""
+        with self._lock:
+            settings = self.settings
+            return {
+                "target_fps": self.target_fps,
+                "target_latency_ms": self.target_latency_ms,
+                "fps": round(self.fps, 2) if self.fps is not None else None,
+                "latency_ms": round(self.latency_ms, 1)
+                if self.latency_ms is not None
+                else None,
+                "queue_depth": self.queue_depth,
+                "level": self.level,
+                "settings": {
+                    "capture_width": settings["capture"][0],
+                    "capture_height": settings["capture"][1],
+                    "input_size": settings["input_size"],
+                    "jpeg_quality": settings["jpeg_quality"],
+                    "infer_every": settings["infer_every"],
+                    "timeout_s": settings["timeout"],
+                },
+                "decisions": list(self.decisions),
+            }
@@ -0,0 +1,209 @@
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+import numpy as np
+
+
+def box_iou(a, b):
+    """IoU of two Roboflow-style centre/size predictions."""
+    ax1, ay1 = a["x"] - a["width"] / 2, a["y"] - a["height"] / 2
+    bx1, by1 = b["x"] - b["width"] / 2, b["y"] - b["height"] / 2
+    ix = max(0.0, min(ax1 + a["width"], bx1 + b["width"]) - max(ax1, bx1))
+    iy = max(0.0, min(ay1 + a["height"], by1 + b["height"]) - max(ay1, by1))
+    intersection = ix * iy
+    union = a["width"] * a["height"] + b["width"] * b["height"] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def merge_results(first, second, keep_confidence, iou_threshold=0.5):
+    """Second-stage predictions plus confident first-stage ones it missed."""
+    merged = [dict(p, stage="second") for p in second.get("predictions", [])]
+    for prediction in first.get("predictions", []):
+        if prediction.get("confidence", 0.0) < keep_confidence:
+            continue
+        if any(box_iou(prediction, other) >= iou_threshold for other in merged):
+            continue
+        merged.append(dict(prediction, stage="first"))
+    return dict(second, predictions=merged)
+
+
+class ConfidenceCascade:
+    """Run a cheap model first and escalate only images it is unsure about.
+
+    An image is escalated to the second model when a first-stage detection
+    falls in the uncertain band [low, high), when a detection at or above low
+    belongs to one of escalate_categories (rare classes the small model is
+    weak on), or when the first stage fails. Images with no detections above
+    low, or only confident common ones, keep the first-stage result.
+    Escalated results are merged: the second model's detections plus any
+    first-stage detection at or above high that it did not find.
+
+    Costs are per image in any unit (e.g. API credits); savings are reported
+    against sending every image to the second model.
+    """
+
+    def __init__(
+        self,
+        low=0.25,
+        high=0.6,
+        escalate_categories=("fishing waste",),
+        categorize=None,
+        first_cost=0.0,
+        second_cost=1.0,
+        window=1000,
+    ):
+        self.low = low
+        self.high = high
+        self.escalate_categories = set(escalate_categories)
+        self.categorize = categorize or (lambda raw_class: raw_class)
+        self.first_cost = first_cost
+        self.second_cost = second_cost
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+        self.reasons = Counter()
+        self._total_ms = deque(maxlen=window)
+        self._first_ms = deque(maxlen=window)
+        self._second_ms = deque(maxlen=window)
+
+    def escalation_reason(self, result):
+        """Return why a first-stage result needs the second model, or None."""
+        if result is None:
+            return "first_stage_failed"
+        reason = None
+        for prediction in result.get("predictions", []):
+            confidence = prediction.get("confidence", 0.0)
+            if confidence < self.low:
+                continue
+            category = self.categorize(prediction.get("class", ""))
+            if category in self.escalate_categories:
+                return "rare_category"
+            if confidence < self.high:
+                reason = "uncertain"
+        return reason
+
+    def run(self, first_fn, second_fn, image, confidence=0.1, overlap=0.5):
+        """Detect with first_fn, escalating to second_fn when needed.
+
+        Both are called as fn(image, confidence, overlap) and return a
+        Roboflow-style result or None.
+        """
+        start = time.perf_counter()
+        # The first stage has to see the whole uncertain band
+        try:
+            first = first_fn(image, min(confidence, self.low), overlap)
+        except Exception as e:
+            logging.error(f"Cascade first stage failed: {str(e)}")
+            first = None
+        first_ms = (time.perf_counter() - start) * 1000
+
+        reason = self.escalation_reason(first)
+        if first is not None and confidence > self.low:
+            first = dict(
+                first,
+                predictions=[
+                    p
+                    for p in first.get("predictions", [])
+                    if p.get("confidence", 0.0) >= confidence
+                ],
+            )
+        second = None
+        second_ms = None
+        if reason is not None:
+            second_start = time.perf_counter()
+            try:
+                second = second_fn(image, confidence, overlap)
+            except Exception as e:
+                logging.error(f"Cascade second stage failed: {str(e)}")
+            second_ms = (time.perf_counter() - second_start) * 1000
+
+        if second is not None:
+            result = merge_results(first or {}, second, self.high)
+        elif first is not None:
+            result = first
+        else:
+            result = None
+        total_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.images += 1
+            self._total_ms.append(total_ms)
+            self._first_ms.append(first_ms)
+            if reason is not None:
+                self.escalated += 1
+                self.reasons[reason] += 1
+                if second is not None:
+                    self._second_ms.append(second_ms)
+                else:
+                    self.reasons["second_stage_failed"] += 1
+
+        if result is not None:
+            result = dict(
+                result, cascade={"escalated": reason is not None, "reason": reason}
+            )
+        return result
+
+    def stats(self):
+        """Return the escalation rate and estimated cost and latency savings."""
+        with self._lock:
+            images = self.images
+            escalated = self.escalated
+            reasons = dict(self.reasons)
+            total_ms = np.array(self._total_ms)
+            first_ms = np.array(self._first_ms)
+            second_ms = np.array(self._second_ms)
+
+        cascade_cost = images * self.first_cost + escalated * self.second_cost
+        all_second_cost = images * self.second_cost
+        latency = None
+        if len(total_ms):
+            latency = {
+                "mean": round(float(total_ms.mean()), 2),
+                "p50": round(float(np.percentile(total_ms, 50)), 2),
+                "p95": round(float(np.percentile(total_ms, 95)), 2),
+                "first_stage_mean": round(float(first_ms.mean()), 2),
+                "second_stage_mean": round(float(second_ms.mean()), 2)
+                if len(second_ms)
+                else None,
+            }
+        return {
+            "low": self.low,
+            "high": self.high,
+            "escalate_categories": sorted(self.escalate_categories),
+            "images": images,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / images, 4) if images else None,
+            "reasons": reasons,
+            "latency_ms": latency,
+            "cost": {
+                "cascade": round(cascade_cost, 4),
+                "second_model_only": round(all_second_cost, 4),
+                "saving": round(1 - cascade_cost / all_second_cost, 4)
+                if all_second_cost
+                else None,
+            },
+            # Against the second model's own latency on the escalated images
+            "latency_saving": round(1 - total_ms.mean() / second_ms.mean(), 4)
+            if len(total_ms) and len(second_ms)
+            else None,
+        }
+
+
+class CascadeBackend:
+    """Detection backend (see backends.py) running two backends as a cascade."""
+
+    def __init__(self, first, second, cascade):
+        self.first = first
+        self.second = second
+        self.cascade = cascade
+
+    def predict(self, image, confidence=0.1, overlap=0.5):
+        return self.cascade.run(
+            self.first.predict, self.second.predict, image, confidence, overlap
+        )
+
+    def predict_batch(self, images, confidence=0.1, overlap=0.5):
+        return [self.predict(image, confidence, overlap) for image in images]
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import secrets
+import argparse
+
+COPY_BYTES = 1024 * 1024
+ID_LENGTH = 32
+
+
+class UploadSessionError(Exception):
+    """A session or chunk request refused, with the HTTP status to answer.
+
+    offset is the number of bytes the server holds, when the client needs it
+    to resume.
+    """
+
+    retry_after = None
+
+    def __init__(self, message, status, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def replace_json(path, data):
+    """Write a JSON file so readers never see it half written."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+class UploadStore:
+    """Resumable uploads kept on disk, shared by every worker process.
+
+    A session is <id>.json (what the client declared) next to <id>.part (the
+    bytes received so far). The size of the .part file is the offset: a chunk
+    is only written at that offset, under an exclusive lock on the file.
+    Nothing is kept in memory, so consecutive chunks may reach different
+    workers and a session survives restarts. Sessions untouched for ttl
+    seconds are deleted.
+    """
+
+    def __init__(self, root, max_bytes, max_chunk_bytes, ttl=24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl = ttl
+
+    def path(self, upload_id, suffix=".part"):
+        if len(upload_id) != ID_LENGTH or not all(
+            c in "0123456789abcdef" for c in upload_id
+        ):
+            raise UploadSessionError("Unknown upload", 404)
+        return os.path.join(self.root, upload_id + suffix)
+
+    def create(self, filename, length, kind=None, options=None):
+        """Start a session for a file of length bytes; return its status."""
+        if not isinstance(length, int) or length <= 0:
+            raise UploadSessionError("length must be a positive number of bytes", 400)
+        if length > self.max_bytes:
+            raise UploadSessionError(
+                f"Upload of {length} bytes is over the limit of {self.max_bytes}", 413
+            )
+        os.makedirs(self.root, exist_ok=True)
+        self.expire()
+
+        upload_id = secrets.token_hex(ID_LENGTH // 2)
+        open(self.path(upload_id), "xb").close()
+        replace_json(
+            self.path(upload_id, ".json"),
+            {
+                "id": upload_id,
+                "filename": os.path.basename(filename or "upload"),
+                "length": length,
+                "kind": kind,
+                "options": options or {},
+                "created": round(time.time(), 3),
+            },
+        )
+        return self.status(upload_id)
+
+    def meta(self, upload_id):
+        try:
+            with open(self.path(upload_id, ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadSessionError("Unknown upload", 404)
+
+    def status(self, upload_id):
+        meta = self.meta(upload_id)
+        try:
+            offset = os.path.getsize(self.path(upload_id))
+        except OSError:
+            raise UploadSessionError("Unknown upload", 404)
+        return dict(meta, offset=offset, complete=offset == meta["length"])
+
+    def append(self, upload_id, offset, stream, length, sha256=None):
+        """Write one chunk of length bytes from stream at offset.
+
+        The offset has to be what the server holds (409 otherwise, with the
+        right one). With sha256 the chunk is kept only if its checksum
+        matches; without, whatever arrived before a dropped connection is
+        kept and the client resumes from the new offset.
+        """
+        meta = self.meta(upload_id)
+        if length is None:
+            raise UploadSessionError("Content-Length is required", 411)
+        if length > self.max_chunk_bytes:
+            raise UploadSessionError(
+                f"Chunks are limited to {self.max_chunk_bytes} bytes", 413
+            )
+
+        with open(self.path(upload_id), "r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadSessionError(
+                    "Another chunk of this upload is being written", 409
+                )
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadSessionError(
+                    f"Offset {offset} does not match the {current} bytes received",
+                    409,
+                    offset=current,
+                )
+            if current + length > meta["length"]:
+                raise UploadSessionError(
+                    "Chunk goes past the declared length", 400, offset=current
+                )
+
+            f.seek(current)
+            digest = hashlib.sha256()
+            written = 0
+            try:
+                while written < length:
+                    block = stream.read(min(COPY_BYTES, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+                if written != length:
+                    raise UploadSessionError(
+                        f"Chunk ended after {written} of {length} bytes", 400
+                    )
+                if sha256 is not None and digest.hexdigest() != sha256.lower():
+                    raise UploadSessionError("Chunk checksum does not match", 422)
+            except BaseException as e:
+                if sha256 is not None:
+                    f.truncate(current)
+                if isinstance(e, UploadSessionError):
+                    f.flush()
+                    e.offset = os.fstat(f.fileno()).st_size
+                raise
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+        return self.status(upload_id)
+
+    def wait(self, upload_id, offset, timeout, poll=0.25):
+        """Wait until more than offset bytes have arrived; return the status."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status(upload_id)
+            if status["offset"] > offset or time.monotonic() >= deadline:
+                return status
+            time.sleep(poll)
+
+    def delete(self, upload_id):
+        self.path(upload_id)
+        removed = False
+        for name in os.listdir(self.root):
+            if name.startswith(upload_id + "."):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                    removed = True
+                except OSError:
+                    pass
+        return removed
+
+    def expire(self):
+        """Delete every session whose files were last touched over ttl ago."""
+        cutoff = time.time() - self.ttl
+        newest = {}
+        for entry in os.scandir(self.root):
+            upload_id = entry.name.split(".", 1)[0]
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            newest[upload_id] = max(mtime, newest.get(upload_id, 0))
+        expired = [upload_id for upload_id, mtime in newest.items() if mtime < cutoff]
+        for upload_id in expired:
+            logging.info(f"Expiring upload {upload_id}")
+            try:
+                self.delete(upload_id)
+            except UploadSessionError:
+                pass
+        return len(expired)
+
+    def append_result(self, upload_id, record):
+        with open(self.path(upload_id, ".results.jsonl"), "a") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def results(self, upload_id, since=0):
+        """Return the result records from number since on, and the next number."""
+        records = []
+        try:
+            with open(self.path(upload_id, ".results.jsonl")) as f:
+                for number, line in enumerate(f):
+                    if number >= since and line.endswith("\n"):
+                        records.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return records, since + len(records)
+
+
+def upload_file(url, path, chunk_bytes=8 * 1024 * 1024, retries=10, process=True):
+    """Upload a file to a server's /uploads API, resuming after failures.
+
+    Returns the final session status. The id of an interrupted upload is kept
+    in <path>.upload, so running again resumes it.
+    """
+    import requests
+
+    session = requests.Session()
+    length = os.path.getsize(path)
+    state_path = path + ".upload"
+    status = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            upload_url = f.read().strip()
+        response = session.head(upload_url)
+        if response.ok:
+            status = {"offset": int(response.headers["Upload-Offset"])}
+    if status is None:
+        response = session.post(
+            url.rstrip("/") + "/uploads",
+            json={
+                "filename": os.path.basename(path),
+                "length": length,
+                "process": process,
+            },
+        )
+        response.raise_for_status()
+        status = response.json()
+        upload_url = requests.compat.urljoin(url, response.headers["Location"])
+        with open(state_path, "w") as f:
+            f.write(upload_url)
+
+    offset = status["offset"]
+    failures = 0
+    with open(path, "rb") as f:
+        while offset < length:
+            f.seek(offset)
+            chunk = f.read(chunk_bytes)
+            try:
+                response = session.put(
+                    upload_url,
+                    data=chunk,
+                    headers={
+                        "Upload-Offset": str(offset),
+                        "Content-SHA256": hashlib.sha256(chunk).hexdigest(),
+                        "Content-Type": "application/octet-stream",
+                    },
+                    timeout=300,
+                )
+            except requests.exceptions.RequestException as e:
+                response = None
+                logging.warning(f"Chunk at {offset} failed: {str(e)}")
+            if response is not None and response.status_code in (200, 409):
+                offset = int(response.headers["Upload-Offset"])
+                failures = 0
+                logging.info(f"{offset}/{length} bytes")
+                continue
+            failures += 1
+            if failures > retries:
+                raise RuntimeError(f"Upload stopped at {offset} of {length} bytes")
+            time.sleep(min(2**failures, 60))
+            response = session.head(upload_url)
+            if response.ok:
+                offset = int(response.headers["Upload-Offset"])
+
+    os.remove(state_path)
+    return session.get(upload_url).json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable upload to /uploads")
+    parser.add_argument("file")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--chunk-mb", type=float, default=8)
+    parser.add_argument("--retries", type=int, default=10)
+    parser.add_argument(
+        "--no-process", action="store_true", help="Only store the file, no detection"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    status = upload_file(
+        args.url,
+        args.file,
+        chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+        retries=args.retries,
+        process=not args.no_process,
+    )
+    json.dump(status, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import io
+import math
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+CATEGORIES = ("fishing waste", "metal", "plastic")
+# Channel 0 counts every detection, the others one category each
+CHANNELS = ("all",) + CATEGORIES
+
+TILE_PIXELS = 256
+MAX_LATITUDE = 85.05112878
+
+# Same ramp as the per-image overlay in static/js/heatmap.js
+COLOR_RAMP = np.array(
+    [
+        (0, 0, 255, 0),
+        (0, 255, 255, 77),
+        (0, 255, 0, 102),
+        (255, 255, 0, 128),
+        (255, 165, 0, 153),
+        (255, 0, 0, 179),
+    ],
+    dtype=np.uint8,
+)
+
+
+def mercator_fraction(lat, lon):
+    """Project lat/lon arrays to Web Mercator coordinates in [0, 1)."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lon = np.asarray(lon, dtype=np.float64)
+    fx = (lon + 180.0) / 360.0
+    rad = np.radians(lat)
+    fy = (1.0 - np.log(np.tan(rad) + 1.0 / np.cos(rad)) / math.pi) / 2.0
+    limit = np.nextafter(1.0, 0.0)
+    return np.clip(fx, 0.0, limit), np.clip(fy, 0.0, limit)
+
+
+def cell_center(z, gx, gy, cells):
+    """Return the lat/lon centre of global cell (gx, gy) at zoom z."""
+    scale = (2**z) * cells
+    lon = (gx + 0.5) / scale * 360.0 - 180.0
+    n = math.pi - 2.0 * math.pi * (gy + 0.5) / scale
+    lat = math.degrees(math.atan(math.sinh(n)))
+    return round(lat, 6), round(lon, 6)
+
+
+def channel_index(category):
+    """Return the channel of a category name, 0 for all detections."""
+    if not category or category == "all":
+        return 0
+    if category not in CATEGORIES:
+        raise ValueError(f"Unknown category: {category}")
+    return CHANNELS.index(category)
+
+
+class DensityTiles:
+    """Incrementally maintained detection density grids.
+
+    Detections with GPS go into a Web Mercator tile pyramid from zoom 0 to
+    max_zoom, each tile a cells x cells grid. A tile holds only its non-empty
+    cells ({cell index: channel counts}) until it has enough of them to be
+    cheaper as a dense array, so scattered detections at deep zooms cost
+    memory per cell, not per tile. Detections without GPS go into
+    a pixel grid per source (camera), with cell_pixels wide cells. Updates
+    arrive as committed detection store rows, identified by row id so a
+    rebuild from the store and live updates never count a row twice. Rows
+    committed by another process leave a gap in the ids, which is read back
+    from store.
+    """
+
+    def __init__(
+        self, max_zoom=16, cells=64, cell_pixels=32, max_pixels=4096, store=None
+    ):
+        self.store = store
+        self.max_zoom = max_zoom
+        self.cells = cells
+        self.cell_pixels = cell_pixels
+        self.grid_cells = max_pixels // cell_pixels
+
+        self.tiles = {}
+        self.tile_versions = {}
+        self.level_max = np.zeros((max_zoom + 1, len(CHANNELS)), dtype=np.int64)
+        self.pixel_grids = {}
+        self.totals = np.zeros(len(CHANNELS), dtype=np.int64)
+        self.gps_totals = np.zeros(len(CHANNELS), dtype=np.int64)
+        self.bounds = None
+        self.last_id = 0
+
+        # Tiles with more non-empty cells than this are stored dense
+        self.dense_cells = max(1, cells * cells // 16)
+        self.refresh_interval = 1.0
+        self._refreshed = 0.0
+
+        self._lock = threading.RLock()
+        self._png_cache = OrderedDict()
+        self._png_cache_size = 256
+
+    def _channels(self, categories):
+        return np.array(
+            [CHANNELS.index(c) if c in CATEGORIES else 0 for c in categories],
+            dtype=np.int64,
+        )
+
+    def add_rows(self, first_id, rows):
+        """Add committed store rows; rows already counted are skipped."""
+        with self._lock:
+            if first_id > self.last_id + 1 and self.store is not None:
+                # Written by another process (or before the first load)
+                self.load(self.store, until=first_id - 1)
+            skip = max(0, self.last_id - first_id + 1)
+            if skip >= len(rows):
+                return
+            rows = rows[skip:]
+            self._add(
+                [row[1] for row in rows],
+                [row[3] for row in rows],
+                [row[6:10] for row in rows],
+                [row[10] for row in rows],
+                [row[11] for row in rows],
+            )
+            self.last_id = first_id + skip + len(rows) - 1
+
+    def refresh(self):
+        """Catch up with rows other processes committed, at most once a second.
+
+        Each process only hears about its own commits, so readers call this
+        before serving tiles.
+        """
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if now - self._refreshed < self.refresh_interval:
+            return
+        self._refreshed = now
+        newest = self.store.query("SELECT MAX(id) FROM detections")[0][0] or 0
+        if newest > self.last_id:
+            self.load(self.store, until=newest)
+
+    def load(self, store, chunk_size=50000, until=None):
+        """Catch up with stored rows not counted yet, up to id until."""
+        last = 2**63 - 1 if until is None else until
+        with self._lock:
+            while True:
+                rows = store.query(
+                    "SELECT id, source, category, x1, y1, x2, y2, lat, lon "
+                    "FROM detections WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    (self.last_id, last, chunk_size),
+                )
+                if not rows:
+                    if until is not None:
+                        self.last_id = max(self.last_id, until)
+                    return
+                self._add(
+                    [row[1] for row in rows],
+                    [row[2] for row in rows],
+                    [row[3:7] for row in rows],
+                    [row[7] for row in rows],
+                    [row[8] for row in rows],
+                )
+                self.last_id = rows[-1][0]
+
+    def _add(self, sources, categories, boxes, lats, lons):
+        channels = self._channels(categories)
+        self.totals[0] += len(channels)
+        np.add.at(self.totals, channels[channels > 0], 1)
+
+        has_gps = np.array(
+            [lat is not None and lon is not None for lat, lon in zip(lats, lons)],
+            dtype=bool,
+        )
+        if has_gps.any():
+            lat = np.array([v for v, ok in zip(lats, has_gps) if ok], dtype=np.float64)
+            lon = np.array([v for v, ok in zip(lons, has_gps) if ok], dtype=np.float64)
+            self._add_gps(lat, lon, channels[has_gps])
+
+        for index in np.flatnonzero(~has_gps):
+            self._add_pixel(sources[index], boxes[index], channels[index])
+
+    def _add_gps(self, lat, lon, channels):
+        self.gps_totals[0] += len(channels)
+        np.add.at(self.gps_totals, channels[channels > 0], 1)
+
+        bounds = (lon.min(), lat.min(), lon.max(), lat.max())
+        if self.bounds is None:
+            self.bounds = bounds
+        else:
+            self.bounds = (
+                min(self.bounds[0], bounds[0]),
+                min(self.bounds[1], bounds[1]),
+                max(self.bounds[2], bounds[2]),
+                max(self.bounds[3], bounds[3]),
+            )
+
+        fx, fy = mercator_fraction(lat, lon)
+        for z in range(self.max_zoom + 1):
+            scale = (2**z) * self.cells
+            gx = (fx * scale).astype(np.int64)
+            gy = (fy * scale).astype(np.int64)
+            # Group the points by tile with one sort instead of a mask per tile
+            tx = gx // self.cells
+            ty = gy // self.cells
+            keys, inverse, sizes = np.unique(
+                tx * (2**z) + ty, return_inverse=True, return_counts=True
+            )
+            order = np.argsort(inverse, kind="stable")
+            start = 0
+            for key, size in zip(keys.tolist(), sizes.tolist()):
+                members = order[start : start + size]
+                start += size
+                tile_key = (z, key // (2**z), key % (2**z))
+                cx = gx[members] % self.cells
+                cy = gy[members] % self.cells
+                touched = self._add_tile(tile_key, cx, cy, channels[members])
+                # Only the touched cells can have raised the level maximum
+                np.maximum(
+                    self.level_max[z], touched.max(axis=0), out=self.level_max[z]
+                )
+                self.tile_versions[tile_key] = self.tile_versions.get(tile_key, 0) + 1
+
+    def _add_tile(self, tile_key, cx, cy, channels):
+        """Count points into a tile; return the touched cells' channel counts."""
+        tile = self.tiles.get(tile_key)
+        named = channels > 0
+        if isinstance(tile, np.ndarray):
+            np.add.at(tile[0], (cy, cx), 1)
+            np.add.at(tile, (channels[named], cy[named], cx[named]), 1)
+            return tile[:, cy, cx].T
+
+        if tile is None:
+            tile = {}
+            self.tiles[tile_key] = tile
+        flat = cy * self.cells + cx
+        width = len(CHANNELS)
+        # One (cell, channel) key per count, channel 0 for every point
+        counted, counts = np.unique(
+            np.concatenate([flat * width, flat[named] * width + channels[named]]),
+            return_counts=True,
+        )
+        for index, count in zip(counted.tolist(), counts.tolist()):
+            cell = tile.get(index // width)
+            if cell is None:
+                cell = tile[index // width] = [0] * width
+            cell[index % width] += count
+        touched = np.array([tile[index] for index in np.unique(flat).tolist()])
+
+        if len(tile) > self.dense_cells:
+            dense = np.zeros((width, self.cells, self.cells), np.int32)
+            for index, cell in tile.items():
+                dense[:, index // self.cells, index % self.cells] = cell
+            self.tiles[tile_key] = dense
+        return touched
+
+    def _channel_grid(self, tile, channel):
+        """Return one channel of a stored tile as a new cells x cells array."""
+        if isinstance(tile, np.ndarray):
+            return tile[channel].copy()
+        grid = np.zeros((self.cells, self.cells), np.int32)
+        for index, cell in tile.items():
+            grid[index // self.cells, index % self.cells] = cell[channel]
+        return grid
+
+    def _add_pixel(self, source, box, channel):
+        grid = self.pixel_grids.get(source)
+        if grid is None:
+            grid = np.zeros(
+                (len(CHANNELS), self.grid_cells, self.grid_cells), dtype=np.int32
+            )
+            self.pixel_grids[source] = grid
+        x = (box[0] + box[2]) / 2
+        y = (box[1] + box[3]) / 2
+        cx = min(max(int(x // self.cell_pixels), 0), self.grid_cells - 1)
+        cy = min(max(int(y // self.cell_pixels), 0), self.grid_cells - 1)
+        grid[0, cy, cx] += 1
+        if channel:
+            grid[channel, cy, cx] += 1
+
+    def tile(self, z, x, y, category=None):
+        """Return a tile's non-empty cells as [cx, cy, count] rows."""
+        channel = channel_index(category)
+        with self._lock:
+            grid = self.tiles.get((z, x, y))
+            level_max = int(self.level_max[z, channel]) if z <= self.max_zoom else 0
+            grid = self._channel_grid(grid, channel) if grid is not None else None
+
+        cells = []
+        if grid is not None:
+            cy, cx = np.nonzero(grid)
+            cells = np.stack([cx, cy, grid[cy, cx]], axis=1).tolist()
+        return {
+            "z": z,
+            "x": x,
+            "y": y,
+            "category": category or "all",
+            "size": self.cells,
+            "max": int(grid.max()) if grid is not None else 0,
+            "level_max": level_max,
+            "cells": cells,
+        }
+
+    def tile_png(self, z, x, y, category=None):
+        """Render a tile as a 256px RGBA PNG, scaled to the zoom level maximum."""
+        channel = channel_index(category)
+        with self._lock:
+            level_max = int(self.level_max[z, channel]) if z <= self.max_zoom else 0
+            # Colours are scaled to level_max, so a new zoom maximum recolours
+            # every tile at that zoom
+            version = self.tile_versions.get((z, x, y), 0)
+            key = (z, x, y, channel, version, level_max)
+            cached = self._png_cache.get(key)
+            if cached is not None:
+                self._png_cache.move_to_end(key)
+                return cached
+            grid = self.tiles.get((z, x, y))
+            grid = self._channel_grid(grid, channel) if grid is not None else None
+
+        if grid is None or level_max == 0:
+            rgba = np.zeros((self.cells, self.cells, 4), dtype=np.uint8)
+        else:
+            # Log scale so a few hotspots do not wash out everything else
+            level = np.log1p(grid) / math.log1p(level_max) * (len(COLOR_RAMP) - 1)
+            rgba = COLOR_RAMP[np.ceil(level).astype(np.int64)]
+        image = Image.fromarray(rgba, "RGBA").resize(
+            (TILE_PIXELS, TILE_PIXELS), Image.NEAREST
+        )
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=False)
+        data = buffer.getvalue()
+
+        with self._lock:
+            self._png_cache[key] = data
+            while len(self._png_cache) > self._png_cache_size:
+                self._png_cache.popitem(last=False)
+        return data
+
+    def pixel_grid(self, source, category=None):
+        """Return a source's non-empty pixel grid cells as [cx, cy, count]."""
+        channel = channel_index(category)
+        with self._lock:
+            grid = self.pixel_grids.get(source)
+            grid = grid[channel].copy() if grid is not None else None
+        if grid is None:
+            return None
+
+        cy, cx = np.nonzero(grid)
+        return {
+            "source": source,
+            "category": category or "all",
+            "cell_pixels": self.cell_pixels,
+            "max": int(grid.max()),
+            "cells": np.stack([cx, cy, grid[cy, cx]], axis=1).tolist(),
+        }
+
+    def summary(self, hotspot_zoom=12, hotspots=10):
+        """Return totals, GPS bounds, tile counts and the densest cells."""
+        with self._lock:
+            tiles_per_zoom = {}
+            for z, _, _ in self.tiles:
+                tiles_per_zoom[z] = tiles_per_zoom.get(z, 0) + 1
+
+            hotspot_zoom = min(hotspot_zoom, self.max_zoom)
+            candidates = []
+            for (z, tx, ty), tile in self.tiles.items():
+                if z != hotspot_zoom:
+                    continue
+                flat = self._channel_grid(tile, 0).ravel()
+                top = np.argpartition(flat, -min(hotspots, flat.size))[-hotspots:]
+                for index in top:
+                    if flat[index]:
+                        cy, cx = divmod(int(index), self.cells)
+                        candidates.append(
+                            (
+                                int(flat[index]),
+                                tx * self.cells + cx,
+                                ty * self.cells + cy,
+                            )
+                        )
+            candidates.sort(reverse=True)
+
+            return {
+                "total": dict(zip(CHANNELS, self.totals.tolist())),
+                "gps": {
+                    "total": dict(zip(CHANNELS, self.gps_totals.tolist())),
+                    "bounds": [round(v, 6) for v in self.bounds]
+                    if self.bounds
+                    else None,
+                    "max_zoom": self.max_zoom,
+                    "tile_cells": self.cells,
+                    "tiles_per_zoom": dict(sorted(tiles_per_zoom.items())),
+                    "hotspots": [
+                        dict(
+                            zip(
+                                ("lat", "lon"),
+                                cell_center(hotspot_zoom, gx, gy, self.cells),
+                            ),
+                            count=count,
+                            zoom=hotspot_zoom,
+                        )
+                        for count, gx, gy in candidates[:hotspots]
+                    ],
+                },
+                "cameras": {
+                    source: {
+                        "total": int(grid[0].sum()),
+                        "max": int(grid[0].max()),
+                    }
+                    for source, grid in self.pixel_grids.items()
+                },
+                "last_id": self.last_id,
+            }
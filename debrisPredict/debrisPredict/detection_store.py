@@ -0,0 +1,434 @@
+import os
+import math
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+HOUR = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    image_id TEXT,
+    category TEXT NOT NULL,
+    raw_class TEXT,
+    confidence REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    lat REAL,
+    lon REAL
+);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_category_ts ON detections (category, ts);
+CREATE INDEX IF NOT EXISTS detections_source_ts ON detections (source, ts);
+CREATE INDEX IF NOT EXISTS detections_image ON detections (image_id);
+
+-- Pre-aggregated counts so long time ranges never touch the raw rows
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    hour INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (hour, source, category)
+) WITHOUT ROWID;
+"""
+
+RTREE_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS detections_geo
+USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# Used when SQLite was built without the R*Tree module
+GEO_INDEX_SCHEMA = """
+CREATE INDEX IF NOT EXISTS detections_lat_lon ON detections (lat, lon)
+WHERE lat IS NOT NULL;
+"""
+
+GROUP_COLUMNS = {
+    "category": "category",
+    "source": "source",
+    "hour": "hour",
+    "day": "(hour / 86400) * 86400",
+}
+
+
+def default_path():
+    """DETECTION_DB, else detections.db in DATA_DIR.
+
+    DATA_DIR defaults to $XDG_DATA_HOME/debris-predict (~/.local/share), so
+    the database does not depend on the working directory.
+    """
+    if os.environ.get("DETECTION_DB"):
+        return os.path.abspath(os.environ["DETECTION_DB"])
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser(
+        "~/.local/share"
+    )
+    data_dir = os.environ.get("DATA_DIR") or os.path.join(data_home, "debris-predict")
+    return os.path.join(os.path.abspath(data_dir), "detections.db")
+
+
+def _rational(value):
+    try:
+        return float(value)
+    except TypeError:
+        return value[0] / value[1] if value[1] else 0.0
+
+
+def exif_gps(image):
+    """Return (lat, lon) from a PIL image's EXIF GPS block, or (None, None)."""
+    try:
+        gps = image.getexif().get_ifd(0x8825)
+        if not gps or 2 not in gps or 4 not in gps:
+            return None, None
+
+        def degrees(values, ref):
+            d, m, s = (_rational(v) for v in values)
+            value = d + m / 60 + s / 3600
+            return -value if ref in ("S", "W") else value
+
+        return degrees(gps[2], gps.get(1, "N")), degrees(gps[4], gps.get(3, "E"))
+    except Exception:
+        return None, None
+
+
+def detection_rows(detections, source, image_id=None, gps=None, ts=None):
+    """Turn categorized detections into store records."""
+    ts = time.time() if ts is None else ts
+    lat, lon = gps if gps else (None, None)
+    return [
+        (
+            ts,
+            source,
+            image_id,
+            detection["class_name"],
+            detection.get("raw_class"),
+            float(detection["confidence"]),
+            *(float(value) for value in detection["bbox"]),
+            lat,
+            lon,
+        )
+        for detection in detections
+    ]
+
+
+class DetectionStore:
+    """SQLite store of every detection, written in batches by a background thread.
+
+    Callers only enqueue rows, so requests never wait on disk. The writer
+    commits up to batch_size rows per transaction, or whatever arrived within
+    flush_interval, and keeps an hourly rollup table in the same transaction.
+    Several processes (gunicorn workers) may write to the same file; each
+    batch gets a contiguous range of ids.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.has_rtree = False
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_error = None
+        # Called as listener(first_id, rows) by the writer after each commit
+        self.listeners = []
+
+        self._setup()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _setup(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(RTREE_SCHEMA)
+                self.has_rtree = True
+            except sqlite3.OperationalError:
+                connection.executescript(GEO_INDEX_SCHEMA)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _reader(self):
+        """Return this thread's read connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def query(self, sql, params=()):
+        """Run a read-only query and return all rows."""
+        return self._reader().execute(sql, params).fetchall()
+
+    def _ensure_writer(self):
+        """Start the writer thread, again if the process was forked."""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue(self.max_queue)
+                threading.Thread(
+                    target=self._run, name="detection-store-writer", daemon=True
+                ).start()
+                self._worker_pid = os.getpid()
+
+    def add(self, rows):
+        """Queue rows for writing; rows are dropped if the writer falls behind."""
+        if not rows:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far has been committed."""
+        if self._worker_pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _collect(self):
+        """Block for the first rows, then gather more until full or timed out."""
+        items = [self._queue.get()]
+        count = len(items[0]) if isinstance(items[0], list) else 0
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size and not isinstance(items[-1], threading.Event):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            if isinstance(item, list):
+                count += len(item)
+        return items
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            items = self._collect()
+            rows = [row for item in items if isinstance(item, list) for row in item]
+            if rows:
+                try:
+                    self._write(connection, rows)
+                except Exception as e:
+                    logging.error(f"Error writing detections: {str(e)}")
+                    self.last_error = str(e)
+                    self.dropped += len(rows)
+                    connection.rollback()
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, connection, rows):
+        with connection:
+            cursor = connection.cursor()
+            # Take the write lock before reading MAX(id): other processes
+            # may write to the same file, and once locked the batch's ids
+            # can be assigned up front and the spatial index filled without
+            # a lookup per row
+            cursor.execute("BEGIN IMMEDIATE")
+            first_id = cursor.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM detections"
+            ).fetchone()[0]
+            cursor.executemany(
+                "INSERT INTO detections (id, ts, source, image_id, category, "
+                "raw_class, confidence, x1, y1, x2, y2, lat, lon) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((first_id + index,) + row for index, row in enumerate(rows)),
+            )
+            if self.has_rtree:
+                cursor.executemany(
+                    "INSERT INTO detections_geo VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (first_id + index, row[10], row[10], row[11], row[11])
+                        for index, row in enumerate(rows)
+                        if row[10] is not None and row[11] is not None
+                    ),
+                )
+
+            rollup = {}
+            for row in rows:
+                key = (int(row[0] // HOUR) * HOUR, row[1], row[3])
+                count, total = rollup.get(key, (0, 0.0))
+                rollup[key] = (count + 1, total + row[5])
+            cursor.executemany(
+                "INSERT INTO hourly_counts VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (hour, source, category) DO UPDATE SET "
+                "count = count + excluded.count, "
+                "confidence_sum = confidence_sum + excluded.confidence_sum",
+                [key + value for key, value in rollup.items()],
+            )
+        self.written += len(rows)
+        self.batches += 1
+        for listener in list(self.listeners):
+            try:
+                listener(first_id, rows)
+            except Exception as e:
+                logging.error(f"Error in detection store listener: {str(e)}")
+
+    def counts(
+        self,
+        start=None,
+        end=None,
+        category=None,
+        source=None,
+        bbox=None,
+        min_confidence=None,
+        group_by=("category",),
+    ):
+        """Return detection counts in [start, end) grouped by the given keys.
+
+        Whole hours are answered from the hourly rollup and only the partial
+        hours at either end of the range are counted from the raw rows.
+        Spatial (bbox = min_lon, min_lat, max_lon, max_lat) and confidence
+        filters always use the raw rows, through the R*Tree when available.
+        """
+        for key in group_by:
+            if key not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot group by {key!r}")
+
+        start = 0.0 if start is None else float(start)
+        end = time.time() + HOUR if end is None else float(end)
+        if bbox is not None or min_confidence is not None:
+            spans = [("raw", start, end)]
+        else:
+            first_hour = math.ceil(start / HOUR) * HOUR
+            last_hour = math.floor(end / HOUR) * HOUR
+            if first_hour >= last_hour:
+                spans = [("raw", start, end)]
+            else:
+                spans = [
+                    ("raw", start, first_hour),
+                    ("rollup", first_hour, last_hour),
+                    ("raw", last_hour, end),
+                ]
+
+        groups = {}
+        for kind, span_start, span_end in spans:
+            if span_end <= span_start:
+                continue
+            query, params = self._count_query(
+                kind,
+                span_start,
+                span_end,
+                category,
+                source,
+                bbox,
+                min_confidence,
+                group_by,
+            )
+            for row in self._reader().execute(query, params):
+                key = tuple(row[: len(group_by)])
+                count, total = groups.get(key, (0, 0.0))
+                groups[key] = (count + row[-2], total + (row[-1] or 0.0))
+
+        results = [
+            dict(
+                zip(group_by, key),
+                count=count,
+                mean_confidence=round(total / count, 4) if count else None,
+            )
+            for key, (count, total) in sorted(groups.items())
+        ]
+        return {
+            "start": start,
+            "end": end,
+            "total": sum(group["count"] for group in results),
+            "groups": results,
+            "plan": [kind for kind, s, e in spans if e > s],
+        }
+
+    def _count_query(
+        self, kind, start, end, category, source, bbox, min_confidence, group_by
+    ):
+        where = []
+        params = []
+        if kind == "rollup":
+            table = "hourly_counts"
+            where.append("hour >= ? AND hour < ?")
+            count_sql = "SUM(count), SUM(confidence_sum)"
+            columns = {key: GROUP_COLUMNS[key] for key in group_by}
+        else:
+            table = "detections d"
+            where.append("d.ts >= ? AND d.ts < ?")
+            count_sql = "COUNT(*), SUM(d.confidence)"
+            columns = {
+                "category": "d.category",
+                "source": "d.source",
+                "hour": f"CAST(d.ts / {HOUR} AS INTEGER) * {HOUR}",
+                "day": "CAST(d.ts / 86400 AS INTEGER) * 86400",
+            }
+            columns = {key: columns[key] for key in group_by}
+        params.extend([start, end])
+
+        prefix = "" if kind == "rollup" else "d."
+        if category:
+            where.append(f"{prefix}category = ?")
+            params.append(category)
+        if source:
+            where.append(f"{prefix}source = ?")
+            params.append(source)
+        if min_confidence is not None:
+            where.append("d.confidence >= ?")
+            params.append(float(min_confidence))
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            if self.has_rtree:
+                table += " JOIN detections_geo g ON g.id = d.id"
+                where.append(
+                    "g.min_lat >= ? AND g.max_lat <= ? "
+                    "AND g.min_lon >= ? AND g.max_lon <= ?"
+                )
+            else:
+                where.append("d.lat BETWEEN ? AND ? AND d.lon BETWEEN ? AND ?")
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+
+        select = ", ".join(list(columns.values()) + [count_sql])
+        query = f"SELECT {select} FROM {table} WHERE {' AND '.join(where)}"
+        if columns:
+            query += f" GROUP BY {', '.join(columns.values())}"
+        return query, params
+
+    def stats(self):
+        """Return writer counters and the number of stored detections."""
+        row = self._reader().execute("SELECT SUM(count) FROM hourly_counts").fetchone()
+        return {
+            "path": self.path,
+            "stored": row[0] or 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "queued_batches": self._queue.qsize() if self._queue is not None else 0,
+            "spatial_index": "rtree" if self.has_rtree else "btree",
+            "last_error": self.last_error,
+        }
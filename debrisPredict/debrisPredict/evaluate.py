@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from app import MARINE_CLASSES, categorize_detection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# COCO-style IoU thresholds 0.50:0.05:0.95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+CATEGORIES = list(MARINE_CLASSES.keys())
+
+
+def load_class_names(data_yaml):
+    """Return the class id -> name list from a dataset YAML file."""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    names = data.get("names", [])
+    if isinstance(names, dict):
+        names = [names[key] for key in sorted(names)]
+    return names
+
+
+def load_ground_truth(label_path, class_names, width, height):
+    """Read a YOLO label file as (category indices, xyxy pixel boxes)."""
+    if not os.path.exists(label_path):
+        return np.zeros(0, dtype=int), np.zeros((0, 4))
+
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, 4))
+
+    categories = np.array(
+        [
+            CATEGORIES.index(categorize_detection(class_names[int(class_id)]))
+            for class_id in rows[:, 0]
+        ],
+        dtype=int,
+    )
+    xc, yc = rows[:, 1] * width, rows[:, 2] * height
+    w, h = rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return categories, boxes
+
+
+def predictions_to_arrays(result):
+    """Convert Roboflow-style predictions into (categories, scores, xyxy boxes)."""
+    predictions = result.get("predictions", [])
+    if not predictions:
+        return np.zeros(0, dtype=int), np.zeros(0), np.zeros((0, 4))
+
+    categories = np.array(
+        [CATEGORIES.index(categorize_detection(p.get("class"))) for p in predictions],
+        dtype=int,
+    )
+    scores = np.array([p.get("confidence", 0.0) for p in predictions], dtype=float)
+    xywh = np.array(
+        [
+            [p.get("x", 0), p.get("y", 0), p.get("width", 0), p.get("height", 0)]
+            for p in predictions
+        ],
+        dtype=float,
+    )
+    boxes = np.concatenate(
+        [xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1
+    )
+    return categories, scores, boxes
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between two sets of xyxy boxes, shape (len(a), len(b))."""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-12), 0.0)
+
+
+def match_predictions(pred_boxes, pred_scores, gt_boxes):
+    """Greedily match predictions to ground truth at every IoU threshold at once.
+
+    Returns a (num_preds, num_thresholds) boolean true-positive matrix in the
+    original prediction order.
+    """
+    num_thresholds = len(IOU_THRESHOLDS)
+    true_positives = np.zeros((len(pred_boxes), num_thresholds), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return true_positives
+
+    ious = box_iou(pred_boxes, gt_boxes)
+    matched = np.zeros((num_thresholds, len(gt_boxes)), dtype=bool)
+    thresholds = IOU_THRESHOLDS[:, None]
+
+    for i in np.argsort(-pred_scores, kind="stable"):
+        # IoU of this prediction against every still-unmatched ground truth box,
+        # for every threshold
+        candidates = np.where((ious[i] >= thresholds) & ~matched, ious[i], -1.0)
+        best = candidates.argmax(axis=1)
+        hit = candidates[np.arange(num_thresholds), best] >= 0
+        matched[np.flatnonzero(hit), best[hit]] = True
+        true_positives[i] = hit
+
+    return true_positives
+
+
+def average_precision(true_positives, scores, num_gt):
+    """101-point interpolated AP for every IoU threshold column."""
+    num_thresholds = true_positives.shape[1]
+    if num_gt == 0:
+        return np.full(num_thresholds, np.nan)
+    if len(scores) == 0:
+        return np.zeros(num_thresholds)
+
+    order = np.argsort(-scores, kind="stable")
+    tp = np.cumsum(true_positives[order], axis=0)
+    fp = np.cumsum(~true_positives[order], axis=0)
+
+    recall = tp / num_gt
+    precision = tp / np.maximum(tp + fp, 1e-12)
+
+    # Make precision monotonically decreasing from the right
+    precision = np.flip(
+        np.maximum.accumulate(np.flip(precision, axis=0), axis=0), axis=0
+    )
+
+    recall_points = np.linspace(0, 1, 101)
+    ap = np.zeros(num_thresholds)
+    for t in range(num_thresholds):
+        index = np.searchsorted(recall[:, t], recall_points, side="left")
+        valid = index < len(precision)
+        ap[t] = precision[index[valid], t].sum() / len(recall_points)
+    return ap
+
+
+def load_backend(args):
+    """Create the detection backend selected on the command line."""
+    from backends import LocalModelBackend, RoboflowBackend, select_variant
+
+    if args.backend == "local":
+        return LocalModelBackend(args.model, imgsz=args.imgsz), args.model
+
+    if args.backend == "report":
+        variant = select_variant(args.model, args.accuracy_budget)
+        if variant is None:
+            raise ValueError(f"No variant in {args.model} fits the accuracy budget")
+        return LocalModelBackend(variant["path"], imgsz=args.imgsz), variant["path"]
+
+    if args.backend == "cascade":
+        from cascade import CascadeBackend, ConfidenceCascade
+
+        if args.second_model:
+            second = LocalModelBackend(args.second_model, imgsz=args.imgsz)
+            second_ref = args.second_model
+        else:
+            second = RoboflowBackend(args.api_url, args.model_id, args.api_key)
+            second_ref = f"{args.api_url}/{args.model_id}"
+        cascade = ConfidenceCascade(
+            low=args.cascade_low,
+            high=args.cascade_high,
+            escalate_categories=args.escalate.split(","),
+            categorize=categorize_detection,
+        )
+        first = LocalModelBackend(args.model, imgsz=args.imgsz)
+        return CascadeBackend(first, second, cascade), f"{args.model} -> {second_ref}"
+
+    return (
+        RoboflowBackend(args.api_url, args.model_id, args.api_key),
+        f"{args.api_url}/{args.model_id}",
+    )
+
+
+def evaluate(
+    backend, val_dir, class_names, confidence=0.001, overlap=0.5, warmup=1, limit=None
+):
+    """Run a backend over val/images and score it against val/labels in one pass."""
+    image_dir = os.path.join(val_dir, "images")
+    label_dir = os.path.join(val_dir, "labels")
+    image_names = sorted(
+        name
+        for name in os.listdir(image_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if limit:
+        image_names = image_names[:limit]
+    if not image_names:
+        raise ValueError(f"No images found in {image_dir}")
+
+    # Per-category accumulators
+    scores = {c: [] for c in range(len(CATEGORIES))}
+    hits = {c: [] for c in range(len(CATEGORIES))}
+    gt_counts = np.zeros(len(CATEGORIES), dtype=int)
+    timings = []
+
+    for name in image_names:
+        with Image.open(os.path.join(image_dir, name)) as image:
+            image = image.convert("RGB")
+
+            if warmup > 0:
+                backend.predict(image, confidence, overlap)
+                warmup -= 1
+
+            start = time.perf_counter()
+            result = backend.predict(image, confidence, overlap)
+            timings.append(time.perf_counter() - start)
+
+            gt_categories, gt_boxes = load_ground_truth(
+                os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"),
+                class_names,
+                image.width,
+                image.height,
+            )
+
+        pred_categories, pred_scores, pred_boxes = predictions_to_arrays(result)
+        gt_counts += np.bincount(gt_categories, minlength=len(CATEGORIES))
+
+        for c in range(len(CATEGORIES)):
+            pred_mask = pred_categories == c
+            if not pred_mask.any():
+                continue
+            hits[c].append(
+                match_predictions(
+                    pred_boxes[pred_mask],
+                    pred_scores[pred_mask],
+                    gt_boxes[gt_categories == c],
+                )
+            )
+            scores[c].append(pred_scores[pred_mask])
+
+    per_class = {}
+    aps = []
+    for c, category in enumerate(CATEGORIES):
+        if hits[c]:
+            class_hits = np.concatenate(hits[c])
+            class_scores = np.concatenate(scores[c])
+        else:
+            class_hits = np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+            class_scores = np.zeros(0)
+        ap = average_precision(class_hits, class_scores, gt_counts[c])
+        per_class[category] = {
+            "ground_truth": int(gt_counts[c]),
+            "predictions": int(len(class_scores)),
+            "ap50": None if np.isnan(ap[0]) else round(float(ap[0]), 4),
+            "ap50_95": None if np.isnan(ap[0]) else round(float(ap.mean()), 4),
+        }
+        if not np.isnan(ap[0]):
+            aps.append(ap)
+
+    aps = np.array(aps) if aps else np.zeros((0, len(IOU_THRESHOLDS)))
+    timings_ms = np.array(timings) * 1000
+
+    return {
+        "images": len(image_names),
+        "map50": round(float(aps[:, 0].mean()), 4) if len(aps) else 0.0,
+        "map50_95": round(float(aps.mean()), 4) if len(aps) else 0.0,
+        "per_class": per_class,
+        "latency_ms": {
+            "mean": round(float(timings_ms.mean()), 2),
+            "p50": round(float(np.percentile(timings_ms, 50)), 2),
+            "p95": round(float(np.percentile(timings_ms, 95)), 2),
+            "p99": round(float(np.percentile(timings_ms, 99)), 2),
+        },
+        "throughput_ips": round(len(timings) / float(np.sum(timings)), 2),
+    }
+
+
+def compare_reports(current, baseline):
+    """Print accuracy and speed side by side against a previous report."""
+    rows = [
+        ("mAP@0.5", baseline["map50"], current["map50"]),
+        ("mAP@0.5:0.95", baseline["map50_95"], current["map50_95"]),
+        ("p50 ms", baseline["latency_ms"]["p50"], current["latency_ms"]["p50"]),
+        ("p95 ms", baseline["latency_ms"]["p95"], current["latency_ms"]["p95"]),
+        ("p99 ms", baseline["latency_ms"]["p99"], current["latency_ms"]["p99"]),
+        ("images/s", baseline["throughput_ips"], current["throughput_ips"]),
+    ]
+    for category in CATEGORIES:
+        before = baseline["per_class"].get(category, {}).get("ap50_95")
+        after = current["per_class"].get(category, {}).get("ap50_95")
+        if before is not None and after is not None:
+            rows.append((f"AP {category}", before, after))
+
+    print(f"{'metric':<22}{'baseline':>12}{'current':>12}{'delta':>12}")
+    for name, before, after in rows:
+        print(f"{name:<22}{before:>12.4f}{after:>12.4f}{after - before:>+12.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure mAP and latency of a detection backend on the val split"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["local", "report", "roboflow", "cascade"],
+        default="local",
+    )
+    parser.add_argument(
+        "--model",
+        default="best.pt",
+        help="Model file for 'local', export report.json for 'report'",
+    )
+    parser.add_argument(
+        "--second-model",
+        help="Escalation model for 'cascade', the Roboflow model if omitted",
+    )
+    parser.add_argument("--cascade-low", type=float, default=0.25)
+    parser.add_argument("--cascade-high", type=float, default=0.6)
+    parser.add_argument(
+        "--escalate",
+        default="fishing waste",
+        help="Comma separated categories always escalated by 'cascade'",
+    )
+    parser.add_argument("--accuracy-budget", type=float, default=0.01)
+    parser.add_argument("--api-url", default="https://detect.roboflow.com")
+    parser.add_argument("--model-id", default="debris-detection-pasan-7azav/1")
+    parser.add_argument("--api-key", default=os.environ.get("ROBOFLOW_API_KEY", ""))
+    parser.add_argument("--data", default="data_custom.yaml")
+    parser.add_argument("--val", default="val", help="Folder with images/ and labels/")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--confidence", type=float, default=0.001)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", default="eval_report.json")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    args = parser.parse_args()
+
+    backend, model_ref = load_backend(args)
+    report = evaluate(
+        backend,
+        args.val,
+        load_class_names(args.data),
+        confidence=args.confidence,
+        limit=args.limit,
+    )
+    report.update(
+        {
+            "backend": args.backend,
+            "model": model_ref,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+    )
+    if args.backend == "cascade":
+        report["cascade"] = backend.cascade.stats()
+        logging.info(
+            f"Escalated {report['cascade']['escalated']} of "
+            f"{report['cascade']['images']} images, "
+            f"saving {report['cascade']['cost']['saving']:.0%} of second model calls"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    logging.info(
+        f"mAP@0.5 {report['map50']:.4f}, mAP@0.5:0.95 {report['map50_95']:.4f}, "
+        f"p50 {report['latency_ms']['p50']:.1f}ms, {report['throughput_ips']:.1f} images/s"
+    )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
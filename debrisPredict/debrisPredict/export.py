@@ -0,0 +1,341 @@
+import io
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+
+COLUMNS = [
+    "id",
+    "timestamp",
+    "source",
+    "image_id",
+    "category",
+    "raw_class",
+    "confidence",
+    "x1",
+    "y1",
+    "x2",
+    "y2",
+    "lat",
+    "lon",
+]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "geojson": ("application/geo+json", "geojson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def iso_time(ts):
+    """Format epoch seconds like the store export, e.g. 2025-06-01T12:00:00.000Z."""
+    text = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    return text[:-3] + "Z"
+
+
+def iter_store_rows(
+    store,
+    start=None,
+    end=None,
+    category=None,
+    source=None,
+    min_confidence=None,
+    chunk_size=10000,
+):
+    """Yield chunks of stored detections in time order.
+
+    Each query continues after the last (ts, id) seen, so only one chunk is
+    ever held in memory and every page is an index range scan.
+    """
+    where = []
+    params = []
+    if start is not None:
+        where.append("ts >= ?")
+        params.append(float(start))
+    if end is not None:
+        where.append("ts < ?")
+        params.append(float(end))
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if source:
+        where.append("source = ?")
+        params.append(source)
+    if min_confidence is not None:
+        where.append("confidence >= ?")
+        params.append(float(min_confidence))
+
+    # Timestamps are formatted and numbers rounded to useful precision by
+    # SQLite, which is much cheaper than doing it per row in Python. The raw
+    # ts is selected last for the keyset only.
+    sql = (
+        "SELECT id, strftime('%Y-%m-%dT%H:%M:%fZ', ts, 'unixepoch'), source, "
+        "image_id, category, raw_class, round(confidence, 4), round(x1, 1), "
+        "round(y1, 1), round(x2, 1), round(y2, 1), round(lat, 6), round(lon, 6), ts "
+        "FROM detections WHERE (ts, id) > (?, ?)"
+    )
+    if where:
+        sql += " AND " + " AND ".join(where)
+    sql += " ORDER BY ts, id LIMIT ?"
+
+    last = (float("-inf"), 0)
+    while True:
+        rows = store.query(sql, (*last, *params, chunk_size))
+        if not rows:
+            return
+        yield [row[:-1] for row in rows]
+        last = (rows[-1][-1], rows[-1][0])
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_batch_rows(folder, model, confidence=0.1, category=None, min_confidence=None):
+    """Run detection over a folder of images and yield one chunk per image."""
+    from PIL import Image, ImageOps
+
+    from app import parse_predictions, request_detections
+    from detection_store import exif_gps
+
+    extensions = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+    row_id = 0
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(extensions):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            with Image.open(path) as image:
+                lat, lon = exif_gps(image)
+                image = ImageOps.exif_transpose(image).convert("RGB")
+                result = request_detections(model, image, confidence=confidence)
+        except Exception as e:
+            logging.error(f"Skipping {name}: {str(e)}")
+            continue
+        if result is None:
+            continue
+
+        detections, _ = parse_predictions(result)
+        timestamp = iso_time(os.path.getmtime(path))
+        rows = []
+        for detection in detections:
+            if category and detection["class_name"] != category:
+                continue
+            if min_confidence is not None and detection["confidence"] < min_confidence:
+                continue
+            row_id += 1
+            rows.append(
+                (
+                    row_id,
+                    timestamp,
+                    f"batch:{os.path.basename(os.path.normpath(folder))}",
+                    name,
+                    detection["class_name"],
+                    detection["raw_class"],
+                    detection["confidence"],
+                    *detection["bbox"],
+                    lat,
+                    lon,
+                )
+            )
+        if rows:
+            yield rows
+
+
+def csv_chunks(chunks):
+    """Encode row chunks as CSV, one string per chunk after the header."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def geojson_chunks(chunks):
+    """Encode row chunks as one GeoJSON FeatureCollection, streamed in pieces.
+
+    Detections without GPS keep a null geometry, which GeoJSON allows.
+    """
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    for rows in chunks:
+        features = []
+        for row in rows:
+            properties = dict(zip(COLUMNS[:11], row[:11]))
+            lat, lon = row[11], row[12]
+            geometry = (
+                {"type": "Point", "coordinates": [lon, lat]}
+                if lat is not None and lon is not None
+                else None
+            )
+            features.append(
+                json.dumps(
+                    {"type": "Feature", "geometry": geometry, "properties": properties},
+                    separators=(",", ":"),
+                )
+            )
+        if features:
+            yield ("" if first else ",") + ",".join(features)
+            first = False
+    yield "]}"
+
+
+class _DrainableSink:
+    """Write-only file object whose contents are taken out after each write."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+def parquet_chunks(chunks):
+    """Encode row chunks as Parquet, one row group per chunk (needs pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.string()),
+            ("source", pa.string()),
+            ("image_id", pa.string()),
+            ("category", pa.string()),
+            ("raw_class", pa.string()),
+            ("confidence", pa.float32()),
+            ("x1", pa.float32()),
+            ("y1", pa.float32()),
+            ("x2", pa.float32()),
+            ("y2", pa.float32()),
+            ("lat", pa.float64()),
+            ("lon", pa.float64()),
+        ]
+    )
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for rows in chunks:
+        arrays = [
+            pa.array(column, type=field.type)
+            for column, field in zip(zip(*rows), schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def encode(chunks, fmt):
+    """Return a generator of str/bytes pieces for the given format."""
+    if fmt == "csv":
+        return csv_chunks(chunks)
+    if fmt == "geojson":
+        return geojson_chunks(chunks)
+    if fmt == "parquet":
+        return parquet_chunks(chunks)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream detections from the store or a batch run to a file"
+    )
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--output", "-o", help="Output file, stdout if omitted")
+    parser.add_argument(
+        "--db", help="Detection store (default: DETECTION_DB, else in DATA_DIR)"
+    )
+    parser.add_argument(
+        "--images", help="Run detection over this folder instead of reading the store"
+    )
+    parser.add_argument("--start", help="Epoch seconds or ISO 8601")
+    parser.add_argument("--end", help="Epoch seconds or ISO 8601")
+    parser.add_argument("--category")
+    parser.add_argument("--source")
+    parser.add_argument("--min-confidence", type=float)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet export needs pyarrow: pip install pyarrow")
+    if args.format == "parquet" and not args.output:
+        parser.error("Parquet export needs --output")
+
+    if args.images:
+        from app import load_model
+
+        model = load_model()
+        if not isinstance(model, dict):
+            parser.error("No model available for a batch run")
+        chunks = iter_batch_rows(
+            args.images,
+            model,
+            category=args.category,
+            min_confidence=args.min_confidence,
+        )
+    else:
+        from app import parse_time
+        from detection_store import DetectionStore, default_path
+
+        chunks = iter_store_rows(
+            DetectionStore(args.db or default_path()),
+            start=parse_time(args.start),
+            end=parse_time(args.end),
+            category=args.category,
+            source=args.source,
+            min_confidence=args.min_confidence,
+            chunk_size=args.chunk_size,
+        )
+
+    if args.output:
+        mode = "wb" if args.format == "parquet" else "w"
+        out = open(args.output, mode, newline="" if mode == "w" else None)
+    else:
+        out = sys.stdout
+    try:
+        for piece in encode(chunks, args.format):
+            out.write(piece)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
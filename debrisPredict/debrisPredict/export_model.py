@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import multiprocessing
+from queue import Empty
+
+import numpy as np
+from PIL import Image
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+def list_images(folder):
+    """Return the sorted image paths inside a folder."""
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def letterbox(image, imgsz):
+    """Resize a PIL image into an imgsz square NCHW float32 tensor, keeping aspect."""
+    image = image.convert("RGB")
+    scale = imgsz / max(image.width, image.height)
+    resized = image.resize(
+        (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+        Image.BILINEAR,
+    )
+
+    # Pad with the same grey Ultralytics uses
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(resized, ((imgsz - resized.width) // 2, (imgsz - resized.height) // 2))
+
+    array = np.asarray(canvas, dtype=np.float32) / 255.0
+    return array.transpose(2, 0, 1)[np.newaxis]
+
+
+class ValCalibrationReader:
+    """Feed a random sample of validation images to ONNX Runtime calibration."""
+
+    def __init__(self, image_paths, input_name, imgsz):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        with Image.open(path) as image:
+            return {self.input_name: letterbox(image, self.imgsz)}
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def export_onnx(weights, out_dir, imgsz):
+    """Export a PyTorch checkpoint to ONNX and return the new file path."""
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, simplify=True)
+    target = os.path.join(out_dir, "model_fp32.onnx")
+    shutil.move(exported, target)
+    return target
+
+
+def copy_metadata(source_path, target_path):
+    """Copy ONNX metadata (class names, stride, imgsz) into a quantised model."""
+    import onnx
+
+    source = onnx.load(source_path)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            entry = target.metadata_props.add()
+            entry.key, entry.value = prop.key, prop.value
+    onnx.save(target, target_path)
+
+
+def quantize_dynamic_int8(onnx_path, out_dir):
+    """Quantise weights to INT8, activations are quantised on the fly."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target = os.path.join(out_dir, "model_int8_dynamic.onnx")
+    quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+    copy_metadata(onnx_path, target)
+    return target
+
+
+def quantize_static_int8(onnx_path, out_dir, calibration_images, imgsz):
+    """Quantise weights and activations to INT8 using calibration images."""
+    import onnxruntime
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = os.path.join(out_dir, "model_fp32_prepared.onnx")
+    quant_pre_process(onnx_path, prepared)
+
+    session = onnxruntime.InferenceSession(
+        prepared, providers=["CPUExecutionProvider"]
+    )
+    input_name = session.get_inputs()[0].name
+    del session
+
+    target = os.path.join(out_dir, "model_int8_static.onnx")
+    quantize_static(
+        prepared,
+        target,
+        ValCalibrationReader(calibration_images, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    os.remove(prepared)
+    copy_metadata(onnx_path, target)
+    return target
+
+
+def validate_map(model_path, data_yaml, imgsz):
+    """Return (mAP@0.5, mAP@0.5:0.95) of a model on the validation split."""
+    from ultralytics import YOLO
+
+    metrics = YOLO(model_path, task="detect").val(
+        data=data_yaml, imgsz=imgsz, batch=1, device="cpu", plots=False, verbose=False
+    )
+    return float(metrics.box.map50), float(metrics.box.map)
+
+
+def _measure_worker(model_path, image_paths, imgsz, runs, queue):
+    """Child process body for measure_latency()."""
+    import resource
+
+    from backends import LocalModelBackend
+
+    backend = LocalModelBackend(model_path, imgsz=imgsz)
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+
+    # Warm up so lazy initialisation does not count towards latency
+    backend.predict(images[0])
+
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        backend.predict(images[i % len(images)])
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    queue.put({"timings_ms": timings, "peak_rss_bytes": peak_rss})
+
+
+def measure_latency(model_path, image_paths, imgsz, runs=50, timeout=600):
+    """Measure single-image CPU latency and peak memory in a fresh process.
+
+    Raises RuntimeError if the process dies (bad model, out of memory) or
+    takes longer than timeout seconds.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=_measure_worker, args=(model_path, image_paths, imgsz, runs, queue)
+    )
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                result = queue.get(timeout=1)
+                break
+            except Empty:
+                if not process.is_alive():
+                    raise RuntimeError(
+                        f"Latency worker exited with code {process.exitcode}"
+                    )
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Latency worker timed out after {timeout}s")
+    finally:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    timings = np.array(result["timings_ms"])
+    return {
+        "latency_ms": {
+            "mean": round(float(timings.mean()), 2),
+            "p50": round(float(np.percentile(timings, 50)), 2),
+            "p95": round(float(np.percentile(timings, 95)), 2),
+        },
+        "peak_rss_mb": round(result["peak_rss_bytes"] / 1024 ** 2, 1),
+    }
+
+
+def resolve_val_images(data_yaml):
+    """Return the validation image folder referenced by a dataset YAML file."""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+
+    val = data.get("val", "val")
+    root = data.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+    if not os.path.isabs(val):
+        val = os.path.join(root, val)
+    images = os.path.join(val, "images")
+    return images if os.path.isdir(images) else val
+
+
+def run_export(weights, data_yaml, out_dir, imgsz=640, calib_size=100, runs=50, seed=0):
+    """Export, quantise, validate and benchmark every variant, writing report.json."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    val_images = list_images(resolve_val_images(data_yaml))
+    if not val_images:
+        raise ValueError(f"No validation images found for {data_yaml}")
+
+    rng = random.Random(seed)
+    calibration = rng.sample(val_images, min(calib_size, len(val_images)))
+    latency_images = calibration[: min(10, len(calibration))]
+
+    variants = [{"name": "pytorch_fp32", "path": os.path.abspath(weights)}]
+
+    onnx_path = None
+    try:
+        onnx_path = export_onnx(weights, out_dir, imgsz)
+        variants.append({"name": "onnx_fp32", "path": onnx_path})
+    except Exception as e:
+        logging.error(f"Failed to export ONNX: {str(e)}")
+        variants.append({"name": "onnx_fp32", "error": str(e)})
+
+    quantizers = [
+        ("onnx_int8_dynamic", lambda: quantize_dynamic_int8(onnx_path, out_dir)),
+        (
+            "onnx_int8_static",
+            lambda: quantize_static_int8(onnx_path, out_dir, calibration, imgsz),
+        ),
+    ]
+    for name, quantize in quantizers:
+        if onnx_path is None:
+            variants.append({"name": name, "error": "ONNX export failed"})
+            continue
+        try:
+            path = quantize()
+            variants.append({"name": name, "path": path})
+            logging.info(f"Built {name}: {path}")
+        except Exception as e:
+            logging.error(f"Failed to build {name}: {str(e)}")
+            variants.append({"name": name, "error": str(e)})
+
+    # Drops are only measured against the original checkpoint; without it
+    # no variant gets a map_drop, so none is picked for serving
+    baseline_map = None
+    for variant in variants:
+        if variant.get("error"):
+            continue
+
+        try:
+            map50, map50_95 = validate_map(variant["path"], data_yaml, imgsz)
+            variant.update(
+                {
+                    "map50": round(map50, 4),
+                    "map50_95": round(map50_95, 4),
+                    "size_mb": round(os.path.getsize(variant["path"]) / 1024 ** 2, 2),
+                }
+            )
+            if variant["name"] == "pytorch_fp32":
+                baseline_map = map50_95
+            if baseline_map is not None:
+                variant["map_drop"] = round(baseline_map - map50_95, 4)
+
+            variant.update(
+                measure_latency(variant["path"], latency_images, imgsz, runs)
+            )
+        except Exception as e:
+            logging.error(f"Failed to evaluate {variant['name']}: {str(e)}")
+            variant["error"] = str(e)
+
+    for variant in variants:
+        if "path" in variant:
+            variant["path"] = os.path.relpath(variant["path"], out_dir)
+
+    report = {
+        "weights": os.path.abspath(weights),
+        "data": os.path.abspath(data_yaml),
+        "imgsz": imgsz,
+        "calibration_images": len(calibration),
+        "map_baseline": "pytorch_fp32" if baseline_map is not None else None,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "variants": variants,
+    }
+
+    report_path = os.path.join(out_dir, "report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    return report_path
+
+
+def print_report(report):
+    """Print a latency/memory/accuracy comparison table."""
+    header = (
+        f"{'variant':<20}{'mAP50':>8}{'mAP50-95':>10}{'drop':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'size MB':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for v in report["variants"]:
+        if v.get("error"):
+            print(f"{v['name']:<20}  error: {v['error']}")
+            continue
+        print(
+            f"{v['name']:<20}{v['map50']:>8.4f}{v['map50_95']:>10.4f}"
+            + (f"{v['map_drop']:>8.4f}" if "map_drop" in v else f"{'-':>8}")
+            + f"{v['latency_ms']['p50']:>9.1f}{v['latency_ms']['p95']:>9.1f}"
+            f"{v['peak_rss_mb']:>9.1f}{v['size_mb']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export best.pt to ONNX and INT8 variants for CPU serving"
+    )
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--data", default="data_custom.yaml")
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument(
+        "--calib-size",
+        type=int,
+        default=100,
+        help="Number of val images used for static INT8 calibration",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=50, help="Timed inferences per variant"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_export(
+        args.weights,
+        args.data,
+        args.out,
+        imgsz=args.imgsz,
+        calib_size=args.calib_size,
+        runs=args.runs,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import threading
+from collections import Counter
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Quality tiers of the MJPEG feeds: (maximum width, JPEG quality). A frame
+# narrower than a tier's width is sent at its own size.
+TIERS = {
+    "thumbnail": (320, 60),
+    "preview": (640, 75),
+    "full": (None, 90),
+}
+
+
+def part_header(length):
+    """Multipart header of one JPEG of an x-mixed-replace stream."""
+    return (
+        b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % length
+    )
+
+
+class FrameBuffers:
+    """Named arrays reused from frame to frame.
+
+    An array is only reallocated when the shape or dtype asked for changes,
+    e.g. when the camera resolution is adapted. versions lets a user of a
+    buffer remember what it last computed into it.
+    """
+
+    def __init__(self):
+        self._arrays = {}
+        self.versions = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        array = self._arrays.get(name)
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = np.empty(shape, dtype=dtype)
+            self._arrays[name] = array
+            self.versions.pop(name, None)
+            self.allocations += 1
+        return array
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+class FrameEncoder:
+    """Render each new frame of a stream once and encode it once per tier.
+
+    render_fn(canvas, buffers) draws in place on a reused copy of the frame.
+    Every viewer of a tier gets the same multipart chunk, so the cost of a
+    frame depends on the number of tiers being watched, not on the number of
+    viewers. A tier is only encoded once somebody asks for it.
+    """
+
+    def __init__(self, render_fn, tiers=None):
+        self.render_fn = render_fn
+        self.tiers = dict(tiers or TIERS)
+        self.buffers = FrameBuffers()
+        self._lock = threading.Lock()
+        self._seq = None
+        self._canvas = None
+        self._chunks = {}
+        self.rendered = 0
+        self.encoded = Counter()
+        self.served = Counter()
+
+    def chunk(self, seq, frame, tier="full"):
+        """Return the multipart chunk of frame number seq in a tier, or None."""
+        with self._lock:
+            if seq != self._seq:
+                canvas = self.buffers.get("canvas", frame.shape, frame.dtype)
+                np.copyto(canvas, frame)
+                self.render_fn(canvas, self.buffers)
+                self._canvas = canvas
+                self._seq = seq
+                self._chunks = {}
+                self.rendered += 1
+            chunk = self._chunks.get(tier)
+            if chunk is None:
+                chunk = self._encode(tier)
+                if chunk is None:
+                    return None
+                self._chunks[tier] = chunk
+                self.encoded[tier] += 1
+            self.served[tier] += 1
+            return chunk
+
+    def _encode(self, tier):
+        max_width, quality = self.tiers[tier]
+        image = self._canvas
+        height, width = image.shape[:2]
+        if max_width and width > max_width:
+            size = (max_width, max(1, round(height * max_width / width)))
+            scaled = self.buffers.get(
+                f"tier:{tier}", (size[1], size[0]) + image.shape[2:]
+            )
+            cv2.resize(image, size, dst=scaled, interpolation=cv2.INTER_AREA)
+            image = scaled
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            return None
+        # One copy of the encoded bytes, straight into the chunk
+        return b"".join((part_header(jpeg.size), jpeg, b"\r\n"))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rendered": self.rendered,
+                "encoded": dict(self.encoded),
+                "served": dict(self.served),
+                "buffer_allocations": self.buffers.allocations,
+                "buffer_mb": round(self.buffers.nbytes() / 1e6, 2),
+            }
@@ -0,0 +1,121 @@
+import time
+import threading
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def downsample_gray(frame, size):
+    """Shrink a BGR frame to a small grayscale float array in [0, 1]."""
+    if cv2 is not None:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32) / 255.0
+
+    # Block-average fallback when OpenCV is not available
+    gray = frame.mean(axis=2) if frame.ndim == 3 else frame
+    width, height = size
+    rows = np.linspace(0, gray.shape[0], height + 1).astype(int)
+    cols = np.linspace(0, gray.shape[1], width + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(gray, rows[:-1], axis=0), cols[:-1], axis=1)
+    counts = np.outer(np.diff(rows), np.diff(cols))
+    return (sums / counts).astype(np.float32) / 255.0
+
+
+def difference_hash(frame):
+    """64-bit dHash of a frame: brightness gradient signs on a 9x8 thumbnail."""
+    small = downsample_gray(frame, (9, 8))
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class FrameGate:
+    """Decide whether a live frame differs enough to be worth running inference.
+
+    Each frame is compared with the last frame that was sent to inference,
+    either by mean absolute difference of a downsampled grayscale copy
+    ("diff") or by Hamming distance between difference hashes ("dhash").
+    Inference is also forced once max_interval seconds have passed.
+    """
+
+    def __init__(
+        self,
+        method="diff",
+        threshold=0.04,
+        hash_threshold=6,
+        max_interval=2.0,
+        size=(64, 48),
+    ):
+        self.method = method
+        self.threshold = threshold
+        self.hash_threshold = hash_threshold
+        self.max_interval = max_interval
+        self.size = size
+
+        self._reference = None
+        self._reference_time = 0.0
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.inferred = 0
+        self.last_change = 0.0
+
+    def _signature(self, frame):
+        if self.method == "dhash":
+            return difference_hash(frame)
+        return downsample_gray(frame, self.size)
+
+    def _changed(self, signature):
+        """Return the change score and whether it crosses the threshold."""
+        if self.method == "dhash":
+            distance = bin(signature ^ self._reference).count("1")
+            return distance / 64.0, distance > self.hash_threshold
+        score = float(np.abs(signature - self._reference).mean())
+        return score, score > self.threshold
+
+    def should_infer(self, frame, now=None):
+        """Return True if this frame should be sent to inference."""
+        now = time.monotonic() if now is None else now
+        signature = self._signature(frame)
+
+        with self._lock:
+            self.frames += 1
+
+            if self._reference is None:
+                infer = True
+            elif now - self._reference_time >= self.max_interval:
+                infer = True
+            else:
+                self.last_change, infer = self._changed(signature)
+
+            if infer:
+                self.inferred += 1
+                self._reference = signature
+                self._reference_time = now
+            return infer
+
+    def reset(self):
+        """Forget the reference frame and counters."""
+        with self._lock:
+            self._reference = None
+            self._reference_time = 0.0
+            self.frames = 0
+            self.inferred = 0
+            self.last_change = 0.0
+
+    def stats(self):
+        """Return how many frames were gated and the inference calls saved."""
+        with self._lock:
+            skipped = self.frames - self.inferred
+            return {
+                "method": self.method,
+                "frames": self.frames,
+                "inferred": self.inferred,
+                "skipped": skipped,
+                "skip_ratio": round(skipped / self.frames, 4) if self.frames else 0.0,
+                "inference_calls_saved": skipped,
+                "last_change": round(self.last_change, 4),
+            }
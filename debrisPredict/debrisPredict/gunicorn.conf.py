@@ -0,0 +1,81 @@
+# Production settings, picked up by `gunicorn main:app` from this directory.
+# The app is imported and its model preloaded once in the master process, then
+# forked into WEB_CONCURRENCY workers that share that memory copy-on-write.
+# Decoding, drawing and JPEG encoding are CPU bound and hold the GIL, so
+# throughput scales with worker processes rather than threads.
+import gc
+import os
+import sys
+import logging
+import multiprocessing
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+# Camera streams are per process (see SERVING_WORKERS in app.py), so a server
+# configured with CAMERA_STREAMS runs a single worker unless told otherwise
+default_workers = 1 if os.environ.get("CAMERA_STREAMS") else multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+if workers > 1 and os.environ.get("CAMERA_STREAMS"):
+    sys.exit(
+        f"CAMERA_STREAMS needs a single worker, but WEB_CONCURRENCY is {workers}"
+    )
+# Lets the app refuse the stream routes when it runs in several processes
+os.environ["GUNICORN_WORKERS"] = str(workers)
+# A single worker serves the camera streams. Every open dashboard holds two
+# threads for as long as it is open (/video_feed and /camera/events), so that
+# worker gets enough threads to leave room for uploads
+serves_streams = bool(os.environ.get("CAMERA_STREAMS")) or workers == 1
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "32" if serves_streams else "4"))
+
+# Code reloading needs every worker to import the app itself
+preload_app = "--reload" not in sys.argv
+
+# Recycle workers after a jittered number of requests to cap memory growth;
+# in-flight requests get graceful_timeout seconds to finish. Off by default
+# for the stream worker, as recycling it would drop every camera stream
+max_requests = int(os.environ.get("MAX_REQUESTS", "0" if serves_streams else "1000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "100"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+keepalive = 5
+pidfile = os.environ.get("GUNICORN_PIDFILE")
+
+
+def when_ready(server):
+    """Preload shared state in the master, then freeze it out of the GC.
+
+    gc.freeze() moves everything allocated so far to a permanent generation,
+    so collections in the workers do not write to (and copy) shared pages.
+    """
+    if not server.cfg.preload_app:
+        return
+    from app import preload
+
+    model = preload()
+    gc.freeze()
+    backend = model.get("backend", "remote") if isinstance(model, dict) else model
+    server.log.info(
+        f"Preloaded {backend} model, {gc.get_freeze_count()} objects frozen, "
+        f"starting {server.cfg.workers} workers"
+    )
+
+
+def post_fork(server, worker):
+    """Split the CPU between workers for libraries with their own thread pools.
+
+    A worker forked from a preloaded master starts warming up at once, so /ready
+    turns 200 as early as possible.
+    """
+    if "torch" in sys.modules:
+        cores = multiprocessing.cpu_count()
+        sys.modules["torch"].set_num_threads(max(1, cores // server.cfg.workers))
+    if "app" in sys.modules:
+        sys.modules["app"].start_warm_up()
+
+
+def worker_exit(server, worker):
+    """Commit queued detections before a recycled or stopped worker exits."""
+    app_module = sys.modules.get("app")
+    store = getattr(app_module, "detection_store", None)
+    if store is not None and not store.flush(timeout=graceful_timeout / 2):
+        logging.warning(f"Worker {worker.pid} exited with detections still queued")
@@ -0,0 +1,359 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import xml.etree.ElementTree as ET
+
+MANIFEST = "manifest.jsonl"
+SPLITS = ("train", "val")
+
+
+def stable_split(image_id, val_ratio=0.2):
+    """Assign an image to train or val from a hash of its id alone.
+
+    The answer never depends on what else is in the dataset, so adding images
+    cannot move existing ones.
+    """
+    digest = hashlib.sha1(image_id.encode("utf-8")).digest()
+    fraction = int.from_bytes(digest[:8], "big") / 2**64
+    return "val" if fraction < val_ratio else "train"
+
+
+def load_manifest(path):
+    """Return the latest record per image id from an append-only manifest.
+
+    Later lines override earlier ones; a torn last line from an interrupted
+    ingest is skipped.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning(f"Skipping unreadable manifest line {line_no}")
+                continue
+            records[record["id"]] = record
+    return records
+
+
+def compact_manifest(path, records):
+    """Rewrite the manifest with one line per image."""
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        for record in records.values():
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def read_annotation(xml_path, class_map):
+    """Parse one annotation file into its image name and YOLO label lines.
+
+    Same box format as converter_*.py (bndbox x, y, w, h in pixels). Boxes
+    are clipped to the image; unknown classes and empty boxes are skipped.
+    """
+    root = ET.parse(xml_path).getroot()
+    image_name = root.find("filename").text
+    width = float(root.find("size/width").text)
+    height = float(root.find("size/height").text)
+
+    lines = []
+    skipped = 0
+    for obj in root.findall("object"):
+        class_id = class_map.get(obj.find("name").text)
+        box = obj.find("bndbox")
+        x1 = float(box.find("x").text)
+        y1 = float(box.find("y").text)
+        x2 = min(x1 + float(box.find("w").text), width)
+        y2 = min(y1 + float(box.find("h").text), height)
+        x1, y1 = max(x1, 0.0), max(y1, 0.0)
+        if class_id is None or x2 <= x1 or y2 <= y1:
+            skipped += 1
+            continue
+        lines.append(
+            f"{class_id} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+            f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n"
+        )
+    return image_name, lines, skipped
+
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def place_image(source, target):
+    """Hard-link an image into the dataset, copying across file systems."""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def scan(folder, suffixes):
+    """Return {name: (mtime_ns, size)} of the files in a folder, from stat only."""
+    found = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(suffixes):
+                stat = entry.stat()
+                found[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def adopt_existing(dataset, records):
+    """Record images already split in the dataset so they keep their split."""
+    adopted = {}
+    for split in SPLITS:
+        folder = os.path.join(dataset, split, "images")
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            image_id = os.path.splitext(name)[0]
+            if image_id in records or image_id in adopted:
+                continue
+            adopted[image_id] = {
+                "id": image_id,
+                "split": split,
+                "image": name,
+                "xml": None,
+                "adopted": True,
+            }
+    return adopted
+
+
+def ingest(
+    annotations,
+    images,
+    dataset,
+    class_names,
+    val_ratio=0.2,
+    adopt=False,
+    max_distance=4,
+    dry_run=False,
+):
+    """Convert new or changed annotations and add them to the dataset.
+
+    Annotations are compared with the manifest by modification time and
+    size, then by content hash, so unchanged files are never parsed. A new
+    image goes to the split of a near-duplicate already in the dataset if
+    there is one, otherwise to stable_split(id). Images already in the
+    manifest keep their split. Manifest records are appended.
+    """
+    start = time.perf_counter()
+    manifest_path = os.path.join(dataset, MANIFEST)
+    records = load_manifest(manifest_path)
+    class_map = {name: index for index, name in enumerate(class_names)}
+
+    new_records = adopt_existing(dataset, records) if adopt else {}
+    known = dict(records, **new_records)
+    by_image = {record["image"]: record for record in known.values()}
+    by_xml = {r["xml"]: r for r in known.values() if r.get("xml")}
+
+    xml_stats = scan(annotations, (".xml",))
+    image_stats = scan(images, (".png", ".jpg", ".jpeg", ".bmp"))
+
+    summary = {
+        "annotations": len(xml_stats),
+        "unchanged": 0,
+        "touched": 0,
+        "changed": 0,
+        "new": 0,
+        "adopted": len(new_records),
+        "missing_image": 0,
+        "skipped_objects": 0,
+        "near_duplicate_split": 0,
+    }
+    pending = []
+    for xml_name, (xml_mtime, xml_size) in sorted(xml_stats.items()):
+        record = by_xml.get(xml_name)
+        if (
+            record is not None
+            and record.get("xml_stat") == [xml_mtime, xml_size]
+            and record.get("image_stat") == list(image_stats.get(record["image"], ()))
+        ):
+            summary["unchanged"] += 1
+            continue
+        pending.append((xml_name, xml_mtime, xml_size, record))
+
+    converted = []
+    for xml_name, xml_mtime, xml_size, record in pending:
+        xml_path = os.path.join(annotations, xml_name)
+        try:
+            xml_sha1 = file_sha1(xml_path)
+            image_name, lines, skipped = read_annotation(xml_path, class_map)
+        except (OSError, ET.ParseError, AttributeError, ValueError) as e:
+            logging.error(f"Skipping {xml_name}: {str(e)}")
+            continue
+        image_stat = image_stats.get(image_name)
+        if image_stat is None:
+            logging.warning(f"{xml_name}: image {image_name} not found")
+            summary["missing_image"] += 1
+            continue
+
+        previous = record or by_image.get(image_name)
+        update = {
+            "id": os.path.splitext(image_name)[0],
+            "image": image_name,
+            "xml": xml_name,
+            "xml_stat": [xml_mtime, xml_size],
+            "xml_sha1": xml_sha1,
+            "image_stat": list(image_stat),
+            "boxes": len(lines),
+        }
+        if (
+            previous is not None
+            and previous.get("xml_sha1") == xml_sha1
+            and previous.get("image_stat") == list(image_stat)
+        ):
+            # Touched but identical: remember the new stat, nothing to convert
+            summary["touched"] += 1
+            new_records[update["id"]] = dict(previous, **update)
+            continue
+        summary["skipped_objects"] += skipped
+        converted.append((update, previous, lines))
+
+    # Near-duplicates of images already in the dataset follow them. Only
+    # converted and adopted images are hashed; the rest keep their hash in
+    # the manifest.
+    index = None
+    hashes = {}
+    paths = [os.path.join(images, update["image"]) for update, _, _ in converted]
+    paths += [
+        os.path.join(dataset, record["split"], "images", record["image"])
+        for record in new_records.values()
+        if record.get("adopted") and "dhash" not in record
+    ]
+    if paths and max_distance >= 0:
+        from near_duplicates import HashIndex, hash_files
+
+        values, readable = hash_files(paths)
+        hashes = {
+            os.path.basename(path): int(value)
+            for path, value, ok in zip(paths, values.tolist(), readable.tolist())
+            if ok
+        }
+        index = HashIndex(max_distance)
+        for record in known.values():
+            if record.get("adopted") and record["image"] in hashes:
+                record["dhash"] = f"{hashes[record['image']]:016x}"
+            if record.get("dhash"):
+                index.add(record["id"], int(record["dhash"], 16))
+
+    for update, previous, lines in converted:
+        value = hashes.get(update["image"])
+        if value is not None:
+            update["dhash"] = f"{value:016x}"
+        if previous is not None:
+            summary["changed"] += 1
+            update["split"] = previous["split"]
+        else:
+            summary["new"] += 1
+            update["split"] = stable_split(update["id"], val_ratio)
+            if value is not None:
+                matches = index.query(value)
+                if matches:
+                    twin = new_records.get(matches[0][0]) or known[matches[0][0]]
+                    if twin["split"] != update["split"]:
+                        summary["near_duplicate_split"] += 1
+                    update["split"] = twin["split"]
+                index.add(update["id"], value)
+        new_records[update["id"]] = update
+
+        if dry_run:
+            continue
+        split_dir = os.path.join(dataset, update["split"])
+        os.makedirs(os.path.join(split_dir, "images"), exist_ok=True)
+        os.makedirs(os.path.join(split_dir, "labels"), exist_ok=True)
+        place_image(
+            os.path.join(images, update["image"]),
+            os.path.join(split_dir, "images", update["image"]),
+        )
+        label = os.path.join(split_dir, "labels", update["id"] + ".txt")
+        with open(label + ".tmp", "w") as f:
+            f.writelines(lines)
+        os.replace(label + ".tmp", label)
+
+    if new_records and not dry_run:
+        os.makedirs(dataset, exist_ok=True)
+        with open(manifest_path, "a") as f:
+            for record in new_records.values():
+                record.setdefault("ingested_at", round(time.time(), 3))
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    splits = dict.fromkeys(SPLITS, 0)
+    for record in dict(records, **new_records).values():
+        splits[record["split"]] += 1
+    summary.update(
+        images=sum(splits.values()),
+        splits=splits,
+        appended=len(new_records),
+        seconds=round(time.perf_counter() - start, 3),
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add new or changed annotations to a split dataset"
+    )
+    parser.add_argument("--annotations", default="BoxAnnotations")
+    parser.add_argument("--images", default="Images")
+    parser.add_argument("--dataset", default=".", help="Folder holding train/ val/")
+    parser.add_argument("--data", default="data_custom.yaml", help="For class names")
+    parser.add_argument("--val-ratio", type=float, default=0.2)
+    parser.add_argument(
+        "--adopt",
+        action="store_true",
+        help="Record images already in train/ and val/ so they keep their split",
+    )
+    parser.add_argument(
+        "--max-distance",
+        type=int,
+        default=4,
+        help="Near-duplicate hash distance; -1 splits by id only",
+    )
+    parser.add_argument("--compact", action="store_true", help="Rewrite the manifest")
+    parser.add_argument("--dry-run", action="store_true", help="Report, change nothing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    import yaml
+
+    with open(args.data) as f:
+        names = yaml.safe_load(f).get("names", [])
+    if isinstance(names, dict):
+        names = [names[key] for key in sorted(names)]
+
+    summary = ingest(
+        args.annotations,
+        args.images,
+        args.dataset,
+        names,
+        val_ratio=args.val_ratio,
+        adopt=args.adopt,
+        max_distance=args.max_distance,
+        dry_run=args.dry_run,
+    )
+    if args.compact and not args.dry_run:
+        path = os.path.join(args.dataset, MANIFEST)
+        compact_manifest(path, load_manifest(path))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
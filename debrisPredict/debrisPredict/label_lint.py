@@ -0,0 +1,510 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# Network input sizes to compare, all multiples of the 32 px YOLO stride
+INPUT_SIZES = (320, 416, 512, 640, 800, 960, 1280)
+# Objects whose shorter side falls below this at the input size are rarely found
+MIN_OBJECT_PIXELS = 8
+# Largest share of boxes allowed below MIN_OBJECT_PIXELS at a suggested size
+MAX_SMALL_SHARE = 0.05
+# Converted boxes may overshoot the image edge by float rounding
+EDGE_TOLERANCE = 1e-3
+# Without nc, class ids from here up are reported as out of range
+MAX_CLASS_ID = 10000
+
+ERRORS = (
+    "malformed_lines",
+    "non_integer_class",
+    "class_out_of_range",
+    "zero_area",
+    "out_of_bounds",
+    "unreadable_images",
+)
+WARNINGS = ("duplicate_boxes", "missing_labels", "empty_labels", "orphan_labels")
+
+
+def label_path_for(image_path, labels_dir=None, images_dir=None):
+    """Return the YOLO label file of an image.
+
+    Without labels_dir the last images/ folder in the path becomes labels/,
+    as YOLO itself resolves them.
+    """
+    if labels_dir is not None:
+        relative = os.path.relpath(image_path, images_dir)
+        return os.path.join(labels_dir, os.path.splitext(relative)[0] + ".txt")
+    marker = os.sep + "images" + os.sep
+    head, found, tail = image_path.rpartition(marker)
+    path = head + os.sep + "labels" + os.sep + tail if found else image_path
+    return os.path.splitext(path)[0] + ".txt"
+
+
+def list_pairs(folder, labels_dir=None):
+    """Return (image_path, label_path) pairs of a split folder.
+
+    folder may hold images/ and labels/ or be the image folder itself.
+    """
+    images_dir = os.path.join(folder, "images")
+    if not os.path.isdir(images_dir):
+        images_dir = folder
+    pairs = []
+    for root, _, files in os.walk(images_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(root, name)
+                pairs.append((path, label_path_for(path, labels_dir, images_dir)))
+    return sorted(pairs)
+
+
+def _parse_rows(tokens, lines):
+    """Convert tokens to float rows, returning the lines that did not parse."""
+    try:
+        return np.array(tokens, dtype=np.float64).reshape(-1, 5), []
+    except ValueError:
+        pass
+    # Rare: find the offending lines one by one
+    rows = []
+    bad = []
+    for index, line in enumerate(lines):
+        try:
+            rows.append([float(token) for token in tokens[index * 5 : index * 5 + 5]])
+        except ValueError:
+            bad.append(line)
+    return np.array(rows, dtype=np.float64).reshape(-1, 5), bad
+
+
+def _read_chunk(pairs):
+    """Read the label files and image headers of a chunk of pairs."""
+    sizes = np.zeros((len(pairs), 2), dtype=np.int64)
+    has_label = np.zeros(len(pairs), dtype=bool)
+    tokens = []
+    lines = []
+    malformed = []
+
+    for index, (image_path, label_path) in enumerate(pairs):
+        try:
+            # Only the header is read for the size
+            with Image.open(image_path) as image:
+                sizes[index] = image.size
+        except Exception:
+            pass
+        try:
+            with open(label_path) as f:
+                text = f.read()
+        except OSError:
+            continue
+        has_label[index] = True
+        for line_no, line in enumerate(text.splitlines(), 1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 5:
+                malformed.append((index, line_no))
+                continue
+            tokens.extend(parts)
+            lines.append((index, line_no))
+
+    rows, bad = _parse_rows(tokens, lines)
+    malformed.extend(bad)
+    if bad:
+        bad = set(bad)
+        lines = [line for line in lines if line not in bad]
+    positions = np.array(lines, dtype=np.int64).reshape(-1, 2)
+    return sizes, has_label, rows, positions, malformed
+
+
+def load_labels(pairs, workers=None, chunk_size=512):
+    """Read every label file into one array, in worker processes.
+
+    Returns a dict with per-image sizes and label presence, the (N, 5)
+    class/xc/yc/w/h rows, and for each row its image index and line number.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        results = [_read_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+            results = list(pool.map(_read_chunk, chunks))
+
+    sizes = [np.zeros((0, 2), dtype=np.int64)]
+    has_label = [np.zeros(0, dtype=bool)]
+    rows = [np.zeros((0, 5))]
+    positions = [np.zeros((0, 2), dtype=np.int64)]
+    malformed = []
+    offset = 0
+    for chunk, (chunk_sizes, labelled, chunk_rows, where, bad) in zip(chunks, results):
+        sizes.append(chunk_sizes)
+        has_label.append(labelled)
+        rows.append(chunk_rows)
+        positions.append(where + [offset, 0])
+        malformed.extend((index + offset, line_no) for index, line_no in bad)
+        offset += len(chunk)
+
+    positions = np.concatenate(positions)
+    return {
+        "pairs": pairs,
+        "sizes": np.concatenate(sizes),
+        "has_label": np.concatenate(has_label),
+        "rows": np.concatenate(rows),
+        "image": positions[:, 0],
+        "line": positions[:, 1],
+        "malformed": malformed,
+    }
+
+
+def box_edges(rows):
+    """Return x1, y1, x2, y2 of normalised centre/size rows."""
+    half_w, half_h = rows[:, 3] / 2, rows[:, 4] / 2
+    return (
+        rows[:, 1] - half_w,
+        rows[:, 2] - half_h,
+        rows[:, 1] + half_w,
+        rows[:, 2] + half_h,
+    )
+
+
+def check(labels, nc=None):
+    """Return a boolean mask over the rows for every row-level issue."""
+    rows = labels["rows"]
+    classes = rows[:, 0]
+    x1, y1, x2, y2 = box_edges(rows)
+    finite = np.isfinite(rows).all(axis=1)
+
+    masks = {
+        "non_integer_class": finite & (classes != np.round(classes)),
+        "class_out_of_range": finite
+        & ((classes < 0) | (classes >= (MAX_CLASS_ID if nc is None else nc))),
+        "zero_area": finite & ((rows[:, 3] <= 0) | (rows[:, 4] <= 0)),
+        "out_of_bounds": ~finite
+        | (np.minimum(x1, y1) < -EDGE_TOLERANCE)
+        | (np.maximum(x2, y2) > 1 + EDGE_TOLERANCE),
+    }
+
+    # Exact repeats of a row within the same file
+    keyed = np.column_stack([labels["image"], np.round(rows, 6)])
+    _, first = np.unique(keyed, axis=0, return_index=True)
+    duplicate = np.ones(len(rows), dtype=bool)
+    duplicate[first] = False
+    masks["duplicate_boxes"] = duplicate
+    return masks
+
+
+def orphan_labels(pairs):
+    """Return label files in the label folders that belong to no image."""
+    expected = {label for _, label in pairs}
+    orphans = []
+    for folder in sorted({os.path.dirname(label) for label in expected}):
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.endswith(".txt") and path not in expected:
+                orphans.append(path)
+    return orphans
+
+
+def percentiles(values, points=(5, 25, 50, 75, 95)):
+    if not len(values):
+        return None
+    quantiles = np.percentile(values, points)
+    return {f"p{p}": round(float(v), 4) for p, v in zip(points, quantiles)}
+
+
+def statistics(labels, valid, names=None, imgsz=640):
+    """Per-class counts and box sizes, and how input sizes would shrink boxes."""
+    rows = labels["rows"][valid]
+    image = labels["image"][valid]
+    sizes = labels["sizes"][image].astype(np.float64)
+    classes = rows[:, 0].astype(np.int64)
+
+    # Box sides in pixels of the original image, and the letterbox scale of
+    # each image at input size 1
+    width_px = rows[:, 3] * sizes[:, 0]
+    height_px = rows[:, 4] * sizes[:, 1]
+    longest = sizes.max(axis=1)
+    scale = np.divide(1.0, longest, out=np.zeros(len(rows)), where=longest > 0)
+    shorter = np.minimum(width_px, height_px) * scale
+
+    image_sides = labels["sizes"].max(axis=1)
+
+    # Only the ids that occur (and the named ones), however large they are
+    ids, boxes_per_class = np.unique(classes, return_counts=True)
+    pairs = np.unique(np.column_stack([image, classes]), axis=0)
+    images_per_class = dict(zip(*np.unique(pairs[:, 1], return_counts=True)))
+    boxes_per_class = dict(zip(ids.tolist(), boxes_per_class.tolist()))
+    ids = sorted(set(boxes_per_class) | set(range(len(names or []))))
+
+    per_class = []
+    for class_id in ids:
+        members = classes == class_id
+        per_class.append(
+            {
+                "id": class_id,
+                "name": names[class_id] if names and class_id < len(names) else None,
+                "boxes": boxes_per_class.get(class_id, 0),
+                "images": int(images_per_class.get(class_id, 0)),
+                "width": percentiles(rows[members, 3]),
+                "height": percentiles(rows[members, 4]),
+                "shorter_side_px": percentiles(shorter[members] * imgsz),
+            }
+        )
+
+    area = width_px * height_px * scale**2 * imgsz**2
+    small_share = {
+        size: round(float((shorter * size < MIN_OBJECT_PIXELS).mean()), 4)
+        if len(rows)
+        else None
+        for size in INPUT_SIZES
+    }
+    suggested = next(
+        (
+            size
+            for size, share in small_share.items()
+            if share is not None and share <= MAX_SMALL_SHARE
+        ),
+        INPUT_SIZES[-1],
+    )
+    return {
+        "classes": per_class,
+        "box_pixels": {
+            "imgsz": imgsz,
+            "shorter_side": percentiles(shorter * imgsz),
+            # COCO buckets: small < 32^2, medium < 96^2, large above
+            "small": int((area < 32**2).sum()),
+            "medium": int(((area >= 32**2) & (area < 96**2)).sum()),
+            "large": int((area >= 96**2).sum()),
+        },
+        # Longest side of the images, which the input size is compared to
+        "image_sizes": percentiles(image_sides[image_sides > 0]),
+        "share_below_min_pixels": {
+            str(size): share for size, share in small_share.items()
+        },
+        "min_object_pixels": MIN_OBJECT_PIXELS,
+        "suggested_imgsz": suggested,
+    }
+
+
+def lint(pairs, nc=None, names=None, imgsz=640, workers=None, examples=5):
+    """Lint a split's labels and return the report and the loaded labels."""
+    start = time.perf_counter()
+    labels = load_labels(pairs, workers=workers)
+    load_seconds = time.perf_counter() - start
+
+    masks = check(labels, nc)
+    invalid = np.zeros(len(labels["rows"]), dtype=bool)
+    for name in ERRORS:
+        if name in masks:
+            invalid |= masks[name]
+    labels["masks"] = masks
+    labels["valid"] = ~invalid
+
+    readable = (labels["sizes"] > 0).all(axis=1)
+    boxes_per_image = np.bincount(labels["image"], minlength=len(pairs))
+    image_issues = {
+        "missing_labels": np.flatnonzero(~labels["has_label"]),
+        "empty_labels": np.flatnonzero(labels["has_label"] & (boxes_per_image == 0)),
+        "unreadable_images": np.flatnonzero(~readable),
+    }
+    orphans = orphan_labels(pairs)
+
+    def where(row):
+        return f"{pairs[labels['image'][row]][1]}:{labels['line'][row]}"
+
+    issues = {"malformed_lines": len(labels["malformed"])}
+    found = {
+        "malformed_lines": [
+            f"{pairs[index][1]}:{line_no}"
+            for index, line_no in labels["malformed"][:examples]
+        ]
+    }
+    for name, mask in masks.items():
+        rows = np.flatnonzero(mask)
+        issues[name] = len(rows)
+        found[name] = [where(row) for row in rows[:examples].tolist()]
+    for name, indices in image_issues.items():
+        issues[name] = len(indices)
+        found[name] = [pairs[i][0] for i in indices[:examples].tolist()]
+    issues["orphan_labels"] = len(orphans)
+    found["orphan_labels"] = orphans[:examples]
+
+    valid = labels["valid"] & readable[labels["image"]]
+    seconds = time.perf_counter() - start
+    report = {
+        "images": len(pairs),
+        "boxes": int(len(labels["rows"])),
+        "seconds": round(seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "boxes_per_s": round(len(labels["rows"]) / seconds, 1) if seconds else None,
+        "errors": sum(issues[name] for name in ERRORS),
+        "warnings": sum(issues[name] for name in WARNINGS),
+        "issues": issues,
+        "examples": {name: paths for name, paths in found.items() if paths},
+    }
+    report.update(statistics(labels, valid, names=names, imgsz=imgsz))
+    return report, labels
+
+
+def write_clean(labels, out_dir, keep_unlabelled=False):
+    """Write a fixed copy of a split to out_dir/images and out_dir/labels.
+
+    Unreadable images and malformed lines are dropped, boxes are clipped to
+    the image and dropped if nothing is left of them, and bad class ids and
+    duplicates are dropped. Images without a label file are left out, since
+    an empty file would make them negatives; keep_unlabelled writes one
+    anyway. Images are hard-linked where possible.
+    """
+    pairs = labels["pairs"]
+    masks = labels["masks"]
+    rows = labels["rows"].copy()
+    keep = np.isfinite(rows).all(axis=1)
+    for name in ("non_integer_class", "class_out_of_range", "duplicate_boxes"):
+        keep &= ~masks[name]
+
+    x1, y1, x2, y2 = (np.clip(edge, 0.0, 1.0) for edge in box_edges(rows))
+    rows[:, 1], rows[:, 2] = (x1 + x2) / 2, (y1 + y2) / 2
+    rows[:, 3], rows[:, 4] = x2 - x1, y2 - y1
+    keep &= (rows[:, 3] > 0) & (rows[:, 4] > 0)
+
+    readable = (labels["sizes"] > 0).all(axis=1)
+    order = np.argsort(labels["image"], kind="stable")
+    order = order[keep[order]]
+    bounds = np.searchsorted(labels["image"][order], np.arange(len(pairs) + 1))
+
+    os.makedirs(os.path.join(out_dir, "images"), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, "labels"), exist_ok=True)
+    written = 0
+    boxes = 0
+    for index, (image_path, _) in enumerate(pairs):
+        if not readable[index]:
+            continue
+        if not labels["has_label"][index] and not keep_unlabelled:
+            continue
+        name = os.path.basename(image_path)
+        target = os.path.join(out_dir, "images", name)
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(image_path, target)
+        except OSError:
+            shutil.copy2(image_path, target)
+
+        selected = rows[order[bounds[index] : bounds[index + 1]]]
+        label = os.path.join(out_dir, "labels", os.path.splitext(name)[0] + ".txt")
+        with open(label, "w") as f:
+            f.writelines(
+                f"{int(row[0])} {row[1]:.6f} {row[2]:.6f} {row[3]:.6f} {row[4]:.6f}\n"
+                for row in selected.tolist()
+            )
+        written += 1
+        boxes += len(selected)
+    return {"images": written, "boxes": boxes}
+
+
+def load_dataset_yaml(data_yaml):
+    """Return the split folders, class count and names of a dataset YAML file."""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    names = data.get("names", [])
+    if isinstance(names, dict):
+        names = [names[key] for key in sorted(names)]
+    root = data.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+    splits = {}
+    for split in ("train", "val", "test"):
+        folder = data.get(split)
+        if folder:
+            if not os.path.isabs(folder):
+                folder = os.path.join(root, folder)
+            splits[split] = folder
+    return splits, data.get("nc", len(names) or None), names, data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Lint YOLO labels and report box statistics"
+    )
+    parser.add_argument(
+        "folders", nargs="*", help="Split folders, default the splits in --data"
+    )
+    parser.add_argument("--data", help="Dataset YAML for splits, nc and class names")
+    parser.add_argument(
+        "--labels", help="Label folder when images are not under images/ and labels/"
+    )
+    parser.add_argument("--nc", type=int, help="Number of classes, default from --data")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--workers", type=int, help="Reader processes")
+    parser.add_argument("--fix", help="Write a cleaned copy of every split here")
+    parser.add_argument(
+        "--keep-unlabelled",
+        action="store_true",
+        help="With --fix, keep images without a label file as negatives",
+    )
+    parser.add_argument("--output", "-o", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    nc = args.nc
+    names = None
+    data = None
+    if args.data:
+        splits, data_nc, names, data = load_dataset_yaml(args.data)
+        nc = nc if nc is not None else data_nc
+    if args.folders:
+        splits = {
+            os.path.basename(os.path.normpath(folder)): folder
+            for folder in args.folders
+        }
+    elif not args.data:
+        parser.error("Give split folders or --data")
+
+    report = {"nc": nc, "splits": {}}
+    for split, folder in splits.items():
+        pairs = list_pairs(folder, args.labels)
+        if not pairs:
+            logging.warning(f"No images found in {folder}")
+            continue
+        split_report, labels = lint(
+            pairs, nc=nc, names=names, imgsz=args.imgsz, workers=args.workers
+        )
+        if args.fix:
+            split_report["fixed"] = write_clean(
+                labels, os.path.join(args.fix, split), args.keep_unlabelled
+            )
+        report["splits"][split] = split_report
+        logging.info(
+            f"{split}: {split_report['images']} images, {split_report['boxes']} boxes, "
+            f"{split_report['errors']} errors, {split_report['warnings']} warnings "
+            f"in {split_report['seconds']}s"
+        )
+
+    if args.fix and data is not None:
+        import yaml
+
+        fixed = dict(data, path=os.path.abspath(args.fix))
+        for split in report["splits"]:
+            fixed[split] = os.path.join(split, "images")
+        with open(os.path.join(args.fix, "data.yaml"), "w") as f:
+            yaml.safe_dump(fixed, f, sort_keys=False)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    errors = sum(split["errors"] for split in report["splits"].values())
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
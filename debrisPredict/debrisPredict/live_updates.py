@@ -0,0 +1,83 @@
+import json
+import time
+import threading
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a compact JSON payload."""
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class UpdateBroker:
+    """Fan the latest update out to subscribers, coalescing what they missed.
+
+    Only the newest update is kept. A subscriber that is slower than the
+    publisher, or rate-limited, skips straight to it and is told how many
+    updates were folded into the one it received.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = None
+        self._version = 0
+        self.subscribers = 0
+        self.sent = 0
+        self.coalesced = 0
+
+    def publish(self, update):
+        with self._cond:
+            self._latest = update
+            self._version += 1
+            self._cond.notify_all()
+
+    def subscribe(self, max_hz=5.0):
+        return Subscription(self, max_hz)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": self.subscribers,
+                "published": self._version,
+                "sent": self.sent,
+                "coalesced": self.coalesced,
+            }
+
+
+class Subscription:
+    """One client's view of a broker, limited to max_hz updates per second."""
+
+    def __init__(self, broker, max_hz=5.0):
+        self.broker = broker
+        self.min_interval = 1.0 / max_hz if max_hz > 0 else 0.0
+        self._version = broker._version
+        self._last_sent = 0.0
+        with broker._cond:
+            broker.subscribers += 1
+
+    def next(self, timeout=15.0):
+        """Return (update, coalesced count), or (None, 0) if nothing arrived."""
+        broker = self.broker
+        with broker._cond:
+            if broker._version == self._version:
+                broker._cond.wait(timeout)
+            if broker._version == self._version:
+                return None, 0
+
+        # Let further updates pile up until this client may receive another
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        with broker._cond:
+            coalesced = broker._version - self._version - 1
+            self._version = broker._version
+            broker.sent += 1
+            broker.coalesced += coalesced
+            update = broker._latest
+        self._last_sent = time.monotonic()
+        return update, coalesced
+
+    def close(self):
+        with self.broker._cond:
+            self.broker.subscribers -= 1
@@ -0,0 +1,391 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# Hash pairs compared per step within a band bucket, so a bucket of many
+# identical frames never allocates all of its pairs at once
+BLOCK_PAIRS = 4_000_000
+
+
+def thumbnail(image):
+    """Return the 9x8 grayscale thumbnail a difference hash is taken from."""
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    # Averaging first and converting 72 pixels is much cheaper than the reverse
+    small = image.resize((9, 8), Image.BOX).convert("L")
+    return np.asarray(small, dtype=np.uint8)
+
+
+def dhash(thumbnails):
+    """64-bit difference hashes of (N, 8, 9) thumbnails as a uint64 array.
+
+    Same bit layout as frame_gate.difference_hash.
+    """
+    thumbnails = np.asarray(thumbnails)
+    bits = thumbnails[..., 1:] > thumbnails[..., :-1]
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def image_hash(image):
+    """Return the difference hash of one PIL image as an int."""
+    return int(dhash(thumbnail(image)[None])[0])
+
+
+def band_layout(max_distance):
+    """Split the 64 hash bits into max_distance + 1 (shift, mask) bands.
+
+    Two hashes at most max_distance bits apart agree exactly on at least one
+    band, so only hashes sharing a band value need to be compared.
+    """
+    edges = np.linspace(0, 64, max_distance + 2).astype(int).tolist()
+    return [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+class HashIndex:
+    """Multi-index hash table for Hamming radius queries on 64-bit hashes."""
+
+    def __init__(self, max_distance=4):
+        self.max_distance = max_distance
+        self._bands = band_layout(max_distance)
+        self._tables = [{} for _ in self._bands]
+        self._hashes = {}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, key, value):
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for (shift, mask), table in zip(self._bands, self._tables):
+            table.setdefault((value >> shift) & mask, set()).add(key)
+
+    def remove(self, key):
+        value = self._hashes.pop(key)
+        for (shift, mask), table in zip(self._bands, self._tables):
+            band = (value >> shift) & mask
+            members = table[band]
+            members.discard(key)
+            if not members:
+                del table[band]
+
+    def query(self, value, max_distance=None):
+        """Return (key, distance) of every hash within max_distance, nearest first."""
+        limit = self.max_distance if max_distance is None else max_distance
+        if limit > self.max_distance:
+            raise ValueError(f"Index only answers distances up to {self.max_distance}")
+        candidates = set()
+        for (shift, mask), table in zip(self._bands, self._tables):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        matches = []
+        for key in candidates:
+            distance = (self._hashes[key] ^ value).bit_count()
+            if distance <= limit:
+                matches.append((key, distance))
+        return sorted(matches, key=lambda match: match[1])
+
+
+def _bucket_pairs(hashes, members, max_distance):
+    pairs = []
+    block = max(1, BLOCK_PAIRS // len(members))
+    for start in range(0, len(members) - 1, block):
+        rows = members[start : start + block]
+        # Each row against every later member of the bucket
+        left, right = np.nonzero(
+            np.bitwise_count(hashes[rows][:, None] ^ hashes[members][None, :])
+            <= max_distance
+        )
+        later = right > left + start
+        pairs.append(np.stack([rows[left[later]], members[right[later]]], axis=1))
+    return pairs
+
+
+def duplicate_pairs(hashes, max_distance=4):
+    """Return the unique (i, j), i < j, index pairs within max_distance bits."""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    pairs = [np.empty((0, 2), dtype=np.int64)]
+    for shift, mask in band_layout(max_distance):
+        keys = (hashes >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.r_[True, keys[order][1:] != keys[order][:-1]])
+        sizes = np.diff(np.r_[starts, len(order)])
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            # Stable order keeps members ascending, so pairs come out as i < j
+            members = order[start : start + size]
+            pairs.extend(_bucket_pairs(hashes, members, max_distance))
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def group_labels(count, pairs):
+    """Label connected components of the pairs by their smallest index."""
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([find(i) for i in range(count)], dtype=np.int64)
+
+
+def hash_groups(hashes, max_distance=4):
+    """Label each hash with the smallest index of its near-duplicate group.
+
+    Groups are connected components, so a burst drifting a few bits per shot
+    stays one group. Equal hashes are collapsed before the pair search, which
+    would otherwise grow with the square of a run of identical frames.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    values, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    components = group_labels(len(values), duplicate_pairs(values, max_distance))
+    smallest = np.full(len(values), len(hashes), dtype=np.int64)
+    np.minimum.at(smallest, components, first)
+    return smallest[components][inverse.ravel()]
+
+
+def list_images(folder):
+    """Return the image files below a folder, sorted by path."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(
+            os.path.join(root, name)
+            for name in files
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+    return sorted(paths)
+
+
+def _file_thumbnails(paths):
+    thumbnails = np.zeros((len(paths), 8, 9), dtype=np.uint8)
+    readable = np.ones(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                # JPEGs decode straight to grayscale at 1/8 scale or less
+                image.draft("L", (64, 64))
+                thumbnails[i] = thumbnail(image)
+        except Exception as e:
+            logging.warning(f"Skipping unreadable image {path}: {str(e)}")
+            readable[i] = False
+    return thumbnails, readable
+
+
+def hash_files(paths, workers=None, chunk_size=256):
+    """Hash image files, decoding in worker processes.
+
+    Returns the hashes and a mask of the files that could be read.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if not chunks:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+    if workers == 1 or len(chunks) == 1:
+        results = [_file_thumbnails(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+            results = list(pool.map(_file_thumbnails, chunks))
+    thumbnails = np.concatenate([thumbs for thumbs, _ in results])
+    readable = np.concatenate([ok for _, ok in results])
+    return dhash(thumbnails), readable
+
+
+def find_groups(paths, max_distance=4, workers=None):
+    """Hash the files and label near-duplicates with a shared group number.
+
+    Unreadable files get the label -1.
+    """
+    hashes, readable = hash_files(paths, workers=workers)
+    kept = np.flatnonzero(readable)
+    labels = np.full(len(paths), -1, dtype=np.int64)
+    labels[kept] = kept[hash_groups(hashes[kept], max_distance)]
+    return labels, hashes
+
+
+def group_split(labels, split_ratio=0.8, seed=0):
+    """Assign whole groups to train so near-duplicates never straddle the split.
+
+    Returns a boolean train mask; groups are shuffled and taken until the
+    train share reaches split_ratio of the images.
+    """
+    groups, sizes = np.unique(labels[labels >= 0], return_counts=True)
+    order = np.random.default_rng(seed).permutation(len(groups))
+    target = split_ratio * sizes.sum()
+    taken = np.cumsum(sizes[order]) - sizes[order] < target
+    return np.isin(labels, groups[order][taken])
+
+
+def split_dataset(
+    src_dir,
+    train_dir,
+    val_dir,
+    split_ratio=0.8,
+    max_distance=4,
+    dedupe=False,
+    seed=0,
+    workers=None,
+):
+    """Split src_dir/Images and its YOLO labels by near-duplicate group.
+
+    Same layout as attached_assets/dataSplit: labels are read from
+    src_dir/yolo_annotations1 and copied to <split>/labels. With dedupe only
+    the first image of each group (by name) is kept.
+    """
+    image_dir = os.path.join(src_dir, "Images")
+    label_dir = os.path.join(src_dir, "yolo_annotations1")
+    paths = list_images(image_dir)
+    labels, _ = find_groups(paths, max_distance=max_distance, workers=workers)
+
+    keep = labels >= 0
+    if dedupe:
+        # Group labels are the smallest member index, i.e. the first by name
+        keep &= labels == np.arange(len(paths))
+    train = group_split(labels, split_ratio=split_ratio, seed=seed)
+
+    for target in (train_dir, val_dir):
+        os.makedirs(os.path.join(target, "images"), exist_ok=True)
+        os.makedirs(os.path.join(target, "labels"), exist_ok=True)
+
+    missing_labels = 0
+    for path, use, to_train in zip(paths, keep.tolist(), train.tolist()):
+        if not use:
+            continue
+        target = train_dir if to_train else val_dir
+        name = os.path.relpath(path, image_dir)
+        shutil.copy(path, os.path.join(target, "images", os.path.basename(name)))
+        annotation = os.path.splitext(name)[0] + ".txt"
+        if os.path.exists(os.path.join(label_dir, annotation)):
+            shutil.copy(
+                os.path.join(label_dir, annotation),
+                os.path.join(target, "labels", os.path.basename(annotation)),
+            )
+        else:
+            missing_labels += 1
+
+    summary = {
+        "images": len(paths),
+        "groups": int(len(np.unique(labels[labels >= 0]))),
+        "kept": int(keep.sum()),
+        "train": int((keep & train).sum()),
+        "val": int((keep & ~train).sum()),
+        "unreadable": int((labels < 0).sum()),
+        "missing_labels": missing_labels,
+    }
+    logging.info(f"Split summary: {json.dumps(summary)}")
+    return summary
+
+
+def cross_split_duplicates(train_paths, val_paths, max_distance=4, workers=None):
+    """Return (train_path, val_path, distance) for val images with a train twin.
+
+    Each val image in a group that also has train images is paired with the
+    first of them.
+    """
+    paths = list(train_paths) + list(val_paths)
+    labels, hashes = find_groups(paths, max_distance=max_distance, workers=workers)
+    val = np.arange(len(train_paths), len(paths))
+    # Labels are the smallest member index, so a group with train images has
+    # a label inside the train range
+    leaked = val[(labels[val] >= 0) & (labels[val] < len(train_paths))]
+    return [
+        (paths[j], paths[i], (int(hashes[i]) ^ int(hashes[j])).bit_count())
+        for i, j in zip(leaked.tolist(), labels[leaked].tolist())
+    ]
+
+
+def scan(folder, max_distance=4, workers=None, show=10):
+    """Report the near-duplicate groups in a folder of images."""
+    start = time.perf_counter()
+    paths = list_images(folder)
+    labels, _ = find_groups(paths, max_distance=max_distance, workers=workers)
+    seconds = time.perf_counter() - start
+
+    groups, sizes = np.unique(labels[labels >= 0], return_counts=True)
+    largest = np.argsort(-sizes, kind="stable")[:show]
+    return {
+        "images": len(paths),
+        "groups": int(len(groups)),
+        "redundant": int(sizes.sum() - len(groups)),
+        "unreadable": int((labels < 0).sum()),
+        "seconds": round(seconds, 3),
+        "images_per_s": round(len(paths) / seconds, 1) if seconds else None,
+        "largest_groups": [
+            [os.path.relpath(paths[i], folder) for i in np.flatnonzero(labels == g)]
+            for g in groups[largest[sizes[largest] > 1]].tolist()
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find near-duplicate images and split datasets around them"
+    )
+    parser.add_argument("--max-distance", type=int, default=4, help="Hamming bits")
+    parser.add_argument("--workers", type=int, help="Decoding processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="Report near-duplicate groups")
+    scan_parser.add_argument("folder")
+
+    split_parser = commands.add_parser(
+        "split", help="Split src/Images and src/yolo_annotations1 by group"
+    )
+    split_parser.add_argument("src")
+    split_parser.add_argument("--train", default="train")
+    split_parser.add_argument("--val", default="val")
+    split_parser.add_argument("--ratio", type=float, default=0.8)
+    split_parser.add_argument("--seed", type=int, default=0)
+    split_parser.add_argument(
+        "--dedupe", action="store_true", help="Keep one image per group"
+    )
+
+    check_parser = commands.add_parser(
+        "check", help="List near-duplicates shared by two splits"
+    )
+    check_parser.add_argument("train")
+    check_parser.add_argument("val")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "scan":
+        print(json.dumps(scan(args.folder, args.max_distance, args.workers), indent=2))
+    elif args.command == "split":
+        split_dataset(
+            args.src,
+            args.train,
+            args.val,
+            split_ratio=args.ratio,
+            max_distance=args.max_distance,
+            dedupe=args.dedupe,
+            seed=args.seed,
+            workers=args.workers,
+        )
+    else:
+        leaks = cross_split_duplicates(
+            list_images(args.train),
+            list_images(args.val),
+            max_distance=args.max_distance,
+            workers=args.workers,
+        )
+        for train_path, val_path, distance in leaks:
+            print(f"{distance}\t{train_path}\t{val_path}")
+        logging.info(f"{len(leaks)} near-duplicate pairs straddle the split")
+        raise SystemExit(1 if leaks else 0)
+
+
+if __name__ == "__main__":
+    main()
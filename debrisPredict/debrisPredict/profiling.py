@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import itertools
+import threading
+import contextvars
+from functools import wraps
+from collections import Counter, OrderedDict
+
+# Leaf functions of threads that are blocked rather than working. An idle
+# ThreadPoolExecutor worker waits in C, so its leaf Python frame is _worker.
+IDLE_FUNCTIONS = {
+    "wait",
+    "select",
+    "poll",
+    "accept",
+    "sleep",
+    "readinto",
+    "recv_into",
+    "_worker",
+}
+
+_current = contextvars.ContextVar("profile_span", default=None)
+
+
+class Span:
+    """One timed step of a traced request, with the steps it called."""
+
+    __slots__ = ("name", "start", "duration_ms", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.children = []
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self, origin=None):
+        origin = self.start if origin is None else origin
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3)
+            if self.duration_ms is not None
+            else None,
+        }
+        if self.children:
+            node["children"] = [child.to_dict(origin) for child in self.children]
+            node["self_ms"] = round(
+                self.duration_ms - sum(c.duration_ms or 0 for c in self.children), 3
+            )
+        return node
+
+
+def start_trace(name):
+    """Start recording spans in this context; returns (root span, reset token)."""
+    root = Span(name)
+    return root, _current.set(root)
+
+
+def finish_trace(root, token):
+    root.finish()
+    _current.reset(token)
+    return root
+
+
+class span:
+    """Time a block as a child of the current span; free when not tracing."""
+
+    __slots__ = ("name", "parent", "node", "token")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.parent = _current.get()
+        if self.parent is not None:
+            self.node = Span(self.name)
+            self.parent.children.append(self.node)
+            self.token = _current.set(self.node)
+        return self
+
+    def __exit__(self, *exc):
+        if self.parent is not None:
+            self.node.finish()
+            _current.reset(self.token)
+        return False
+
+
+def traced(fn):
+    """Decorator recording a call as a span when its request is traced."""
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return fn(*args, **kwargs)
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def server_timing(root, limit=20):
+    """Format a trace as a Server-Timing header, longest spans first."""
+    flat = []
+    stack = [(root, root.name)]
+    while stack:
+        node, path = stack.pop()
+        flat.append((node.duration_ms or 0.0, path))
+        stack.extend((child, f"{path}.{child.name}") for child in node.children)
+    flat.sort(reverse=True)
+    return ", ".join(
+        f'{index};desc="{path}";dur={duration:.1f}'
+        for index, (duration, path) in enumerate(flat[:limit])
+    )
+
+
+class TraceLog:
+    """The most recent request traces, by id."""
+
+    def __init__(self, size=100):
+        self.size = size
+        self._traces = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            trace_id = f"{os.getpid()}-{next(self._ids)}"
+            self._traces[trace_id] = trace
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+            return trace_id
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=0.01, idle=False):
+    """Sample every other thread's Python stack for a while.
+
+    Returns a Counter of collapsed stacks ("thread;outer;...;inner") to
+    sample counts and the number of sampling rounds. Stacks of threads blocked
+    in IDLE_FUNCTIONS are left out unless idle is set.
+    """
+    own = threading.get_ident()
+    counts = Counter()
+    deadline = time.perf_counter() + seconds
+    samples = 0
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if not idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+
+def collapsed(counts):
+    """Format stack counts in the folded format of flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class Sampler:
+    """Run one sampling session at a time for the profiling endpoint."""
+
+    def __init__(self, max_seconds=60):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self.sessions = 0
+
+    def profile(self, seconds, interval=0.01, idle=False):
+        """Return (folded stacks, samples), or None if a session is running."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            self.sessions += 1
+            counts, samples = sample_stacks(
+                min(seconds, self.max_seconds), interval=interval, idle=idle
+            )
+            return collapsed(counts), samples
+        finally:
+            self._lock.release()
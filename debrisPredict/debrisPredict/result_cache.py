@@ -0,0 +1,62 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Detection results of recent uploads, by exact key (file digest and settings).
+
+    At most max_entries are kept, least recently used evicted, and none for
+    longer than ttl seconds. Results are copied in and out, so callers may
+    modify what they get back.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now):
+        while self._entries:
+            key, (_, stored_at) = next(iter(self._entries.items()))
+            if now - stored_at <= self.ttl and len(self._entries) <= self.max_entries:
+                return
+            del self._entries[key]
+
+    def lookup(self, key):
+        """Return a copy of the result stored under key, or None."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[0])
+
+    def store(self, key, result):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(result), now)
+            self._entries.move_to_end(key)
+            self._expire(now)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "inference_calls_saved": self.hits,
+            }
@@ -0,0 +1,312 @@
+import io
+import time
+import base64
+import random
+import hashlib
+import logging
+import argparse
+import threading
+
+from flask import Flask, Response, request, jsonify
+from PIL import Image, ImageDraw
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Default behaviour of the stand-in, every key can be overridden on the command line
+DEFAULT_CONFIG = {
+    "mode": "synthetic",
+    "model_path": None,
+    "classes": ["plastic", "metal", "fishing waste"],
+    "boxes": 5,
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "error_rate": 0.0,
+    "max_rps": 0.0,
+    "max_concurrency": 0,
+    "api_key": None,
+    "seed": 0,
+}
+
+
+class TokenBucket:
+    """Simple thread-safe token bucket limiting requests per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take one token, returning False when the bucket is empty."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def normalize_threshold(value, default):
+    """Accept thresholds as fractions (0.4) or Roboflow-style percentages (40)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value / 100 if value > 1 else value
+
+
+def synthetic_detections(image_bytes, model_id, width, height, classes, boxes, seed):
+    """Return reproducible detections derived from the image content."""
+    digest = hashlib.sha1(image_bytes + model_id.encode()).hexdigest()
+    rng = random.Random(f"{seed}:{digest}")
+
+    predictions = []
+    for index in range(boxes):
+        w = rng.uniform(0.03, 0.25) * width
+        h = rng.uniform(0.03, 0.25) * height
+        class_id = rng.randrange(len(classes))
+        predictions.append(
+            {
+                "x": round(rng.uniform(w / 2, width - w / 2), 1),
+                "y": round(rng.uniform(h / 2, height - h / 2), 1),
+                "width": round(w, 1),
+                "height": round(h, 1),
+                "confidence": round(rng.uniform(0.05, 0.99), 3),
+                "class": classes[class_id],
+                "class_id": class_id,
+                "detection_id": f"{digest[:8]}-{index}",
+            }
+        )
+    return predictions
+
+
+def read_upload():
+    """Return the uploaded image bytes from a multipart or base64 body."""
+    if "file" in request.files:
+        return request.files["file"].read()
+
+    # The hosted API also accepts a base64 encoded body
+    body = request.get_data()
+    if not body:
+        return None
+    try:
+        return base64.b64decode(body, validate=True)
+    except ValueError:
+        return body
+
+
+def synthetic_video_frame(index, width, height, quality=80):
+    """Return a JPEG frame with a few objects drifting across a sea background."""
+    image = Image.new("RGB", (width, height), (20, 70, 110))
+    draw = ImageDraw.Draw(image)
+    for k in range(3):
+        size = max(8, min(width, height) // (6 + 2 * k))
+        x = (index * (4 + 3 * k) + k * width // 3) % max(1, width - size)
+        y = (k + 1) * height // 4 - size // 2
+        draw.rectangle([x, y, x + size, y + size], fill=(230, 60 + 70 * k, 40))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def create_app(config=None):
+    """Build the stand-in Flask app for the given config."""
+    settings = dict(DEFAULT_CONFIG)
+    settings.update(config or {})
+
+    standin = Flask(__name__)
+    rng = random.Random(settings["seed"])
+    bucket = TokenBucket(settings["max_rps"]) if settings["max_rps"] > 0 else None
+    slots = (
+        threading.BoundedSemaphore(settings["max_concurrency"])
+        if settings["max_concurrency"] > 0
+        else None
+    )
+    stats = {"requests": 0, "errors": 0, "throttled": 0}
+    stats_lock = threading.Lock()
+
+    backend = None
+    if settings["mode"] == "local":
+        from backends import LocalModelBackend
+
+        backend = LocalModelBackend(settings["model_path"])
+
+    def count(key):
+        with stats_lock:
+            stats[key] += 1
+
+    @standin.route("/", methods=["GET"])
+    def status():
+        """Report the stand-in configuration and request counters."""
+        with stats_lock:
+            counters = dict(stats)
+        return jsonify({"config": settings, "stats": counters})
+
+    @standin.route("/video.mjpg", methods=["GET"])
+    def video():
+        """Synthetic MJPEG camera feed for testing URL stream sources."""
+        fps = max(0.1, request.args.get("fps", 10.0, type=float))
+        width = request.args.get("width", 640, type=int)
+        height = request.args.get("height", 480, type=int)
+        limit = request.args.get("frames", 0, type=int)
+
+        def frames():
+            index = 0
+            while not limit or index < limit:
+                yield (
+                    b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+                    + synthetic_video_frame(index, width, height)
+                    + b"\r\n"
+                )
+                index += 1
+                time.sleep(1 / fps)
+
+        return Response(frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+    @standin.route("/<path:model_id>", methods=["POST"])
+    def detect(model_id):
+        """Roboflow-compatible detection endpoint."""
+        count("requests")
+        start = time.perf_counter()
+
+        if settings["api_key"] and request.args.get("api_key") != settings["api_key"]:
+            return jsonify({"message": "Forbidden"}), 403
+
+        if bucket is not None and not bucket.take():
+            count("throttled")
+            return jsonify({"message": "Rate limit exceeded"}), 429
+
+        if slots is not None:
+            slots.acquire()
+        try:
+            delay = settings["latency_ms"] + rng.uniform(
+                -settings["jitter_ms"], settings["jitter_ms"]
+            )
+            if delay > 0:
+                time.sleep(delay / 1000)
+
+            if settings["error_rate"] > 0 and rng.random() < settings["error_rate"]:
+                count("errors")
+                return jsonify({"message": "Internal error (injected)"}), 500
+
+            image_bytes = read_upload()
+            if not image_bytes:
+                return jsonify({"message": "No image provided"}), 400
+            try:
+                image = Image.open(io.BytesIO(image_bytes))
+                width, height = image.size
+            except Exception as e:
+                return jsonify({"message": f"Could not decode image: {str(e)}"}), 400
+
+            confidence = normalize_threshold(request.args.get("confidence"), 0.4)
+            overlap = normalize_threshold(request.args.get("overlap"), 0.3)
+
+            if backend is not None:
+                result = backend.predict(
+                    image.convert("RGB"), confidence=confidence, overlap=overlap
+                )
+                predictions = result["predictions"]
+            else:
+                predictions = [
+                    p
+                    for p in synthetic_detections(
+                        image_bytes,
+                        model_id,
+                        width,
+                        height,
+                        settings["classes"],
+                        settings["boxes"],
+                        settings["seed"],
+                    )
+                    if p["confidence"] >= confidence
+                ]
+        finally:
+            if slots is not None:
+                slots.release()
+
+        return jsonify(
+            {
+                "time": round(time.perf_counter() - start, 4),
+                "image": {"width": width, "height": height},
+                "predictions": predictions,
+            }
+        )
+
+    return standin
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Roboflow-compatible inference stand-in for offline testing"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--mode", choices=["synthetic", "local"], default="synthetic")
+    parser.add_argument("--model", help="Model file served in 'local' mode")
+    parser.add_argument(
+        "--classes",
+        default=",".join(DEFAULT_CONFIG["classes"]),
+        help="Comma separated class names for synthetic detections",
+    )
+    parser.add_argument(
+        "--boxes",
+        type=int,
+        default=DEFAULT_CONFIG["boxes"],
+        help="Synthetic boxes per image",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests failing with 500",
+    )
+    parser.add_argument(
+        "--max-rps", type=float, default=0.0, help="Throttle with 429 above this rate"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=0,
+        help="Requests processed at once, extra ones wait",
+    )
+    parser.add_argument("--api-key", help="Reject requests with a different api_key")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == "local" and not args.model:
+        parser.error("--model is required in local mode")
+
+    standin = create_app(
+        {
+            "mode": args.mode,
+            "model_path": args.model,
+            "classes": [c.strip() for c in args.classes.split(",") if c.strip()],
+            "boxes": args.boxes,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "max_rps": args.max_rps,
+            "max_concurrency": args.max_concurrency,
+            "api_key": args.api_key,
+            "seed": args.seed,
+        }
+    )
+    logging.info(
+        f"Stand-in listening on http://{args.host}:{args.port}, "
+        f"set ROBOFLOW_API_URL to point the app at it"
+    )
+    standin.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
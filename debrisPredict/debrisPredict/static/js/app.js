@@ -60,6 +60,20 @@ function initializeImagePreview() {
     });
 }
 
+/**
+ * Turn a refused upload (too large, unsupported, server busy) into an error
+ * carrying the server's explanation
+ */
+function rejectUpload(response) {
+    return response.json()
+        .catch(() => ({}))
+        .then(data => {
+            const error = new Error('Upload failed with status ' + response.status);
+            error.uploadMessage = data.message;
+            throw error;
+        });
+}
+
 /**
  * Process uploaded image and fetch detection results
  */
@@ -72,20 +86,16 @@ function processImage(form, submitBtn, loadingIndicator, resultsSection) {
     resultsSection.style.display = 'none';
     submitBtn.disabled = true;
 
-    // First submit to get result image
-    fetch(form.action, {
+    // One request returns the detections and the result image
+    fetch(form.action + '?format=json&image=1', {
         method: 'POST',
         body: formData
     })
     .then(response => {
-        if (!response.ok) throw new Error('Network response was not ok');
-        return response.blob();
+        if (!response.ok) return rejectUpload(response);
+        return response.json();
     })
-    .then(blob => {
-        // Display result image
-        const imageUrl = URL.createObjectURL(blob);
-        resultImg.src = imageUrl;
-
+    .then(data => {
         // Initialize heatmap when image loads
         resultImg.onload = function() {
             if (!heatmapInstance) {
@@ -95,18 +105,9 @@ function processImage(form, submitBtn, loadingIndicator, resultsSection) {
                 heatmapInstance.resizeCanvas();
             }
         };
+        resultImg.src = 'data:' + (data.image_mimetype || 'image/jpeg') +
+            ';base64,' + data.image;
 
-        // Fetch detection data
-        return fetch(form.action + '?format=json', {
-            method: 'POST',
-            body: formData
-        });
-    })
-    .then(response => {
-        if (!response.ok) throw new Error('Failed to get detection data');
-        return response.json();
-    })
-    .then(data => {
         // Store detections globally
         currentDetections = data.detections || [];
 
@@ -126,7 +127,8 @@ function processImage(form, submitBtn, loadingIndicator, resultsSection) {
     .catch(error => {
         console.error('Error:', error);
         loadingIndicator.style.display = 'none';
-        alert('An error occurred while processing the image. Please try again.');
+        alert(error.uploadMessage ||
+            'An error occurred while processing the image. Please try again.');
     })
     .finally(() => {
         submitBtn.disabled = false;
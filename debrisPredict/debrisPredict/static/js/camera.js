@@ -8,6 +8,7 @@ class CameraController {
         this.isActive = false;
         this.heatmapEnabled = false;
         this.statusInterval = null;
+        this.eventSource = null;
         this.detectionStats = {
             total: 0,
             plastic: 0,
@@ -68,7 +69,7 @@ class CameraController {
             if (data.success) {
                 this.isActive = true;
                 this.showVideoFeed();
-                this.startStatusPolling();
+                this.startLiveUpdates();
                 this.updateUI();
                 this.showNotification('Camera started successfully', 'success');
             } else {
@@ -113,7 +114,7 @@ class CameraController {
                 this.isActive = false;
                 this.heatmapEnabled = false;
                 this.hideVideoFeed();
-                this.stopStatusPolling();
+                this.stopLiveUpdates();
                 this.updateUI();
                 this.resetStats();
                 this.showNotification('Camera stopped', 'info');
@@ -177,7 +178,8 @@ class CameraController {
         }
 
         if (videoFeed) {
-            videoFeed.src = '/video_feed?' + new Date().getTime();
+            videoFeed.src = '/video_feed?tier=' + this.feedTier(videoFeed) +
+                '&' + new Date().getTime();
         }
 
         // Hide upload section when camera is active
@@ -186,6 +188,17 @@ class CameraController {
         }
     }
 
+    /**
+     * Pick the smallest feed quality tier that fills the element on screen
+     */
+    feedTier(videoFeed) {
+        const width = (videoFeed.clientWidth || window.innerWidth) *
+            (window.devicePixelRatio || 1);
+        if (width <= 320) return 'thumbnail';
+        if (width <= 640) return 'preview';
+        return 'full';
+    }
+
     /**
      * Hide the video feed
      */
@@ -208,10 +221,68 @@ class CameraController {
         }
     }
 
+    /**
+     * Subscribe to pushed detection updates, polling if the browser or
+     * connection does not support server-sent events
+     */
+    startLiveUpdates() {
+        if (!window.EventSource) {
+            this.startStatusPolling();
+            return;
+        }
+
+        this.eventSource = new EventSource('/camera/events');
+        const applyCounts = (event) => this.applyLiveCounts(JSON.parse(event.data));
+
+        this.eventSource.addEventListener('snapshot', (event) => {
+            const data = JSON.parse(event.data);
+            this.applyLiveCounts({
+                totals: data.detection_counts,
+                total: data.total_detections
+            });
+        });
+        this.eventSource.addEventListener('detections', applyCounts);
+        this.eventSource.addEventListener('state', applyCounts);
+
+        this.eventSource.onerror = () => {
+            // The browser retries on its own unless the stream was refused
+            if (this.eventSource && this.eventSource.readyState === EventSource.CLOSED) {
+                this.eventSource = null;
+                this.startStatusPolling();
+            }
+        };
+    }
+
+    /**
+     * Stop pushed updates and any polling fallback
+     */
+    stopLiveUpdates() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+        this.stopStatusPolling();
+    }
+
+    /**
+     * Update statistics from a pushed update
+     */
+    applyLiveCounts(data) {
+        if (!data.totals) return;
+
+        this.detectionStats.total = data.total || 0;
+        this.detectionStats.plastic = data.totals.plastic || 0;
+        this.detectionStats.metal = data.totals.metal || 0;
+        this.detectionStats.fishing_waste = data.totals['fishing waste'] || 0;
+
+        this.updateStatsDisplay();
+    }
+
     /**
      * Start polling camera status
      */
     startStatusPolling() {
+        if (this.statusInterval) return;
         this.statusInterval = setInterval(() => {
             this.updateCameraStatus();
         }, 1000); // Update every second
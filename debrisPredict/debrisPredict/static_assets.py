@@ -0,0 +1,197 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+
+from flask import Response, abort, request
+from werkzeug.security import safe_join
+
+# Served for a year and never revalidated: the URL changes with the content
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Kept, but revalidated with ETag / Last-Modified on every use
+REVALIDATE = "no-cache"
+
+COMPRESSIBLE = {
+    "application/javascript",
+    "application/json",
+    "application/geo+json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def compressible(mimetype):
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE
+
+
+def brotli_compress(data, quality=11):
+    """Brotli-compress data, or return None if the brotli package is missing."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=quality)
+
+
+class Asset:
+    """A response body with its content version and precompressed variants."""
+
+    __slots__ = ("data", "mimetype", "version", "last_modified", "variants", "stat")
+
+    def __init__(self, data, mimetype, last_modified, min_size=1024, stat=None):
+        self.data = data
+        self.mimetype = mimetype
+        self.version = hashlib.sha256(data).hexdigest()[:12]
+        self.last_modified = last_modified
+        self.stat = stat
+        # Compressed once at the highest level, so every response is free
+        self.variants = {}
+        if compressible(mimetype) and len(data) >= min_size:
+            candidates = {
+                "br": brotli_compress(data),
+                "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+            }
+            for encoding, body in candidates.items():
+                if body is not None and len(body) < len(data):
+                    self.variants[encoding] = body
+
+    def sizes(self):
+        sizes = {"identity": len(self.data)}
+        sizes.update((encoding, len(body)) for encoding, body in self.variants.items())
+        return sizes
+
+
+def negotiate(variants):
+    """Pick the encoding of the current request among the available variants."""
+    best, best_quality = None, 0
+    for encoding in variants:
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def asset_response(asset, version=None):
+    """Serve an asset, conditionally and in the best encoding the client takes.
+
+    A request for the current version (?v=) may be cached for good; any
+    other request is revalidated, so an old versioned URL still gets the
+    current content after a deploy, but only until the page is reloaded.
+    """
+    encoding = negotiate(asset.variants)
+    if encoding is None:
+        response = Response(asset.data, mimetype=asset.mimetype)
+        response.set_etag(asset.version)
+    else:
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        response.headers["Content-Encoding"] = encoding
+        # Every representation needs its own strong validator
+        response.set_etag(f"{asset.version}-{encoding}")
+    if asset.variants:
+        response.vary.add("Accept-Encoding")
+    response.last_modified = asset.last_modified
+    if version == asset.version:
+        response.headers["Cache-Control"] = IMMUTABLE
+    else:
+        response.headers["Cache-Control"] = REVALIDATE
+    return response.make_conditional(request)
+
+
+class StaticAssets:
+    """The files of a static folder, content-hashed and precompressed in memory.
+
+    Files are read on first use and again when their modification time or
+    size changes, so edits show up without a restart.
+    """
+
+    def __init__(self, folder, min_size=1024):
+        self.folder = folder
+        self.min_size = min_size
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """Return the Asset for a path below the folder, or None."""
+        path = safe_join(self.folder, filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None or not os.path.isfile(path):
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        asset = self._assets.get(filename)
+        if asset is not None and asset.stat == key:
+            return asset
+
+        with open(path, "rb") as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        asset = Asset(data, mimetype, stat.st_mtime, self.min_size, stat=key)
+        with self._lock:
+            self._assets[filename] = asset
+        return asset
+
+    def version(self, filename):
+        asset = self.get(filename)
+        return asset.version if asset is not None else None
+
+    def preload(self):
+        """Hash and compress every file now, e.g. before workers fork."""
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                self.get(os.path.relpath(path, self.folder).replace(os.sep, "/"))
+        return len(self._assets)
+
+    def serve(self, filename):
+        """View function replacing Flask's static route."""
+        asset = self.get(filename)
+        if asset is None:
+            abort(404)
+        return asset_response(asset, request.args.get("v"))
+
+    def stats(self):
+        with self._lock:
+            assets = dict(self._assets)
+        return {
+            name: {"version": asset.version, "bytes": asset.sizes()}
+            for name, asset in sorted(assets.items())
+        }
+
+
+def compress_response(response, min_size=1024, level=6):
+    """Gzip a dynamic response in place if it is worth it and the client takes it.
+
+    Streamed responses (exports, MJPEG, server-sent events) and bodies that
+    are already encoded are left alone.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or not compressible(response.mimetype or "")
+    ):
+        return response
+    # The body differs by Accept-Encoding even when this one is not compressed
+    response.vary.add("Accept-Encoding")
+    if not request.accept_encodings.quality("gzip"):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    body = gzip.compress(data, compresslevel=level, mtime=0)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = "gzip"
+    # The same ETag would claim the gzipped bytes equal the plain ones
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    logging.debug(f"Compressed {request.path}: {len(data)} -> {len(body)} bytes")
+    return response
@@ -0,0 +1,528 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+from frame_encoder import FrameEncoder
+from live_updates import UpdateBroker, sse_event
+
+CATEGORIES = ("fishing waste", "metal", "plastic")
+
+
+def open_capture(source):
+    """Open a capture for a device index, video file or RTSP/HTTP URL.
+
+    Objects that already provide read() (e.g. test cameras) are used as is.
+    """
+    if hasattr(source, "read"):
+        return source
+    if cv2 is None:
+        raise RuntimeError("OpenCV is required for live camera")
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise RuntimeError(
+            f"Could not open stream source {display_source(source)!r}"
+        )
+    return capture
+
+
+def compact_detection(detection):
+    """Pack a detection as [class_name, confidence, x1, y1, x2, y2]."""
+    return [detection["class_name"], round(detection["confidence"], 3)] + [
+        round(value, 1) for value in detection["bbox"]
+    ]
+
+
+def display_source(source):
+    """Return a source for display, without URL credentials or query string.
+
+    Device indices and file paths are returned unchanged.
+    """
+    text = str(source)
+    if "://" not in text:
+        return text
+    try:
+        parts = urlsplit(text)
+        host = parts.hostname or ""
+        if ":" in host:
+            host = f"[{host}]"
+        if parts.port is not None:
+            host = f"{host}:{parts.port}"
+    except ValueError:
+        return text.split("://", 1)[0] + "://"
+    return urlunsplit((parts.scheme, host, parts.path, "", ""))
+
+
+def is_file_source(source):
+    """Return True for sources that are local video files."""
+    return isinstance(source, str) and os.path.isfile(source)
+
+
+class InferencePool:
+    """Worker threads shared by all streams, with one pending frame per stream.
+
+    A stream that produces frames faster than they can be processed only
+    keeps its newest frame; the older one is dropped as stale. Streams with a
+    pending frame are served round-robin so a busy camera cannot starve the
+    others. Workers call infer_fn concurrently, so frames from different
+    streams reach the inference micro-batcher together and share batches.
+    A frame that waited longer than max_age_ms is dropped as stale, and
+    infer_fn may return None to shed a frame when the service is overloaded.
+    backlog_fn returns the work already handed to inference but not yet
+    answered (e.g. pipelined remote calls); it is added to the queue depth
+    the streams' controllers see.
+    """
+
+    def __init__(self, infer_fn, workers=2, max_age_ms=None, backlog_fn=None):
+        self.infer_fn = infer_fn
+        self.backlog_fn = backlog_fn
+        self.workers = max(1, int(workers))
+        self.max_age_ms = max_age_ms
+        self._pending = {}
+        self._order = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self.processed = 0
+        self.dropped = 0
+        self.shed = 0
+
+    def _ensure_workers(self):
+        """Start the worker threads, again if the process was forked."""
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pending.clear()
+            self._order.clear()
+            self._threads = [
+                threading.Thread(
+                    target=self._run, name=f"inference-worker-{i}", daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            self._pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, stream, frame):
+        """Queue a frame for inference, replacing the stream's stale one."""
+        self._ensure_workers()
+        with self._cond:
+            if stream.name in self._pending:
+                self.dropped += 1
+                stream.frames_dropped += 1
+            else:
+                self._order.append(stream.name)
+            self._pending[stream.name] = (stream, frame, time.perf_counter())
+            self._cond.notify()
+
+    def cancel(self, stream):
+        """Forget a stream's pending frame."""
+        with self._cond:
+            if self._pending.pop(stream.name, None) is not None:
+                self._order.remove(stream.name)
+
+    def depth(self):
+        """Return the number of frames waiting for a worker."""
+        with self._cond:
+            return len(self._pending)
+
+    def backlog(self):
+        """Return the frames waiting plus the inference work not yet answered."""
+        return self.depth() + (self.backlog_fn() if self.backlog_fn else 0)
+
+    def _next(self):
+        with self._cond:
+            while not self._order:
+                self._cond.wait()
+            name = self._order.popleft()
+            return self._pending.pop(name)
+
+    def _run(self):
+        while True:
+            stream, frame, queued = self._next()
+            if not stream.active:
+                continue
+            start = time.perf_counter()
+            if self.max_age_ms and (start - queued) * 1000 > self.max_age_ms:
+                with self._cond:
+                    self.dropped += 1
+                stream.frames_dropped += 1
+                continue
+            try:
+                result = self.infer_fn(stream, frame)
+                if result is None:
+                    with self._cond:
+                        self.shed += 1
+                    stream.frames_shed += 1
+                    continue
+                detections, counts = result
+                latency_ms = (time.perf_counter() - start) * 1000
+                stream.on_detections(
+                    detections,
+                    counts,
+                    latency_ms,
+                    (start - queued) * 1000,
+                    self.backlog(),
+                )
+                with self._cond:
+                    self.processed += 1
+            except Exception as e:
+                logging.error(f"Inference error on stream {stream.name}: {str(e)}")
+                stream.errors += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "pending": len(self._pending),
+                "processed": self.processed,
+                "dropped_stale": self.dropped,
+                "shed": self.shed,
+            }
+
+
+class CameraStream:
+    """One named video source with its own capture thread, history and status."""
+
+    def __init__(
+        self,
+        name,
+        source,
+        pool,
+        render_fn,
+        gate=None,
+        controller=None,
+        loop=False,
+        history_size=500,
+        sink=None,
+        tiers=None,
+    ):
+        self.name = name
+        self.source = source
+        self.pool = pool
+        self.render_fn = render_fn
+        self.gate = gate
+        self.controller = controller
+        self.loop = loop
+        self.sink = sink
+
+        self.active = False
+        self.heatmap_enabled = False
+        self.history = deque(maxlen=history_size)
+        self.detections = []
+        self.detection_counts = {category: 0 for category in CATEGORIES}
+        # Per-class counts over the history, kept up to date as it rolls
+        self.history_counts = {category: 0 for category in CATEGORIES}
+        # Bumped whenever the history changes, so the heatmap is only redrawn then
+        self.history_version = 0
+        self._history_lock = threading.Lock()
+        # Serialises start() and stop(), so a source is opened at most once
+        self._start_lock = threading.RLock()
+        self.updates = UpdateBroker()
+        self.encoder = FrameEncoder(self._render, tiers)
+
+        self.frames_captured = 0
+        self.frames_submitted = 0
+        self.frames_inferred = 0
+        self.frames_dropped = 0
+        self.frames_shed = 0
+        self.errors = 0
+        self.last_error = None
+        self.started_at = None
+
+        self._capture = None
+        self._thread = None
+        self._frame = None
+        self._frame_seq = 0
+        self._frame_cond = threading.Condition()
+        self._resolution = None
+
+    def start(self):
+        """Open the source and start the capture thread."""
+        with self._start_lock:
+            if self.active:
+                return False
+            self._capture = open_capture(self.source)
+            self.active = True
+            self.started_at = time.time()
+            if self.gate is not None:
+                self.gate.reset()
+            self._thread = threading.Thread(
+                target=self._capture_loop, name=f"capture-{self.name}", daemon=True
+            )
+            self._thread.start()
+        self._publish_state()
+        return True
+
+    def stop(self):
+        """Stop capturing and release the source."""
+        with self._start_lock:
+            self.active = False
+            self.pool.cancel(self)
+            with self._frame_cond:
+                self._frame_cond.notify_all()
+            thread = self._thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout=2)
+            if self._capture is not None and hasattr(self._capture, "release"):
+                self._capture.release()
+            self._capture = None
+        with self._history_lock:
+            self.history.clear()
+            self.history_counts = {category: 0 for category in CATEGORIES}
+            self.history_version += 1
+        self.detections = []
+        self._publish_state()
+
+    def toggle_heatmap(self):
+        self.heatmap_enabled = not self.heatmap_enabled
+        self._publish_state()
+        return self.heatmap_enabled
+
+    def _publish_state(self):
+        self.updates.publish(
+            {
+                "type": "state",
+                "active": self.active,
+                "heatmap_enabled": self.heatmap_enabled,
+                "totals": dict(self.history_counts),
+                "total": len(self.history),
+            }
+        )
+
+    def _apply_resolution(self, settings):
+        if settings is None or self._resolution == settings["capture"]:
+            return
+        width, height = settings["capture"]
+        if cv2 is not None and hasattr(self._capture, "set"):
+            self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self._resolution = settings["capture"]
+
+    def _frame_interval(self):
+        """Seconds between frames for file sources, so they play in real time."""
+        if not is_file_source(self.source) or cv2 is None:
+            return 0
+        fps = self._capture.get(cv2.CAP_PROP_FPS) or 0
+        return 1.0 / fps if fps > 0 else 1.0 / 25
+
+    def _capture_loop(self):
+        interval = self._frame_interval()
+        index = 0
+        while self.active:
+            settings = self.controller.settings if self.controller else None
+            self._apply_resolution(settings)
+
+            started = time.perf_counter()
+            success, frame = self._capture.read()
+            if not success or frame is None:
+                if self.loop and is_file_source(self.source) and cv2 is not None:
+                    self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                self.last_error = "Source ended or could not be read"
+                logging.warning(f"Stream {self.name}: {self.last_error}")
+                self.active = False
+                break
+
+            self.frames_captured += 1
+            with self._frame_cond:
+                self._frame = frame
+                self._frame_seq += 1
+                self._frame_cond.notify_all()
+
+            # Inference on every Nth frame, and only when the scene changed
+            infer_every = settings["infer_every"] if settings else 1
+            if index % infer_every == 0 and (
+                self.gate is None or self.gate.should_infer(frame)
+            ):
+                self.pool.submit(self, frame)
+                self.frames_submitted += 1
+            index += 1
+
+            if self.controller is not None:
+                self.controller.record_frame()
+                self.controller.update()
+
+            if interval:
+                time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def on_detections(self, detections, counts, latency_ms, wait_ms, queue_depth):
+        """Store the result of an inference worker for this stream."""
+        if not self.active:
+            return
+        self.frames_inferred += 1
+        self.detections = detections
+        self.detection_counts = counts
+        with self._history_lock:
+            for detection in detections:
+                if len(self.history) == self.history.maxlen:
+                    evicted = self.history[0].get("class_name")
+                    if evicted in self.history_counts:
+                        self.history_counts[evicted] -= 1
+                self.history.append(detection)
+                if detection.get("class_name") in self.history_counts:
+                    self.history_counts[detection["class_name"]] += 1
+            if detections:
+                self.history_version += 1
+            totals = dict(self.history_counts)
+            total = len(self.history)
+
+        if self.sink is not None and detections:
+            self.sink(self, detections)
+
+        if self.controller is not None:
+            # Time spent queued counts towards what the viewer experiences
+            self.controller.record_inference(latency_ms + wait_ms, queue_depth)
+
+        self.updates.publish(
+            {
+                "type": "detections",
+                "frame": self.frames_inferred,
+                "time": round(time.time(), 3),
+                "detections": [compact_detection(d) for d in detections],
+                "totals": totals,
+                "total": total,
+            }
+        )
+
+    def events(self, max_hz=5.0, keepalive=15.0):
+        """Yield server-sent events with detection deltas and class counters.
+
+        Updates arriving faster than max_hz are coalesced: the client gets the
+        newest frame's detections, the change in per-class counts since its
+        previous event, and how many updates were skipped.
+        """
+        subscription = self.updates.subscribe(max_hz)
+        try:
+            snapshot = self.status()
+            sent_totals = dict(snapshot["detection_counts"])
+            yield sse_event("snapshot", snapshot)
+
+            while True:
+                update, coalesced = subscription.next(keepalive)
+                if update is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                totals = update["totals"]
+                data = dict(
+                    update,
+                    delta={
+                        category: totals[category] - sent_totals.get(category, 0)
+                        for category in totals
+                        if totals[category] != sent_totals.get(category, 0)
+                    },
+                    coalesced=coalesced,
+                )
+                sent_totals = dict(totals)
+                yield sse_event(data.pop("type"), data)
+        finally:
+            subscription.close()
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        """Block until a frame newer than last_seq is available."""
+        with self._frame_cond:
+            if self._frame_seq == last_seq and self.active:
+                self._frame_cond.wait(timeout)
+            return self._frame, self._frame_seq
+
+    def _render(self, canvas, buffers):
+        history = list(self.history) if self.heatmap_enabled else None
+        self.render_fn(canvas, self.detections, history, buffers, self.history_version)
+
+    def mjpeg(self, tier="full"):
+        """Yield multipart JPEG chunks of the annotated stream in a quality tier.
+
+        Each frame is rendered and encoded by the stream's FrameEncoder, once
+        for all viewers of the tier.
+        """
+        last_seq = -1
+        while self.active:
+            frame, seq = self.wait_frame(last_seq)
+            if frame is None or seq == last_seq:
+                continue
+            last_seq = seq
+
+            chunk = self.encoder.chunk(seq, frame, tier)
+            if chunk is not None:
+                yield chunk
+
+    def status(self):
+        """Return this stream's state, counters, gating and controller status."""
+        with self._history_lock:
+            detection_counts = dict(self.history_counts)
+            total_detections = len(self.history)
+
+        return {
+            "name": self.name,
+            "source": display_source(self.source),
+            "active": self.active,
+            "heatmap_enabled": self.heatmap_enabled,
+            "total_detections": total_detections,
+            "detection_counts": detection_counts,
+            "frames": {
+                "captured": self.frames_captured,
+                "submitted": self.frames_submitted,
+                "inferred": self.frames_inferred,
+                "dropped_stale": self.frames_dropped,
+                "shed": self.frames_shed,
+            },
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "started_at": self.started_at,
+            "gating": self.gate.stats() if self.gate is not None else None,
+            "controller": self.controller.status()
+            if self.controller is not None
+            else None,
+            "live_updates": self.updates.stats(),
+            "encoder": self.encoder.stats(),
+        }
+
+
+class StreamManager:
+    """Registry of named streams sharing one inference pool."""
+
+    def __init__(self, pool, stream_factory):
+        self.pool = pool
+        self.stream_factory = stream_factory
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, source, loop=False):
+        """Register a new stream source; raise ValueError if the name is taken."""
+        with self._lock:
+            if name in self._streams:
+                raise ValueError(f"Stream {name!r} already exists")
+            stream = self.stream_factory(name, source, loop)
+            self._streams[name] = stream
+            return stream
+
+    def get(self, name):
+        with self._lock:
+            return self._streams.get(name)
+
+    def remove(self, name):
+        with self._lock:
+            stream = self._streams.pop(name, None)
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def all(self):
+        with self._lock:
+            return list(self._streams.values())
@@ -0,0 +1,412 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Rough training memory footprint of one image, as a multiple of its float32
+# input tensor. Measured on YOLOv8n/s CPU runs; larger models need more.
+ACTIVATION_FACTOR = {"n": 60, "s": 90, "m": 140, "l": 200, "x": 260}
+
+# Memory each dataloader worker process needs for decoding and augmentation
+WORKER_MEMORY_BYTES = 512 * 1024 * 1024
+
+# Default training configuration, every key can be overridden on the command line
+DEFAULT_CONFIG = {
+    "model": os.environ.get("TRAIN_MODEL", "yolov8n.pt"),
+    "data": os.environ.get("TRAIN_DATA", "data_custom.yaml"),
+    "epochs": 50,
+    "imgsz": 640,
+    "batch": "auto",
+    "workers": "auto",
+    "cache": "auto",
+    "device": "cpu",
+    "amp": False,
+    "project": "runs/train",
+    "name": "debris",
+    "save_period": 1,
+    "patience": 20,
+}
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+def available_memory_bytes():
+    """Return the memory currently available to this process in bytes."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        # Conservative fallback when the platform does not tell us
+        return 4 * 1024 * 1024 * 1024
+
+
+def available_cpus():
+    """Return the number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def count_images(folder):
+    """Count the training images below a dataset folder."""
+    total = 0
+    for _, _, files in os.walk(folder):
+        total += sum(
+            1 for name in files if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+    return total
+
+
+def resolve_split_folder(data_yaml, split):
+    """Return the image folder of a split (train, val) in a dataset YAML file."""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+
+    folder = data.get(split, "")
+    root = data.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+    if not os.path.isabs(folder):
+        folder = os.path.join(root, folder)
+    return folder
+
+
+def resolve_train_folder(data_yaml):
+    """Return the train image folder referenced by a dataset YAML file."""
+    return resolve_split_folder(data_yaml, "train")
+
+
+def check_duplicates(data_yaml, max_distance=4):
+    """Warn about near-duplicate images shared by the train and val splits.
+
+    Such pairs let validation score what training has already seen; see
+    near_duplicates.py split to rebuild the split by group.
+    """
+    from near_duplicates import cross_split_duplicates, list_images
+
+    leaks = cross_split_duplicates(
+        list_images(resolve_split_folder(data_yaml, "train")),
+        list_images(resolve_split_folder(data_yaml, "val")),
+        max_distance=max_distance,
+        workers=available_cpus(),
+    )
+    for train_path, val_path, distance in leaks[:10]:
+        logging.warning(
+            f"Near-duplicate across splits ({distance} bits): "
+            f"{train_path} / {val_path}"
+        )
+    if leaks:
+        logging.warning(f"{len(leaks)} val images have a near-duplicate in train")
+    return leaks
+
+
+def model_size_letter(model_name):
+    """Return the YOLOv8 size letter (n/s/m/l/x) of a model file name."""
+    stem = os.path.splitext(os.path.basename(model_name))[0]
+    letter = stem[-1:].lower()
+    return letter if letter in ACTIVATION_FACTOR else "n"
+
+
+def tune_workers(cpus, memory_bytes):
+    """Pick a dataloader worker count for the available CPUs and memory."""
+    # Leave at least half the cores to the forward/backward pass on CPU boxes
+    by_cpu = max(1, cpus // 2)
+    by_memory = max(1, int(memory_bytes * 0.25 // WORKER_MEMORY_BYTES))
+    return min(by_cpu, by_memory, 8)
+
+
+def choose_cache_mode(image_count, imgsz, memory_bytes, cache_dir):
+    """Decide whether to cache decoded images in RAM, on disk or not at all."""
+    # Ultralytics caches images resized to imgsz as uint8 HWC arrays
+    cache_bytes = int(image_count * imgsz * imgsz * 3 * 1.1)
+
+    if cache_bytes < memory_bytes * 0.3:
+        return "ram", cache_bytes
+
+    try:
+        free_disk = shutil.disk_usage(cache_dir).free
+    except OSError:
+        free_disk = 0
+
+    if cache_bytes * 2 < free_disk:
+        return "disk", 0
+
+    return False, 0
+
+
+def choose_batch_size(imgsz, model_name, memory_bytes, reserved_bytes=0):
+    """Pick the largest power-of-two batch that fits in the remaining memory."""
+    per_image = imgsz * imgsz * 3 * 4 * ACTIVATION_FACTOR[model_size_letter(model_name)]
+    budget = max(0, memory_bytes * 0.7 - reserved_bytes)
+
+    batch = 1
+    while batch * 2 * per_image <= budget and batch < 64:
+        batch *= 2
+    return batch
+
+
+def tune_config(config):
+    """Fill in every 'auto' entry of the config from the machine's resources."""
+    tuned = dict(config)
+    cpus = available_cpus()
+    memory = available_memory_bytes()
+    on_cpu = str(tuned["device"]).lower() == "cpu"
+
+    logging.info(
+        f"Tuning for {cpus} CPUs and {memory / 1024 ** 3:.1f} GiB available memory"
+    )
+
+    if tuned["workers"] == "auto":
+        tuned["workers"] = tune_workers(cpus, memory)
+
+    reserved = tuned["workers"] * WORKER_MEMORY_BYTES
+
+    if tuned["cache"] == "auto":
+        # Ultralytics writes the .npy disk cache next to the training images
+        train_folder = tuned["project"]
+        try:
+            train_folder = resolve_train_folder(tuned["data"])
+            image_count = count_images(train_folder)
+        except Exception as e:
+            logging.warning(f"Could not count training images: {str(e)}")
+            image_count = 0
+
+        cache, cache_bytes = choose_cache_mode(
+            image_count, tuned["imgsz"], memory - reserved, train_folder
+        )
+        tuned["cache"] = cache
+        reserved += cache_bytes
+
+    if tuned["batch"] == "auto":
+        if on_cpu:
+            tuned["batch"] = choose_batch_size(
+                tuned["imgsz"], tuned["model"], memory, reserved
+            )
+        else:
+            # Let Ultralytics probe CUDA memory itself
+            tuned["batch"] = -1
+
+    if on_cpu and tuned["amp"]:
+        logging.warning("Mixed precision is not supported on CPU, disabling AMP")
+        tuned["amp"] = False
+
+    if on_cpu:
+        # Keep torch intra-op threads from fighting the dataloader workers
+        tuned["threads"] = int(
+            os.environ.get("OMP_NUM_THREADS") or max(1, cpus - tuned["workers"])
+        )
+
+    return tuned
+
+
+def last_checkpoint(config):
+    """Return the last.pt checkpoint of an unfinished run, if there is one.
+
+    Ultralytics marks the checkpoint of a finished run (all epochs or early
+    stopping) with epoch -1 and refuses to resume it.
+    """
+    path = os.path.join(config["project"], config["name"], "weights", "last.pt")
+    if not os.path.exists(path):
+        return None
+
+    import torch
+
+    try:
+        checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+    except Exception as e:
+        logging.warning(f"Could not read {path}, not resuming: {str(e)}")
+        return None
+    epoch = checkpoint.get("epoch", -1)
+    epochs = (checkpoint.get("train_args") or {}).get("epochs")
+    if epoch < 0 or (epochs is not None and epoch + 1 >= epochs):
+        logging.info(f"{path} is from a finished run, starting a new one")
+        return None
+    return path
+
+
+class ThroughputLogger:
+    """Training callbacks that log epoch wall time and images per second."""
+
+    def __init__(self):
+        self.epoch_start = None
+        self.train_start = None
+        self.epochs = []
+
+    def on_train_start(self, trainer):
+        self.train_start = time.perf_counter()
+
+    def on_train_epoch_start(self, trainer):
+        self.epoch_start = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer):
+        if self.epoch_start is None:
+            return
+
+        wall_time = time.perf_counter() - self.epoch_start
+        images = len(trainer.train_loader.dataset)
+        record = {
+            "epoch": trainer.epoch + 1,
+            "wall_time_s": round(wall_time, 3),
+            "images": images,
+            "images_per_s": round(images / wall_time, 2) if wall_time > 0 else 0.0,
+            "batch": trainer.batch_size,
+            "workers": trainer.args.workers,
+        }
+        self.epochs.append(record)
+
+        logging.info(
+            f"Epoch {record['epoch']}: {record['wall_time_s']:.1f}s, "
+            f"{record['images_per_s']:.1f} images/s"
+        )
+
+        with open(os.path.join(trainer.save_dir, "throughput.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def on_train_end(self, trainer):
+        if not self.epochs or self.train_start is None:
+            return
+
+        total = time.perf_counter() - self.train_start
+        mean_rate = sum(e["images_per_s"] for e in self.epochs) / len(self.epochs)
+        logging.info(
+            f"Training finished in {total:.1f}s, mean {mean_rate:.1f} images/s "
+            f"over {len(self.epochs)} epochs"
+        )
+
+    def register(self, model):
+        """Attach the callbacks to an Ultralytics model."""
+        model.add_callback("on_train_start", self.on_train_start)
+        model.add_callback("on_train_epoch_start", self.on_train_epoch_start)
+        model.add_callback("on_train_epoch_end", self.on_train_epoch_end)
+        model.add_callback("on_train_end", self.on_train_end)
+
+
+def train(config, resume=True):
+    """Train a YOLO model with the given config, resuming if a checkpoint exists."""
+    import torch
+    from ultralytics import YOLO
+
+    checkpoint = last_checkpoint(config) if resume else None
+    throughput = ThroughputLogger()
+
+    if checkpoint:
+        logging.info(f"Resuming training from {checkpoint}")
+        model = YOLO(checkpoint)
+        throughput.register(model)
+        return model.train(resume=True)
+
+    tuned = tune_config(config)
+    logging.info(f"Training configuration: {json.dumps(tuned)}")
+    if tuned.get("threads"):
+        # Torch has sized its thread pool on import, OMP_NUM_THREADS is too late
+        torch.set_num_threads(tuned["threads"])
+
+    model = YOLO(tuned["model"])
+    throughput.register(model)
+    return model.train(
+        data=tuned["data"],
+        epochs=tuned["epochs"],
+        imgsz=tuned["imgsz"],
+        batch=tuned["batch"],
+        workers=tuned["workers"],
+        cache=tuned["cache"],
+        device=tuned["device"],
+        amp=tuned["amp"],
+        project=tuned["project"],
+        name=tuned["name"],
+        exist_ok=True,
+        save_period=tuned["save_period"],
+        patience=tuned["patience"],
+    )
+
+
+def parse_args():
+    """Parse command line options on top of the default config."""
+    parser = argparse.ArgumentParser(description="Train the marine debris detector")
+    parser.add_argument("--model", default=DEFAULT_CONFIG["model"])
+    parser.add_argument("--data", default=DEFAULT_CONFIG["data"])
+    parser.add_argument("--epochs", type=int, default=DEFAULT_CONFIG["epochs"])
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_CONFIG["imgsz"])
+    parser.add_argument(
+        "--batch", default=DEFAULT_CONFIG["batch"], help="Batch size or 'auto'"
+    )
+    parser.add_argument(
+        "--workers", default=DEFAULT_CONFIG["workers"], help="Worker count or 'auto'"
+    )
+    parser.add_argument(
+        "--cache",
+        default=DEFAULT_CONFIG["cache"],
+        choices=["auto", "ram", "disk", "none"],
+    )
+    parser.add_argument("--device", default=DEFAULT_CONFIG["device"])
+    parser.add_argument("--amp", action="store_true", help="Enable mixed precision")
+    parser.add_argument("--project", default=DEFAULT_CONFIG["project"])
+    parser.add_argument("--name", default=DEFAULT_CONFIG["name"])
+    parser.add_argument(
+        "--save-period",
+        type=int,
+        default=DEFAULT_CONFIG["save_period"],
+        help="Save a checkpoint every N epochs",
+    )
+    parser.add_argument("--patience", type=int, default=DEFAULT_CONFIG["patience"])
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Start fresh even if last.pt exists"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Print the tuned config and exit"
+    )
+    parser.add_argument(
+        "--check-duplicates",
+        action="store_true",
+        help="Warn about near-duplicate images shared by train and val",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(
+        {
+            "model": args.model,
+            "data": args.data,
+            "epochs": args.epochs,
+            "imgsz": args.imgsz,
+            "batch": args.batch if args.batch == "auto" else int(args.batch),
+            "workers": args.workers if args.workers == "auto" else int(args.workers),
+            "cache": False if args.cache == "none" else args.cache,
+            "device": args.device,
+            "amp": args.amp,
+            "project": args.project,
+            "name": args.name,
+            "save_period": args.save_period,
+            "patience": args.patience,
+        }
+    )
+
+    if args.check_duplicates:
+        check_duplicates(config["data"])
+
+    if args.dry_run:
+        print(json.dumps(tune_config(config), indent=2))
+        return
+
+    train(config, resume=not args.no_resume)
+
+
+if __name__ == "__main__":
+    main()
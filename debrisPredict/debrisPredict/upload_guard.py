@@ -0,0 +1,170 @@
+import os
+import time
+import warnings
+import threading
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request
+from PIL import Image
+
+# Dimensions are checked by open_upload() before decoding, so Pillow's
+# warning below its hard limit would only repeat that check
+warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF", "BMP", "MPO"}
+
+# Decoded RGB image, its converted copy and the annotated result
+WORKING_COPIES = 3
+
+
+class UploadRejected(Exception):
+    """An upload refused before decoding, with the HTTP status to answer."""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SpoolingRequest(Request):
+    """Request class keeping small uploads in memory and spooling large ones."""
+
+    spool_bytes = 1024 * 1024
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_bytes, mode="rb+")
+
+
+def rss_bytes():
+    """Return the current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class MemoryProbe:
+    """Track the resident memory of the process over one request.
+
+    Samples are taken at the expensive steps (decode, inference, encode); the
+    largest increase over the start is reported as the request's peak. With
+    concurrent requests the figure includes their allocations too, so the
+    estimate from the admitted pixels is reported next to it.
+    """
+
+    def __init__(self):
+        self.start = rss_bytes()
+        self.peak = self.start
+        self.started = time.perf_counter()
+
+    def sample(self):
+        current = rss_bytes()
+        if current > self.peak:
+            self.peak = current
+
+    def report(self, pixels=0):
+        self.sample()
+        return {
+            "peak_rss_delta_mb": round((self.peak - self.start) / 1024**2, 2),
+            "peak_rss_mb": round(self.peak / 1024**2, 1),
+            "estimated_image_mb": round(pixels * 3 * WORKING_COPIES / 1024**2, 2),
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+class PixelBudget:
+    """Bound the pixels being decoded and processed across concurrent requests.
+
+    A request needing more than what is left waits up to queue_timeout for
+    earlier requests to finish, then is rejected with 503. A single image
+    larger than the whole budget is rejected with 413 straight away.
+    """
+
+    def __init__(self, max_pixels, queue_timeout=2.0):
+        self.max_pixels = max_pixels
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.peak_in_flight = 0
+
+    @contextmanager
+    def reserve(self, pixels):
+        self.acquire(pixels)
+        try:
+            yield
+        finally:
+            self.release(pixels)
+
+    def acquire(self, pixels):
+        if pixels > self.max_pixels:
+            with self._cond:
+                self.rejected += 1
+            raise UploadRejected(
+                f"Image of {pixels} pixels exceeds the processing budget", 413
+            )
+
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            if self.in_flight + pixels > self.max_pixels:
+                self.queued += 1
+            while self.in_flight + pixels > self.max_pixels:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise UploadRejected(
+                        "Server is busy processing other images", 503, retry_after=1
+                    )
+                self._cond.wait(remaining)
+            self.in_flight += pixels
+            self.admitted += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self, pixels):
+        with self._cond:
+            self.in_flight -= pixels
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_pixels": self.max_pixels,
+                "in_flight_pixels": self.in_flight,
+                "peak_in_flight_pixels": self.peak_in_flight,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+def open_upload(stream, max_image_pixels):
+    """Open an uploaded image lazily and check it before any pixel is decoded.
+
+    Only the header is read here; format and dimensions decide whether the
+    image may be decoded at all.
+    """
+    try:
+        image = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(str(e), 413)
+    except Exception:
+        raise UploadRejected("Could not read image file", 400)
+
+    if image.format not in ALLOWED_FORMATS:
+        raise UploadRejected(f"Unsupported image format: {image.format}", 415)
+
+    width, height = image.size
+    if width * height > max_image_pixels:
+        raise UploadRejected(
+            f"Image is {width}x{height}, larger than the "
+            f"{max_image_pixels // 1_000_000} MP limit",
+            413,
+        )
+    return image
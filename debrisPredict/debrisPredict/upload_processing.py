@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import fcntl
+import bisect
+import logging
+import threading
+from contextlib import nullcontext
+
+from PIL import Image, ImageFile, TiffImagePlugin
+
+from chunked_uploads import UploadSessionError, replace_json
+
+IMAGE_SUFFIXES = (".tif", ".tiff", ".jpg", ".jpeg", ".png", ".bmp", ".ppm")
+VIDEO_SUFFIXES = (".mp4", ".m4v", ".mov", ".avi", ".mkv", ".ts", ".mjpg", ".mjpeg")
+TIFF_MAGIC = (b"II*\x00", b"MM\x00*", b"II+\x00", b"MM\x00+")
+STRIP_BYTE_COUNTS = 279
+TILE_BYTE_COUNTS = 325
+
+
+def media_kind(filename):
+    """Return "image", "video" or None from a file name."""
+    name = filename.lower()
+    if name.endswith(IMAGE_SUFFIXES):
+        return "image"
+    if name.endswith(VIDEO_SUFFIXES):
+        return "video"
+    return None
+
+
+def window_grid(width, height, size=1024, overlap=128):
+    """Inference windows covering an image, row by row, as (x0, y0, x1, y1)."""
+    step = max(1, size - overlap)
+    xs = list(range(0, max(width - overlap, 1), step))
+    ys = list(range(0, max(height - overlap, 1), step))
+    return [(x, y, min(x + size, width), min(y + size, height)) for y in ys for x in xs]
+
+
+def open_partial(path):
+    """Open an image from the bytes that arrived so far, or None.
+
+    TIFFs are opened without Pillow's decompression bomb check, because
+    their windows are decoded a strip or tile at a time (see read_window);
+    UploadJob bounds their size itself.
+    """
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(4)
+        if magic in TIFF_MAGIC:
+            return TiffImagePlugin.TiffImageFile(path)
+        return Image.open(path)
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+
+
+def decoder_tiles(image, length, band_rows=64):
+    """Return (entry, end) for the decoder tiles of an image.
+
+    end is the file offset a tile's data ends at, so it can be decoded once
+    that many bytes have arrived. It comes from the TIFF byte counts when
+    there are any, else from the next tile's offset or the file length.
+    Top-down raw tiles (uncompressed TIFF strips, PPM) are cut into bands
+    of band_rows rows. Compressed images that Pillow decodes in one go
+    (JPEG, PNG, compressed TIFF via libtiff) are one tile ending at length.
+    """
+    entries = list(image.tile)
+    counts = None
+    tags = getattr(image, "tag_v2", None)
+    if tags is not None:
+        counts = tags.get(TILE_BYTE_COUNTS) or tags.get(STRIP_BYTE_COUNTS)
+        if counts is not None and len(counts) != len(entries):
+            counts = None
+    starts = sorted(entry.offset for entry in entries)
+
+    tiles = []
+    for index, entry in enumerate(entries):
+        if counts is not None:
+            end = entry.offset + counts[index]
+        else:
+            following = bisect.bisect_right(starts, entry.offset)
+            end = starts[following] if following < len(starts) else length
+        x0, y0, x1, y1 = entry.extents
+        rows = y1 - y0
+        args = entry.args if isinstance(entry.args, tuple) else (entry.args,)
+        orientation = args[2] if len(args) > 2 else 1
+        stride = (end - entry.offset) // rows if rows else 0
+        if (
+            entry.codec_name != "raw"
+            or orientation != 1
+            or rows <= band_rows
+            or stride * rows != end - entry.offset
+        ):
+            tiles.append((entry, end))
+            continue
+        for top in range(0, rows, band_rows):
+            bottom = min(top + band_rows, rows)
+            band = ImageFile._Tile(
+                "raw",
+                (x0, y0 + top, x1, y0 + bottom),
+                entry.offset + top * stride,
+                (args[0], stride, 1),
+            )
+            tiles.append((band, entry.offset + bottom * stride))
+    return tiles
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def tile_union(tiles, box):
+    """Return the decoder tiles covering box and the extents of their union."""
+    needed = [entry for entry, _ in tiles if overlaps(entry.extents, box)]
+    left = min(entry.extents[0] for entry in needed)
+    top = min(entry.extents[1] for entry in needed)
+    right = max(entry.extents[2] for entry in needed)
+    bottom = max(entry.extents[3] for entry in needed)
+    return needed, (left, top, right, bottom)
+
+
+def read_window(path, tiles, box):
+    """Decode the part of an image inside box from the decoder tiles covering it.
+
+    Only those tiles are decoded, into an image the size of their union.
+    """
+    needed, (left, top, right, bottom) = tile_union(tiles, box)
+
+    image = open_partial(path)
+    image.tile = [
+        ImageFile._Tile(
+            entry.codec_name,
+            (
+                entry.extents[0] - left,
+                entry.extents[1] - top,
+                entry.extents[2] - left,
+                entry.extents[3] - top,
+            ),
+            entry.offset,
+            entry.args,
+        )
+        for entry in needed
+    ]
+    image._size = (right - left, bottom - top)
+    if hasattr(image, "_tile_size"):
+        # Newer Pillow allocates TIFFs at this size rather than _size
+        image._tile_size = image._size
+    image.load()
+    return image.crop((box[0] - left, box[1] - top, box[2] - left, box[3] - top))
+
+
+def bbox_iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1])
+    union -= intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def shift_detections(detections, dx, dy):
+    """Move detections from window to image coordinates."""
+    return [
+        dict(
+            d,
+            bbox=[value + shift for value, shift in zip(d["bbox"], (dx, dy, dx, dy))],
+            center={"x": d["center"]["x"] + dx, "y": d["center"]["y"] + dy},
+        )
+        for d in detections
+    ]
+
+
+class UploadJob:
+    """Detect debris in an upload while its chunks are still arriving.
+
+    Images are cut into overlapping windows (window_grid); a window is run
+    through detect_image(image) as soon as the decoder tiles it needs are on
+    disk, and detections already found by a neighbouring window are dropped.
+    Videos are reopened as they grow and a frame every sample_s seconds goes
+    through detect_frame(frame). Both return (detections, counts).
+
+    Results are appended to the session's .results.jsonl and passed to
+    sink(upload_id, index, detections); progress is in .job.json. A job
+    that stopped (worker restart, idle client) resumes from its results.
+
+    Images are limited to max_pixels, and to max_piece_pixels when they
+    are decoded in one piece. reserve(pixels) is a context manager held
+    while a window's decoded pixels are in memory.
+    """
+
+    def __init__(
+        self,
+        store,
+        upload_id,
+        detect_image,
+        detect_frame,
+        sink=None,
+        window=1024,
+        overlap=128,
+        sample_s=1.0,
+        max_pixels=None,
+        max_piece_pixels=None,
+        reserve=None,
+        idle_s=600,
+    ):
+        self.store = store
+        self.upload_id = upload_id
+        self.detect_image = detect_image
+        self.detect_frame = detect_frame
+        self.sink = sink
+        self.window = window
+        self.overlap = overlap
+        self.sample_s = sample_s
+        self.max_pixels = max_pixels
+        self.max_piece_pixels = max_piece_pixels
+        self.reserve = reserve or (lambda pixels: nullcontext())
+        self.idle_s = idle_s
+        self.path = store.path(upload_id)
+        self.processed = 0
+        self.total = None
+
+    def state(self, state, error=None):
+        replace_json(
+            self.store.path(self.upload_id, ".job.json"),
+            {
+                "state": state,
+                "processed": self.processed,
+                "total": self.total,
+                "error": error,
+                "pid": os.getpid(),
+                "updated": round(time.time(), 3),
+            },
+        )
+
+    def record(self, index, detections, counts, **fields):
+        self.store.append_result(
+            self.upload_id,
+            dict(fields, index=index, detections=detections, counts=counts),
+        )
+        if self.sink is not None and detections:
+            self.sink(self.upload_id, index, detections)
+        self.processed += 1
+
+    def wait(self, status):
+        """Wait for more bytes; False once the client has been idle for idle_s."""
+        self.state("waiting")
+        newer = self.store.wait(self.upload_id, status["offset"], self.idle_s)
+        return newer["offset"] > status["offset"]
+
+    def run(self):
+        meta = self.store.meta(self.upload_id)
+        done, _ = self.store.results(self.upload_id)
+        self.processed = len(done)
+        try:
+            if meta["kind"] == "video":
+                finished = self.run_video([record["index"] for record in done])
+            else:
+                finished = self.run_image(done)
+            if finished:
+                self.state("done")
+        except UploadSessionError:
+            logging.info(f"Upload {self.upload_id} was deleted while processing")
+        except Exception as e:
+            logging.error(f"Processing upload {self.upload_id} failed: {str(e)}")
+            self.state("failed", str(e))
+
+    def run_image(self, done):
+        processed = {record["index"] for record in done}
+        accepted = {record["index"]: record["detections"] for record in done}
+        tiles = grid = needs = None
+        while True:
+            status = self.store.status(self.upload_id)
+            if tiles is None:
+                image = open_partial(self.path)
+                if image is None:
+                    if status["complete"]:
+                        raise ValueError("Not a readable image")
+                    if not self.wait(status):
+                        return False
+                    continue
+                pixels = image.width * image.height
+                if self.max_pixels and pixels > self.max_pixels:
+                    raise ValueError(
+                        f"Image of {pixels} pixels exceeds the limit of "
+                        f"{self.max_pixels}"
+                    )
+                tiles = decoder_tiles(image, status["length"])
+                if len(tiles) == 1 and self.max_piece_pixels:
+                    if pixels > self.max_piece_pixels:
+                        raise ValueError(
+                            "Image is too large to decode in one piece; "
+                            "upload it as an uncompressed TIFF"
+                        )
+                grid = window_grid(image.width, image.height, self.window, self.overlap)
+                # Bytes that have to be on disk before each window can be read
+                needs = [
+                    max(end for entry, end in tiles if overlaps(entry.extents, box))
+                    for box in grid
+                ]
+                # Pixels decoded for each window: the union of its tiles
+                spans = []
+                for box in grid:
+                    _, (left, top, right, bottom) = tile_union(tiles, box)
+                    spans.append((right - left) * (bottom - top))
+                self.total = len(grid)
+                self.state("running")
+
+            ready = [
+                index
+                for index, need in enumerate(needs)
+                if index not in processed and need <= status["offset"]
+            ]
+            for index in ready:
+                box = grid[index]
+                with self.reserve(spans[index]):
+                    region = read_window(self.path, tiles, box).convert("RGB")
+                    detections, counts = self.detect_image(region)
+                    # Freed before its pixels go back to the budget
+                    del region
+                detections = shift_detections(detections, box[0], box[1])
+                neighbours = [
+                    other
+                    for i, found in accepted.items()
+                    if overlaps(grid[i], box)
+                    for other in found
+                ]
+                detections = [
+                    d
+                    for d in detections
+                    if not any(
+                        d["class_name"] == other["class_name"]
+                        and bbox_iou(d["bbox"], other["bbox"]) >= 0.5
+                        for other in neighbours
+                    )
+                ]
+                counts = {category: 0 for category in counts}
+                for d in detections:
+                    counts[d["class_name"]] = counts.get(d["class_name"], 0) + 1
+                self.record(index, detections, counts, window=list(box))
+                processed.add(index)
+                accepted[index] = detections
+            if ready:
+                self.state("running")
+            if len(processed) == len(grid):
+                return True
+            if not self.wait(status):
+                return False
+
+    def run_video(self, done):
+        import cv2
+
+        position = max(done) + 1 if done else 0
+        while True:
+            status = self.store.status(self.upload_id)
+            capture = cv2.VideoCapture(self.path)
+            if not capture.isOpened():
+                capture.release()
+                if status["complete"]:
+                    raise ValueError("Not a readable video")
+                if not self.wait(status):
+                    return False
+                continue
+
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25
+            step = max(1, round(fps * self.sample_s))
+            frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            if status["complete"] and frames > 0:
+                self.total = len(range(0, frames, step))
+            if position:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+            self.state("running")
+            try:
+                while capture.grab():
+                    if position % step == 0:
+                        ok, frame = capture.retrieve()
+                        if ok:
+                            detections, counts = self.detect_frame(frame)
+                            self.record(
+                                position,
+                                detections,
+                                counts,
+                                time_s=round(position / fps, 3),
+                            )
+                    position += 1
+            finally:
+                capture.release()
+
+            # Everything readable is done; more may follow if the file grows
+            if status["complete"]:
+                return True
+            if not self.wait(status):
+                return False
+
+
+def start_job(store, upload_id, make_job):
+    """Run the processing job of an upload on a thread, unless one is running.
+
+    Any worker may call this (on every chunk and status request); an
+    exclusive lock on <id>.lock makes sure only one job per upload runs,
+    and is released if its process dies. Returns True if a job was started.
+    """
+    try:
+        with open(store.path(upload_id, ".job.json")) as f:
+            if json.load(f)["state"] in ("done", "failed"):
+                return False
+    except (OSError, ValueError, KeyError):
+        pass
+
+    lock = open(store.path(upload_id, ".lock"), "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return False
+
+    def run():
+        try:
+            make_job(upload_id).run()
+        finally:
+            lock.close()
+
+    threading.Thread(target=run, name=f"upload-{upload_id[:8]}", daemon=True).start()
+    return True